@@ -1,34 +1,21 @@
 #!/usr/bin/env python
 # std imports
-from calendar import c
 import os
-import time
-import datetime
+import itertools
 import subprocess
 from argparse import ArgumentParser
 
 # internal
-from videobreakdown.videoinfo import VideoInfo
-from videobreakdown.videoframes import VideoFrames
-from videobreakdown.pdfcreator import PdfCreator
-from videobreakdown.base import (OS, get_dimensions,
-                                 validate_input, uptodate_app_config)
-
-DEBUG_COUNTER = os.environ.get("VIDEOBREAKDOWN_DEBUG")
-TIME_STAMP = time.time()
-
-
-def time_taken(msg_str):
-    """ Print time taken, 
-
-    Args:
-        msg_str (`str`): Message string and append to time taken
-    """
-    global TIME_STAMP
-    current_time = time.time()
-    time_taken = datetime.timedelta(seconds=current_time- TIME_STAMP)
-    print ("Processing time for {0} - {1}".format(msg_str, time_taken))
-    TIME_STAMP = current_time
+from videobreakdown.report import (create_report, export_report,
+                                   get_report_path, REPORT_OUTPUTS)
+from videobreakdown.catalog import CATALOG_FORMATS
+from videobreakdown.workqueue import WorkQueue, run_worker
+from videobreakdown.pipeline import get_jobs
+from videobreakdown.cache import MetadataCache, get_cache_path
+from videobreakdown.snapshot import ScanSnapshot
+from videobreakdown.journal import RunJournal, get_run_dir, journal_enabled
+from videobreakdown.discovery import scan_videos, walk_videos
+from videobreakdown.base import OS, uptodate_app_config
 
 
 def _parse_arguments():
@@ -39,35 +26,118 @@ def _parse_arguments():
     """
     help_str = "Video Breakdown Code"
     args = ArgumentParser(help_str)
+    # We either process the videos or maintain the cache
+    mode_group = args.add_mutually_exclusive_group(required=True)
     path_help = "File(s) or Folder path that contains video files"
-    args.add_argument("--path", "-p", nargs="*", help=path_help,
-                      required=True)
+    mode_group.add_argument("--path", "-p", nargs="*", help=path_help)
+    resume_help = "Go on with a run that failed or was stopped, from its "\
+                  "run folder (next to the PDF, *_vb_RUN). The videos in "\
+                  "its journal are not processed again."
+    mode_group.add_argument("--resume", metavar="RUN", help=resume_help)
+    worker_help = "Process the videos of the work queue folder (see "\
+                  "--queue) until there are none left. Any number of "\
+                  "workers can run on any number of hosts."
+    mode_group.add_argument("--worker", metavar="QUEUE", help=worker_help)
+    merge_help = "Export the PDF from the results of the work queue "\
+                 "folder once all the videos are done."
+    mode_group.add_argument("--merge", metavar="QUEUE", help=merge_help)
+    prune_help = "Remove the cache entries of videos that are changed or "\
+                 "deleted and the entries of older tag configs, then exit."
+    mode_group.add_argument("--prune-cache", action="store_true",
+                            help=prune_help)
+    clear_help = "Remove all the entries from the cache, then exit."
+    mode_group.add_argument("--clear-cache", action="store_true",
+                            help=clear_help)
     export_pdf_help = "PDF File that the breakdown information should "\
                       "be exported to. If left empty, the folder path "\
                       "will be used. Name will be current time stamp."
     args.add_argument("--export-path", "-e", dest="export",
                       help=export_pdf_help)
+    output_help = "Report output, \"pdf\" by default. \"html\" writes a "\
+                  "light page with small thumbnail images next to it. "\
+                  "\"jsonl\" and \"csv\" write a catalog with one record "\
+                  "of the video details per video as soon as it is read, "\
+                  "the frames are not exported at all."
+    args.add_argument("--output", "-o", choices=REPORT_OUTPUTS,
+                      default="pdf", help=output_help)
+    jobs_help = "Number of videos to process at the same time, 0 will "\
+                "use all the cores of the machine. Default is 1."
+    args.add_argument("--jobs", "-j", type=int, default=1,
+                      help=jobs_help)
+    since_last_help = "Only process the videos in the folder path(s) "\
+                      "that are new or modified since the last "\
+                      "--since-last run and write a delta report."
+    args.add_argument("--since-last", action="store_true",
+                      help=since_last_help)
+    threads_help = "Run the jobs as threads of a single process instead "\
+                   "of worker processes. Many light exiftool reads can "\
+                   "run next to a few heavy ffmpeg decodes, see the "\
+                   "processes limits in the config."
+    args.add_argument("--threads", action="store_true", help=threads_help)
+    no_cache_help = "Do not use the metadata cache, every video is "\
+                    "hashed and read again."
+    args.add_argument("--no-cache", dest="use_cache",
+                      action="store_false", help=no_cache_help)
+    no_open_help = "Do not open the PDF once it is exported."
+    args.add_argument("--no-open", dest="open_pdf",
+                      action="store_false", help=no_open_help)
+    queue_help = "Put the videos of the path(s) into a new work queue "\
+                 "folder on a shared file system instead of processing "\
+                 "them, see --worker and --merge."
+    args.add_argument("--queue", metavar="QUEUE", help=queue_help)
+    trace_help = "Trace the time spent in every stage of every video and "\
+                 "write a Chrome trace (_TRACE.json) and Prometheus "\
+                 "metrics (_METRICS.prom) next to the PDF."
+    args.add_argument("--trace", action="store_true", help=trace_help)
 
     return args.parse_args()
 
-def _process_dirs(dir_path):
-    """ Process directories
+def _maintain_cache(clear):
+    """ Prune or clear the metadata cache
 
     Args:
-        dir_path (`str`): directory path to search the video files from
+        clear (`bool`): Remove all the entries instead of the stale ones
+    """
+    cache = MetadataCache(get_cache_path())
+    if clear:
+        removed = cache.clear()
+    else:
+        removed = cache.prune()
+    print ("Removed {0} entries from the cache {1}".format(
+        removed, cache.cache_path))
+
+def _get_pdf_path(pdf_path, path, output="pdf"):
+    """ Check the PDF path, or name it with the current time stamp in the
+        folder of the first path if it is not given
+
+    Args:
+        pdf_path (`str`): PDF path from the arguments
+        path (`list`): Paths from the arguments
+        output (`str`): Report output, the extension of the named path
+
+    Raises:
+        RuntimeError: PDF path is a folder or exists already
 
     Returns:
-        `list`: List of file paths for the videos after recursive search
-                of the directory entered
+        `str`: PDF path
     """
-    final_paths = list()
-    for _path in os.listdir(dir_path):
-        full_path = os.path.join(dir_path, _path)
-        if os.path.isdir(full_path):
-            final_paths.extend(_process_dirs(full_path))
-        else:
-            final_paths.append(full_path)
-    return final_paths
+    # If we have the PDF path value
+    if pdf_path:
+        # Lets check if the path provided is directory or not
+        if os.path.isdir(pdf_path):
+            raise RuntimeError("Path {0} is not a" \
+                               " file path!".format(pdf_path))
+
+        # Let's check if the path already exists or not
+        if os.path.exists(pdf_path):
+            raise RuntimeError("Path {0} already exists.".format(pdf_path))
+        return pdf_path
+    # If the pdf path argument is empty, the name is the current
+    # time stamp
+    # NOTE: WE TAKE THE FIRST ELEMENT OF THE PATH LIST
+    if os.path.isdir(path[0]):
+        return get_report_path(path[0], output=output)
+    return get_report_path(os.path.dirname(path[0]), output=output)
 
 def _open_pdf(pdf_path):
     """ Open the genereated PDF depending on the which OS
@@ -76,6 +146,8 @@ def _open_pdf(pdf_path):
     Args:
         pdf_path (`str`): _description_
     """
+    # The viewer is not a tool workload, it is left out of the process
+    # runner as it would wait for the viewer to close its output
     if OS == "Darwin": # Mac OS
         subprocess.call(('open', pdf_path))
     elif OS == "Windows": # Windows
@@ -84,6 +156,35 @@ def _open_pdf(pdf_path):
         subprocess.call(('xdg-open', pdf_path))
 
 
+def _report_done(report, open_pdf=True):
+    """ Tell where the PDF (or the HTML page) is and open it, catalogs are
+        not opened
+
+    Args:
+        report (`dict`): Summary of the report (see export_report)
+        open_pdf (`bool`): Open the PDF
+    """
+    if not report.get("exported"):
+        print ("Noting to export! Exiting the app.")
+        return
+
+    if report.get("output") in CATALOG_FORMATS:
+        print ("Catalog of {0} videos exported to {1}".format(
+            report.get("videos"), report.get("export_path")))
+        return
+
+    output_name = report.get("output").upper()
+    print ("{0} Exported to {1}".format(output_name,
+                                        report.get("export_path")))
+
+    if not open_pdf:
+        return
+
+    print ("Opening the {0} file".format(output_name))
+
+    _open_pdf(pdf_path=report.get("export_path"))
+
+
 def main():
     """ Main function that will run the video info, breakdown
         and pdf creation
@@ -100,17 +201,61 @@ def main():
               "config.yml, please update with " \
               "the necesssary changes.")
         return
-    global TIME_STAMP
-    TIME_STAMP = time.time()
     arg = _parse_arguments()
-    path = arg.path
-    pdf_path = arg.export
+    if arg.prune_cache or arg.clear_cache:
+        _maintain_cache(clear=arg.clear_cache)
+        return
+    jobs = get_jobs(arg.jobs)
+    if arg.output in CATALOG_FORMATS and (arg.worker or arg.merge or
+                                          arg.queue):
+        raise RuntimeError("--output {0} can not be used with the work "
+                           "queue".format(arg.output))
+    if arg.since_last and arg.output in CATALOG_FORMATS:
+        raise RuntimeError("--output {0} can not be used with "
+                           "--since-last".format(arg.output))
+    if arg.resume and arg.output != "pdf":
+        raise RuntimeError("--resume goes on with the output of the run")
+    if arg.worker:
+        queue = WorkQueue(arg.worker)
+        processed = run_worker(queue, jobs=jobs, use_cache=arg.use_cache,
+                               threads=arg.threads)
+        print ("Processed {0} videos, nothing left in the queue {1}".format(
+            processed, queue.queue_dir))
+        return
+    if arg.merge:
+        queue = WorkQueue(arg.merge)
+        pdf_path = _get_pdf_path(arg.export, queue.paths, output=arg.output)
+        report = export_report(queue.iter_results(), pdf_path,
+                               trace=arg.trace, output=arg.output)
+        _report_done(report, open_pdf=arg.open_pdf)
+        return
+    if arg.queue and (arg.since_last or arg.resume):
+        raise RuntimeError("--queue can not be used with --since-last or "
+                           "--resume")
+    journal = None
+    if arg.resume:
+        # The paths and the PDF path come from the run
+        journal = RunJournal.load(arg.resume)
+        path = journal.paths
+        pdf_path = journal.pdf_path
+        since_last = journal.since_last
+        # The PDF or the HTML page, from the extension
+        output = os.path.splitext(pdf_path)[-1].lstrip(".").lower()
+        if os.path.exists(pdf_path):
+            raise RuntimeError("Run {0} is already exported to {1}".format(
+                journal.run_dir, pdf_path))
+        print ("NOTE: Resuming the run, {0} videos are done already".format(
+            len(journal.entries)))
+    else:
+        path = arg.path
+        pdf_path = arg.export
+        since_last = arg.since_last
+        output = arg.output
 
     # start time of the application 
     errored_paths = list()
     paths_to_proc = list()
-
-    pdf_info_list = list()
+    snapshots = list()
 
     for _path in path:
         # Check if the path exists or not!
@@ -118,131 +263,48 @@ def main():
             errored_paths.append(_path)
             continue
         if os.path.isdir(_path):
-            paths_to_proc.extend(_process_dirs(_path))
-        else:
-            paths_to_proc.append(_path)
-
-    # If we have the PDF path value
-    if pdf_path:
-        # Lets check if the path provided is directory or not
-        if os.path.isdir(pdf_path):
-            raise RuntimeError("Path {0} is not a" \
-                               " file path!".format(pdf_path))
-
-        # Let's check if the path already exists or not
-        if os.path.exists(pdf_path):
-            raise RuntimeError("Path {0} already exists.".format(pdf_path))
-    else:
-        # If the pdf path argument is empty
-        current_date = time.strftime("%Y%m%d_%H%M%S_vb.pdf")
-        # NOTE: WE TAKE THE FIRST ELEMENT OF THE PATH LIST
-        if os.path.isdir(path[0]):
-            pdf_path = os.path.join(path[0], current_date)
+            # The videos are processed while the folder is walked
+            dir_paths = walk_videos(_path)
+            if since_last:
+                # Only the changes since the last snapshot of the folder
+                snapshot = ScanSnapshot(_path)
+                dir_paths = snapshot.update(scan_videos(_path))
+                snapshots.append(snapshot)
+            paths_to_proc.append(dir_paths)
         else:
-            path_dir = os.path.dirname(path[0])
-            pdf_path = os.path.join(path_dir, current_date)
-
-    # Set the error output name
-    _pdf_name_details = os.path.splitext(pdf_path)
-    error_output = _pdf_name_details[0] + "_ERRORS.txt"
+            paths_to_proc.append([_path])
 
     # If path does not exists, then let's report that
     if len(errored_paths):
         raise RuntimeError("Following paths do not exists"
                            " {0}".format("\n".join(errored_paths)))
 
-    # store the framepaths
-    framepaths = []
-    # store the skipped or errored paths
-    export_errors = dict()
-    for _path in paths_to_proc:
-        print ("Processing - {0}".format(_path))
-        if not validate_input(_path):
-            print ("WARNING: Cannot process the path, format does not match"
-                   " the allowed formats. SKIPPING...\n\n")
-            continue
-        try:
-            # Video Info object will be created for the video path
-            video_data = VideoInfo(video_path=_path)
-            video_info = video_data.videoprops
-            video_name = video_data.name
-        except Exception as e:
-            print ("WARNING: Can't get video info {0}, check error" \
-                   " output file for details.".format(_path))
-            export_errors[_path] = str(e)
-            continue
-
-        if DEBUG_COUNTER:
-            time_taken("Video frames processed.")
-        print ("Information gathered for {0}".format(video_name))
-        print ("Exporting frames...")
-        # Let's export the frames
-        try:
-            frames_data = VideoFrames(video_path=_path,
-                                    video_name=video_name,
-                                    video_framecount=video_info.get("Frames"),
-                                    resolution=video_info.get("Resolution"),
-                                    video_rotation=video_data.videorotation)
-
-            frames_path = frames_data.export_frames()
-            framepaths.append(frames_path)
-        except Exception as e:
-            print ("WARNING: Can't export video frames {0}, check error" \
-                   " output file for details.".format(_path))
-            export_errors[_path] = str(e)
-            continue
-
-        print ("Frames exporting and combining finished")
-        if DEBUG_COUNTER:
-            time_taken("Video frames exported and combined.")
-        # Store all this in the information
-        vertical = False if video_data.videorotation==0 else True
-        frames_info_dict = dict(name=video_name,
-                                details=video_info,
-                                thumbnail=frames_path,
-                                scale=frames_data.scale,
-                                vertical=vertical)
-        # Insert into the pdf info list
-        pdf_info_list.append(frames_info_dict)
-
-        print ("="*80)
-
-    if len(pdf_info_list) == 0:
-        print ("Noting to export! Exiting the app.")
+    if arg.queue:
+        queue = WorkQueue.create(arg.queue, path,
+                                 itertools.chain.from_iterable(paths_to_proc))
+        print ("Queued {0} videos in {1}, start the workers with --worker "
+               "and export the PDF with --merge".format(queue.total,
+                                                       queue.queue_dir))
         return
 
-    # Let's start creating the PDF creator object
-    print ("Exporting final PDF")
-    try:
-        pdf_creator_object = PdfCreator(video_details=pdf_info_list,
-                                        export_file_path=pdf_path,
-                                        pdf_dimensions=get_dimensions(framepaths))
-        pdf_creator_object.populate_pdf()
-    except Exception as e:
-        print ("ERROR: PDF exporting failed!")
-        raise
-
-    if DEBUG_COUNTER:
-        time_taken("PDF creation finished.")
-
-    # If we have errored frames then let's print export them in a text file
-    if len(export_errors.keys()) > 0:
-        _final_error_string = ""
-        for path, error_str in export_errors.items():
-            _final_error_string += "{0} - {1}".format(path, error_str)
-            _final_error_string += "\n\n" + "*"*80 + "\n\n"
-
-        with open(error_output, "w") as file_open:
-            file_open.write(_final_error_string)
-
-        print ("NOTE: Please look at \"{0}\" for full details about" \
-               " errors".format(error_output))
+    # Resumed runs have their own PDF path
+    if not journal:
+        pdf_path = _get_pdf_path(pdf_path, path, output=output)
 
-    print ("PDF Exported to {0}".format(pdf_path))
+    # Every processed video goes into the journal, so a failed or stopped
+    # run can go on from there. The catalogs are written as they go
+    if journal is None and journal_enabled() and \
+            output not in CATALOG_FORMATS:
+        journal = RunJournal.create(get_run_dir(pdf_path), path, pdf_path,
+                                    since_last=since_last)
 
-    print ("Opening the PDF file")
+    report = create_report(itertools.chain.from_iterable(paths_to_proc),
+                           pdf_path, jobs=jobs, use_cache=arg.use_cache,
+                           threads=arg.threads, trace=arg.trace,
+                           snapshots=snapshots, journal=journal,
+                           output=output)
 
-    _open_pdf(pdf_path=pdf_path)
+    _report_done(report, open_pdf=arg.open_pdf)
 
 if __name__ == "__main__":
     main()
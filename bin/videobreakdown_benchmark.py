@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# std imports
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+# internal
+from videobreakdown.benchmark import (run_benchmark, write_results,
+                                      load_results, compare_results,
+                                      format_comparison, measure_imports,
+                                      STARTUP_BUDGET)
+from videobreakdown.base import uptodate_app_config
+
+
+def _parse_arguments():
+    """Argument parser function
+
+    Returns:
+        `Namespace` : Argument parser object
+    """
+    help_str = "Video Breakdown Benchmarks"
+    args = ArgumentParser(help_str)
+    commands = args.add_subparsers(dest="command", required=True)
+
+    run_help = "Generate the synthetic clips and time every stage"
+    run_args = commands.add_parser("run", help=run_help)
+    output_help = "JSON file the results are written to"
+    run_args.add_argument("--output", "-o", required=True, help=output_help)
+    clips_help = "Directory of the synthetic clips, they are generated "\
+                 "only once. Default is in the temp directory."
+    run_args.add_argument("--clips-dir", default=os.path.join(
+        tempfile.gettempdir(), "videobreakdown_clips"), help=clips_help)
+    repeat_help = "How many times every stage is run, the median run is "\
+                  "kept. Default is 3."
+    run_args.add_argument("--repeat", type=int, default=3, help=repeat_help)
+
+    compare_help = "Compare the results against baseline results"
+    compare_args = commands.add_parser("compare", help=compare_help)
+    compare_args.add_argument("baseline", help="Baseline results JSON file")
+    compare_args.add_argument("current", help="Results JSON file to compare")
+    threshold_help = "Allowed slow down before a stage is a regression, "\
+                     "0.1 is 10%%. Default is 0.1."
+    compare_args.add_argument("--threshold", type=float, default=0.1,
+                              help=threshold_help)
+
+    startup_help = "Measure the import time of the application startup "\
+                   "and check it against the budget"
+    startup_args = commands.add_parser("startup", help=startup_help)
+    budget_help = "Import time budget in seconds. Default is "\
+                  "{0}.".format(STARTUP_BUDGET)
+    startup_args.add_argument("--budget", type=float, default=STARTUP_BUDGET,
+                              help=budget_help)
+    top_help = "Number of the slowest modules to list. Default is 10."
+    startup_args.add_argument("--top", type=int, default=10, help=top_help)
+
+    return args.parse_args()
+
+
+def main():
+    """ Main function that runs or compares the benchmarks, or checks the
+        startup
+
+    Returns:
+        `int`: Exit code, 1 if a stage regressed or the startup is over
+               the budget
+    """
+    if not uptodate_app_config():
+        print("WARNING: You need to make sure the appconfig.yml " \
+              "entries match the entries in the " \
+              "config.yml, please update with " \
+              "the necesssary changes.")
+        return 1
+    arg = _parse_arguments()
+    if arg.command == "run":
+        results = run_benchmark(clips_dir=arg.clips_dir, repeat=arg.repeat)
+        write_results(results, arg.output)
+        print ("Benchmark results written to {0}".format(arg.output))
+        return 0
+
+    if arg.command == "startup":
+        import_time, modules = measure_imports()
+        for _time, _name in modules[:arg.top]:
+            print ("{0:>9.1f}ms {1}".format(_time * 1000, _name))
+        print ("\nImport time {0:.1f}ms, budget {1:.1f}ms".format(
+            import_time * 1000, arg.budget * 1000))
+        if import_time > arg.budget:
+            print ("\nERROR: The startup is over the budget!")
+            return 1
+        return 0
+
+    comparison = compare_results(load_results(arg.baseline),
+                                 load_results(arg.current),
+                                 threshold=arg.threshold)
+    print (format_comparison(comparison))
+    if any(_row["regression"] for _row in comparison):
+        print ("\nERROR: Stages are slower than the baseline!")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
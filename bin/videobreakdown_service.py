@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# std imports
+import sys
+import signal
+import threading
+from argparse import ArgumentParser
+
+# internal
+from videobreakdown.service import BreakdownService, create_server
+from videobreakdown.pipeline import get_jobs
+from videobreakdown.base import uptodate_app_config
+
+
+def _parse_arguments():
+    """Argument parser function
+
+    Returns:
+        `Namespace` : Argument parser object
+    """
+    help_str = "Video Breakdown Job Service"
+    args = ArgumentParser(help_str)
+    host_help = "Address to listen on, overrides the service host of the "\
+                "config (127.0.0.1 by default)."
+    args.add_argument("--host", help=host_help)
+    port_help = "Port to listen on, overrides the service port of the "\
+                "config."
+    args.add_argument("--port", type=int, help=port_help)
+    jobs_help = "Number of videos to process at the same time for all the "\
+                "jobs together, 0 will use all the cores of the machine. "\
+                "Default is 1."
+    args.add_argument("--jobs", "-j", type=int, default=1, help=jobs_help)
+    runners_help = "Number of jobs that run at the same time, overrides "\
+                   "the service runners of the config."
+    args.add_argument("--runners", type=int, help=runners_help)
+    threads_help = "Run the jobs as threads of a single process instead "\
+                   "of worker processes."
+    args.add_argument("--threads", action="store_true", help=threads_help)
+    no_cache_help = "Do not use the metadata cache, every video is "\
+                    "hashed and read again."
+    args.add_argument("--no-cache", dest="use_cache",
+                      action="store_false", help=no_cache_help)
+
+    return args.parse_args()
+
+
+def main():
+    """ Main function that serves the jobs until it is stopped, the running
+        jobs are finished before it exits
+
+    Returns:
+        `int`: Exit code
+    """
+    if not uptodate_app_config():
+        print("WARNING: You need to make sure the appconfig.yml " \
+              "entries match the entries in the " \
+              "config.yml, please update with " \
+              "the necesssary changes.")
+        return 1
+    arg = _parse_arguments()
+    service = BreakdownService(jobs=get_jobs(arg.jobs), threads=arg.threads,
+                               use_cache=arg.use_cache, runners=arg.runners)
+    server = create_server(service, host=arg.host, port=arg.port)
+    # shutdown waits for serve_forever, so it can't run in this thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(
+        target=server.shutdown).start())
+    service.start()
+    print ("Serving the jobs on http://{0}:{1}".format(
+        *server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    print ("Stopping, waiting for the running jobs")
+    service.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
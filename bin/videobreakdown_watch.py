@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# std imports
+import os
+import sys
+import signal
+from argparse import ArgumentParser
+
+# internal
+from videobreakdown.watcher import WatchDaemon, WATCH_MODES
+from videobreakdown.pipeline import get_jobs
+from videobreakdown.base import get_config, uptodate_app_config
+
+
+def _parse_arguments():
+    """Argument parser function
+
+    Returns:
+        `Namespace` : Argument parser object
+    """
+    help_str = "Video Breakdown Watch Folder Daemon"
+    args = ArgumentParser(help_str)
+    path_help = "Folder(s) to watch. If left empty, the watch paths of "\
+                "the config are used."
+    args.add_argument("--path", "-p", nargs="*", help=path_help)
+    export_help = "Folder the reports are written to. If left empty, the "\
+                  "watch export path of the config is used, or the "\
+                  "watched folder the videos landed in."
+    args.add_argument("--export-dir", "-e", help=export_help)
+    jobs_help = "Number of videos to process at the same time, 0 will "\
+                "use all the cores of the machine. Default is 1."
+    args.add_argument("--jobs", "-j", type=int, default=1, help=jobs_help)
+    threads_help = "Run the jobs as threads of a single process instead "\
+                   "of worker processes."
+    args.add_argument("--threads", action="store_true", help=threads_help)
+    mode_help = "How the folders are watched, overrides the watch mode "\
+                "of the config."
+    args.add_argument("--mode", choices=WATCH_MODES, help=mode_help)
+    settle_help = "Seconds the size and modification time of a video "\
+                  "have to stay the same before it is processed, "\
+                  "overrides the watch settle time of the config."
+    args.add_argument("--settle-time", type=float, help=settle_help)
+    no_cache_help = "Do not use the metadata cache, every video is "\
+                    "hashed and read again."
+    args.add_argument("--no-cache", dest="use_cache",
+                      action="store_false", help=no_cache_help)
+    trace_help = "Write a Chrome trace (_TRACE.json) and Prometheus "\
+                 "metrics (_METRICS.prom) next to every report."
+    args.add_argument("--trace", action="store_true", help=trace_help)
+
+    return args.parse_args()
+
+
+def main():
+    """ Main function that watches the folders until it is stopped, SIGTERM
+        stops it once the report that is being written is done
+
+    Raises:
+        RuntimeError: No folders to watch or the folders do not exist
+
+    Returns:
+        `int`: Exit code
+    """
+    if not uptodate_app_config():
+        print("WARNING: You need to make sure the appconfig.yml " \
+              "entries match the entries in the " \
+              "config.yml, please update with " \
+              "the necesssary changes.")
+        return 1
+    arg = _parse_arguments()
+    paths = arg.path or (get_config().get("watch") or {}).get("paths")
+    if not paths:
+        raise RuntimeError("No folders to watch, use --path or the watch "
+                           "paths in the config")
+    errored_paths = [_path for _path in paths if not os.path.isdir(_path)]
+    if errored_paths:
+        raise RuntimeError("Following folders do not exists"
+                           " {0}".format("\n".join(errored_paths)))
+
+    daemon = WatchDaemon(paths, export_dir=arg.export_dir,
+                         jobs=get_jobs(arg.jobs), threads=arg.threads,
+                         use_cache=arg.use_cache, trace=arg.trace,
+                         mode=arg.mode, settle_time=arg.settle_time)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    print ("Stopped watching, {0} reports exported".format(
+        len(daemon.reports)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
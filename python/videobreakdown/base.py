@@ -1,18 +1,8 @@
 #!/usr/bin/env python
-from asyncio import constants
 import os
-from numpy import maximum
 import yaml
 import getpass
 import platform
-from PIL import Image
-
-# Third party imports
-from reportlab.lib.units import mm
-from reportlab.lib.colors import (darkblue,
-                                  gray,
-                                  black,
-                                  lightblue)
 
 # Global variables
 SELF_PATH = os.path.realpath(__file__)
@@ -20,14 +10,34 @@ SELF_DIR_PATH = os.path.dirname(SELF_PATH)
 # Config path to be used in the applications
 APP_CONFIG_PATH = os.path.realpath(os.path.join(SELF_DIR_PATH, "../..", "appconfig.yml"))
 CONFIG_PATH = os.path.realpath(os.path.join(SELF_DIR_PATH, "../..", "config.yml"))
-# What tags are to be used
-GETTAGS_COMMAND = '"{toolpath}" -api largefilesupport=1 -args -T -{tags} "{video}" -j > \"{output}\"'
-# Frames export command
-EXPORT_FRAMES = "\"{ffmpeg_cmd}\" {hw_accel} -i \"{input}\" " \
-                "-crf 0 -vf {transpose}scale={scale},select='{frameselect}' " \
-                "-vsync 0 \"{output}\" -hide_banner -loglevel error"
+# Cache of the video properties, kept next to the app config
+CACHE_PATH = os.path.realpath(os.path.join(SELF_DIR_PATH, "../..", "videobreakdown_cache.db"))
+# Scan snapshots of the directories, kept next to the app config
+SNAPSHOTS_PATH = os.path.realpath(os.path.join(SELF_DIR_PATH, "../..", "snapshots"))
+# What tags are to be used, the tag arguments and the video path are
+# added after these
+GETTAGS_ARGS = ["-api", "largefilesupport=1", "-args", "-T", "-j"]
+# Common ffmpeg arguments, before the hardware acceleration and input
+FFMPEG_ARGS = ["-hide_banner", "-loglevel", "error"]
+# Frames export arguments
+EXPORT_FRAMES = ["-i", "{input}", "-crf", "0",
+                 "-vf", "{transpose}scale={scale},select={frameselect}",
+                 "-vsync", "0"]
+# Frames output to files
+FILE_OUTPUT = ["{path}"]
+# Frames output as raw RGB frames on stdout
+PIPE_OUTPUT = ["-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
 # Frames selection argument
-FRAMES_SEL = "eq(n\,{frame})"
+FRAMES_SEL = r"eq(n\,{frame})"
+# Single frame export arguments, seeking to the timestamp before opening
+# the input so only one frame is decoded
+EXPORT_SEEK_FRAME = ["-ss", "{timestamp}", "-i", "{input}", "-frames:v", "1",
+                     "-vf", "{transpose}scale={scale}"]
+# Keyframe export arguments, the seek stops at the keyframe before the
+# timestamp and only the keyframes are decoded (no GOP decoding)
+EXPORT_KEYFRAME = ["-skip_frame", "nokey", "-noaccurate_seek",
+                   "-ss", "{timestamp}", "-i", "{input}", "-frames:v", "1",
+                   "-vf", "{transpose}scale={scale}"]
 
 # Get the username
 USERNAME = getpass.getuser()
@@ -35,8 +45,12 @@ USERNAME = getpass.getuser()
 # Operating system
 OS = platform.system()
 
+# Trace the runs (see tracing), same as the --trace argument
+DEBUG_COUNTER = os.environ.get("VIDEOBREAKDOWN_DEBUG")
+
 _CONFIG_DICT = dict()
 
+
 def _get_config():
     """ Read the YAML config for the application
 
@@ -75,6 +89,17 @@ def uptodate_app_config():
         return False
     return True
 
+def format_args(args_template, **kwargs):
+    """ Fill in the values of a command arguments template
+
+    Args:
+        args_template (`list`): Arguments with format fields
+
+    Returns:
+        `list`: Arguments with the values
+    """
+    return [_arg.format(**kwargs) for _arg in args_template]
+
 def validate_input(input_path):
     """ Confirm if we can indeed process the path
 
@@ -93,10 +118,11 @@ def validate_input(input_path):
 
 def get_dimensions(thumbnails):
     """ Get the maximum height and maximum width of
-        the thumbnail paths from the list
+        the thumbnails from the list
 
     Args:
-        thumbnails (`list`): list of thumbnail paths
+        thumbnails (`list`): list of Thumbnail objects, the sizes are
+                             read from them (no image is opened)
 
     Returns:
         `int`, `int`: maximum width and maximum height
@@ -104,182 +130,10 @@ def get_dimensions(thumbnails):
     maximum_width = 0
     maximum_height = 0
     for _thumbnail in thumbnails:
-        _img = Image.open(_thumbnail)
-        _width = _img.width
-        _height = _img.height
-        if _width > maximum_width:
-            maximum_width = _width
-        if _height > maximum_height:
-            maximum_height = _height
+        if _thumbnail.width > maximum_width:
+            maximum_width = _thumbnail.width
+        if _thumbnail.height > maximum_height:
+            maximum_height = _thumbnail.height
 
     return maximum_width , maximum_height
 
-
-class PdfConstants(object):
-    """ Constant object for the pdf, includes a bunch
-        of spaces, buffers and values
-    """
-    @property
-    def start_x(self):
-        """ PDF start x position
-
-        Returns:
-            `int`: x position value
-        """
-        return 25 * mm
-
-    @property
-    def start_y(self):
-        """ PDF start y position
-
-        Returns:
-            `int`: y position value
-        """
-        return 10 * mm
-
-    @property
-    def linefactor_x(self):
-        """ PDF line x position
-
-        Returns:
-            `int`: line x position value
-        """
-        return 1.5 * mm
-
-    @property
-    def linefactor_y(self):
-        """ PDF line y position
-
-        Returns:
-            `int`: line y position value
-        """
-        return 5 * mm
-
-    @property
-    def titlefactor_x(self):
-        """ PDF title x position
-
-        Returns:
-            `int`: title x position value
-        """
-        return 0
-
-    @property
-    def titlefactor_y(self):
-        """ PDF title y position
-
-        Returns:
-            `int`: title y position value
-        """
-        return 6 * mm
-
-    @property
-    def title_size(self):
-        """ PDF title font size value
-
-        Returns:
-            `int`: title font size value
-        """
-        return 12
-
-    @property
-    def text_size(self):
-        """ PDF text font size value
-
-        Returns:
-            `int`: pdf text font size value
-        """
-        return 10
-
-    @property
-    def title_color(self):
-        """ PDF title color value
-
-        Returns:
-            `str`: Color value for the title
-        """
-        return darkblue
-
-    @property
-    def key_color(self):
-        """ PDF details key color value
-
-        Returns:
-            `str`: Color value for the details key
-        """
-        return black
-
-    @property
-    def value_color(self):
-        """ PDF details value color
-
-        Returns:
-            `str`: Color value of the details
-        """
-        return gray
-
-    @property
-    def bbox_color(self):
-        """ Bounding box color for even entries in the pdf
-
-        Returns:
-            `str`: Color value of the bounding box
-        """
-        return lightblue
-
-    @property
-    def key_font(self):
-        """ Font value of the details key in the pdf
-
-        Returns:
-            `str`: Font name of the details key
-        """
-        # you can use the function canvas.getAvailableFonts
-        # for more options!
-        return "Helvetica-Bold"
-
-    @property
-    def title_font(self):
-        """ Font value of the title in the pdf
-
-        Returns:
-            `str`: Font value of the title
-        """
-        return "Courier-BoldOblique"
-
-    @property
-    def value_font(self):
-        """ Font value of the details in the pdf
-
-        Returns:
-            `str`: Font value of the detail entries
-        """
-        return "Helvetica"
-
-    @property
-    def bbox_overflow(self):
-        """ Top and bottom overflow value of the bbox
-            around the even entries in the PDF
-
-        Returns:
-            `int`: Overflow value
-        """
-        return 6 * mm
-
-    @property
-    def thumbnail_x_pos(self):
-        """ Thumbnail x position in the PDF
-
-        Returns:
-            `int`: Position where thumbnail will start
-        """
-        return 70 * mm
-
-    @property
-    def width_buffer(self):
-        """ Width buffer value to be added after thumbnail entries
-
-        Returns:
-            `int`: Buffer value to be added after thumbnails
-        """
-        return 10*mm
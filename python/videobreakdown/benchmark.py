@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+# std imports
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import subprocess
+import tempfile
+
+try:
+    import resource
+except ImportError:
+    # Not available on windows, no peak memory values there
+    resource = None
+
+# internal
+from .base import get_config, get_dimensions, OS, CONFIG_PATH
+from .process import get_runner, DECODE
+from .videoinfo import VideoInfo
+from .videoframes import VideoFrames
+from .pdfcreator import PdfCreator
+
+# Results file format version
+BENCHMARK_VERSION = 1
+# Synthetic clips of the suite, every one of them is generated locally
+# with the ffmpeg test source so the runs are the same on every machine
+BENCHMARK_CLIPS = [
+    dict(codec="libx264", resolution="1280x720", duration=10, rotation=0,
+         extension=".mp4"),
+    dict(codec="libx264", resolution="1920x1080", duration=30, rotation=0,
+         extension=".mp4"),
+    dict(codec="libx264", resolution="1920x1080", duration=10, rotation=90,
+         extension=".mov"),
+    dict(codec="libx264", resolution="3840x2160", duration=5, rotation=270,
+         extension=".mp4"),
+    dict(codec="mpeg4", resolution="640x360", duration=60, rotation=0,
+         extension=".mp4"),
+    dict(codec="mjpeg", resolution="1280x720", duration=5, rotation=0,
+         extension=".mov"),
+]
+# Frame rate of the synthetic clips
+CLIP_FPS = 25
+# ffmpeg arguments generating a clip from the test source
+GENERATE_CLIP = ["-y", "-f", "lavfi", "-i",
+                 "testsrc=size={resolution}:rate={fps}:duration={duration}",
+                 "-c:v", "{codec}", "-pix_fmt", "yuv420p",
+                 "-metadata:s:v:0", "rotate={rotation}"]
+# Stages timed for every clip, the pdf and the end to end runs are timed
+# once for all the clips
+CLIP_STAGES = ["gen_hash", "process_video_props", "export_frames",
+               "combine_images"]
+RUN_STAGES = ["populate_pdf", "main", "startup"]
+# Application script for the end to end runs
+APP_PATH = os.path.realpath(os.path.join(os.path.dirname(CONFIG_PATH),
+                                         "bin", "videobreakdown_app.py"))
+# Import time budget of the application startup in seconds, the short
+# single file calls mostly pay for the imports
+STARTUP_BUDGET = 0.15
+
+
+def clip_name(clip):
+    """ File name of the synthetic clip
+
+    Args:
+        clip (`dict`): Clip settings (see BENCHMARK_CLIPS)
+
+    Returns:
+        `str`: Clip file name
+    """
+    return "{codec}_{resolution}_{duration}s_r{rotation}{extension}".format(
+        **clip)
+
+
+def generate_clips(clips_dir, clips=None):
+    """ Generate the synthetic clips with the ffmpeg test source, clips that
+        were already generated are kept
+
+    Args:
+        clips_dir (`str`): Directory of the clips
+        clips (`list`): Clip settings, by default BENCHMARK_CLIPS
+
+    Raises:
+        RuntimeError: Clip could not be generated
+
+    Returns:
+        `list`: Clip paths
+    """
+    clips = clips or BENCHMARK_CLIPS
+    tool_cmd = get_config().get("tools").get("ffmpeg").get(OS)
+    if not os.path.exists(clips_dir):
+        os.makedirs(clips_dir)
+
+    clip_paths = list()
+    args_list = list()
+    for clip in clips:
+        clip_path = os.path.join(clips_dir, clip_name(clip))
+        clip_paths.append(clip_path)
+        if os.path.exists(clip_path):
+            continue
+        clip_args = [_arg.format(fps=CLIP_FPS, **clip)
+                     for _arg in GENERATE_CLIP]
+        args_list.append([tool_cmd, "-hide_banner", "-loglevel", "error"] +
+                         clip_args + [clip_path])
+
+    for result in get_runner().run_many(args_list, kind=DECODE):
+        if result.returncode != 0:
+            # Half written clips would be kept for the next runs
+            if os.path.exists(result.args[-1]):
+                os.remove(result.args[-1])
+            raise RuntimeError("Can't generate the clip {0} - {1}".format(
+                result.args[-1], result.stderr))
+    return clip_paths
+
+
+def _get_peak_rss():
+    """ Peak memory of the process and of the finished child processes
+
+    Returns:
+        `int`, `int`: Peak RSS in KB of the process and of the children,
+                      None if it can not be read
+    """
+    if resource is None:
+        return None, None
+    # linux gives the peak since the last reset (see _reset_peak_rss)
+    self_peak = None
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status", "r") as file_open:
+            for line in file_open:
+                if line.startswith("VmHWM:"):
+                    self_peak = int(line.split()[1])
+                    break
+    if self_peak is None:
+        self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # mac gives bytes, everyone else KB
+        if OS == "Darwin":
+            self_peak = self_peak // 1024
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if OS == "Darwin":
+        children_peak = children_peak // 1024
+    return self_peak, children_peak
+
+
+def _reset_peak_rss():
+    """ Reset the peak memory of the process, so it is measured for every
+        stage (linux only, elsewhere it is the peak of the whole run)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as file_open:
+            file_open.write("5")
+    except OSError:
+        pass
+
+
+def _get_children_cpu():
+    """ CPU time of the finished child processes (ffmpeg, exiftool)
+
+    Returns:
+        `float`: User and system time in seconds
+    """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(func, *args, **kwargs):
+    """ Run the function and measure it
+
+    Args:
+        func (`function`): Function to measure
+
+    Returns:
+        `object`, `dict`: Return value of the function and the wall time,
+                          cpu time (including the child processes) and
+                          peak memory
+    """
+    _reset_peak_rss()
+    cpu_start = time.process_time() + _get_children_cpu()
+    wall_start = time.perf_counter()
+    value = func(*args, **kwargs)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() + _get_children_cpu() - cpu_start
+    self_peak, children_peak = _get_peak_rss()
+    return value, dict(wall=wall, cpu=cpu, peak_rss_kb=self_peak,
+                       children_peak_rss_kb=children_peak)
+
+
+class _BenchmarkInfo(VideoInfo):
+    """ Video info that keeps the hash of the gen_hash stage, so reading
+        the properties does not hash the clip again
+
+    Args:
+        VideoInfo (_type_): _description_
+    """
+    measured_hash = None
+
+    @property
+    def hash(self):
+        """ Hash value of the video, from the gen_hash stage
+
+        Returns:
+            `str`: Hash value of the file
+        """
+        if self.measured_hash is None:
+            self.measured_hash = self._gen_hash()
+        return self.measured_hash
+
+
+class _BenchmarkFrames(VideoFrames):
+    """ Video frames that measure the combining of the images
+
+    Args:
+        VideoFrames (_type_): _description_
+    """
+    combine_measure = None
+
+    def _combine_images(self, output, output_name):
+        """ Combine the images into a single thumbnail and measure it
+
+        Args:
+            output (`str`): Thumbnail output directory
+            output_name (`str`): Thumbnail output name
+
+        Returns:
+            `Thumbnail`: Combined thumbnail file
+        """
+        thumbnail, self.combine_measure = measure(
+            super(_BenchmarkFrames, self)._combine_images, output,
+            output_name)
+        return thumbnail
+
+
+def _run_clip_stages(clip_path):
+    """ Run the stages of a single clip
+
+    Args:
+        clip_path (`str`): Clip path
+
+    Returns:
+        `dict`, `dict`: Measures of every stage and the pdf details of the
+                        clip
+    """
+    measures = dict()
+    video_data = _BenchmarkInfo(video_path=clip_path)
+    # Every stage only measures its own work, the props reuse the hash
+    video_data.measured_hash, measures["gen_hash"] = measure(
+        video_data._gen_hash)
+    video_info, measures["process_video_props"] = measure(
+        video_data._process_video_props)
+
+    def _get_frames(output):
+        frames_data = _BenchmarkFrames(
+            video_path=clip_path, video_name=video_data.name,
+            video_framecount=video_info.get("Frames"),
+            resolution=video_info.get("Resolution"),
+            video_rotation=video_data.videorotation,
+            fps=video_info.get("FPS"))
+        frames_data.frames_config = dict(frames_data.frames_config,
+                                         output=output)
+        return frames_data
+
+    frames_data = _get_frames(get_config().get("frames", {}).get("output"))
+    thumbnail, measures["export_frames"] = measure(frames_data.export_frames)
+    # The images are only combined for the thumbnail files
+    if frames_data.combine_measure is None:
+        frames_data = _get_frames("files")
+        file_thumbnail = frames_data.export_frames()
+        shutil.rmtree(os.path.dirname(file_thumbnail.path))
+    measures["combine_images"] = frames_data.combine_measure
+
+    video_detail = dict(name=video_data.name, details=video_info,
+                        thumbnail=thumbnail, scale=frames_data.scale,
+                        vertical=video_data.videorotation != 0)
+    return measures, video_detail
+
+
+def _get_app_env():
+    """ Environment of the application runs, the application imports this
+        same package
+
+    Returns:
+        `dict`: Environment variables
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [package_dir] + [_path for _path in [env.get("PYTHONPATH")] if _path])
+    return env
+
+
+def _run_main(clips_dir, pdf_path):
+    """ Run the application end to end on the clips, without the cache
+
+    Args:
+        clips_dir (`str`): Directory of the clips
+        pdf_path (`str`): PDF path to export to
+
+    Raises:
+        RuntimeError: Application run failed
+    """
+    result = subprocess.run([sys.executable, APP_PATH, "-p", clips_dir,
+                             "-e", pdf_path, "--no-cache", "--no-open"],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, env=_get_app_env())
+    if result.returncode != 0:
+        raise RuntimeError("Application run failed - {0}".format(
+            str(result.stderr, encoding="utf-8", errors="replace")))
+
+
+def measure_imports(script_path=APP_PATH):
+    """ Import time of the application startup, from python -X importtime
+        of a --help call (the modules are imported, nothing is run)
+
+    Args:
+        script_path (`str`): Application script
+
+    Raises:
+        RuntimeError: Application run failed
+
+    Returns:
+        `float`, `list`: Total import time in seconds and the import time
+                         and name of the modules imported at the top
+                         level, the slowest first
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime",
+                             script_path, "--help"],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, env=_get_app_env())
+    if result.returncode != 0:
+        raise RuntimeError("Application run failed - {0}".format(
+            str(result.stderr, encoding="utf-8", errors="replace")))
+    modules = list()
+    for line in str(result.stderr, encoding="utf-8",
+                    errors="replace").splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3:
+            continue
+        name = fields[2].rstrip()
+        # The nested imports are in the cumulative time of their parent
+        if name.startswith("  ") or not fields[1].strip().isdigit():
+            continue
+        modules.append((int(fields[1]) / 1000000.0, name.strip()))
+    modules.sort(reverse=True)
+    return sum(_time for _time, _ in modules), modules
+
+
+def run_benchmark(clips_dir, repeat=3, clips=None):
+    """ Generate the clips and measure every stage, the median run of
+        every stage is kept
+
+    Args:
+        clips_dir (`str`): Directory of the clips
+        repeat (`int`): How many times every stage is run
+        clips (`list`): Clip settings, by default BENCHMARK_CLIPS
+
+    Returns:
+        `dict`: Benchmark results
+    """
+    clip_paths = generate_clips(clips_dir, clips)
+    runs = dict()
+
+    def _add_run(stage, clip, stage_measure):
+        runs.setdefault((stage, clip), list()).append(stage_measure)
+
+    work_dir = tempfile.mkdtemp(prefix="videobreakdown_bench_")
+    try:
+        for run_index in range(max(int(repeat), 1)):
+            video_details = list()
+            for clip_path in clip_paths:
+                measures, video_detail = _run_clip_stages(clip_path)
+                for stage in CLIP_STAGES:
+                    _add_run(stage, os.path.basename(clip_path),
+                             measures[stage])
+                video_details.append(video_detail)
+
+            pdf_path = os.path.join(work_dir, "{0}.pdf".format(run_index))
+            pdf_creator = PdfCreator(
+                video_details=video_details, export_file_path=pdf_path,
+                pdf_dimensions=get_dimensions([_detail["thumbnail"] for
+                                               _detail in video_details]))
+            _, stage_measure = measure(pdf_creator.populate_pdf)
+            _add_run("populate_pdf", None, stage_measure)
+
+            pdf_path = os.path.join(work_dir, "{0}_main.pdf".format(run_index))
+            _, stage_measure = measure(_run_main, clips_dir, pdf_path)
+            _add_run("main", None, stage_measure)
+
+            (import_time, _), stage_measure = measure(measure_imports)
+            stage_measure["import_time"] = import_time
+            _add_run("startup", None, stage_measure)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = list()
+    for (stage, clip), stage_runs in runs.items():
+        result = dict(stage=stage, clip=clip,
+                      runs=[_run["wall"] for _run in stage_runs])
+        # The median run, so a single slow run does not move the result
+        result.update(sorted(stage_runs, key=lambda _run: _run["wall"])[
+            (len(stage_runs) - 1) // 2])
+        results.append(result)
+
+    config = get_config()
+    return dict(version=BENCHMARK_VERSION, created=time.time(),
+                python=platform.python_version(),
+                platform=platform.platform(),
+                machine=platform.machine(), cpu_count=os.cpu_count(),
+                repeat=repeat, clips=[clip_name(_clip) for _clip in
+                                      (clips or BENCHMARK_CLIPS)],
+                config=dict(frames=config.get("frames"),
+                            hash=config.get("hash"),
+                            metadata=config.get("metadata"),
+                            processes=config.get("processes")),
+                results=results)
+
+
+def write_results(results, output_path):
+    """ Write the benchmark results as JSON
+
+    Args:
+        results (`dict`): Benchmark results
+        output_path (`str`): JSON file path
+    """
+    with open(output_path, "w") as file_open:
+        json.dump(results, file_open, indent=2)
+
+
+def load_results(results_path):
+    """ Read the benchmark results JSON
+
+    Args:
+        results_path (`str`): JSON file path
+
+    Raises:
+        RuntimeError: Results are of another version
+
+    Returns:
+        `dict`: Benchmark results
+    """
+    with open(results_path, "r") as file_open:
+        results = json.load(file_open)
+    if results.get("version") != BENCHMARK_VERSION:
+        raise RuntimeError("Invalid benchmark results version {0} in "
+                           "{1}".format(results.get("version"), results_path))
+    return results
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """ Compare the results against the baseline results
+
+    Args:
+        baseline (`dict`): Baseline benchmark results
+        current (`dict`): Benchmark results to compare
+        threshold (`float`): Allowed slow down of the wall time before it
+                             is a regression, 0.1 is 10%
+
+    Returns:
+        `list`: Comparison of every stage in both the results, dicts of
+                stage, clip, baseline and current wall time, ratio and
+                regression
+    """
+    baseline_walls = dict(((_result["stage"], _result["clip"]),
+                           _result["wall"])
+                          for _result in baseline.get("results", []))
+    comparison = list()
+    for result in current.get("results", []):
+        _key = (result["stage"], result["clip"])
+        if _key not in baseline_walls:
+            continue
+        baseline_wall = baseline_walls[_key]
+        ratio = result["wall"] / baseline_wall if baseline_wall else None
+        comparison.append(dict(
+            stage=result["stage"], clip=result["clip"],
+            baseline=baseline_wall, current=result["wall"], ratio=ratio,
+            regression=bool(ratio and ratio > 1 + threshold)))
+    return comparison
+
+
+def format_comparison(comparison):
+    """ Comparison as a readable table
+
+    Args:
+        comparison (`list`): Comparison from compare_results
+
+    Returns:
+        `str`: Comparison table
+    """
+    lines = ["{0:<22} {1:<36} {2:>10} {3:>10} {4:>8}".format(
+        "STAGE", "CLIP", "BASELINE", "CURRENT", "RATIO")]
+    for row in comparison:
+        ratio = "{0:.2f}".format(row["ratio"]) if row["ratio"] else "-"
+        lines.append("{0:<22} {1:<36} {2:>9.3f}s {3:>9.3f}s {4:>8}{5}".format(
+            row["stage"], row["clip"] or "(all)", row["baseline"],
+            row["current"], ratio, "  REGRESSION" if row["regression"]
+            else ""))
+    return "\n".join(lines)
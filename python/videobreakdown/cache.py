@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import time
+import sqlite3
+import threading
+import xxhash
+
+# internal
+from .base import get_config, CACHE_PATH
+from .hashengine import get_hash_engine
+
+# How long sqlite waits on a locked database (other workers writing)
+LOCK_TIMEOUT = 60
+
+# Every thread (and so every worker) gets its own connection
+_LOCAL = threading.local()
+
+_CREATE_TABLE = "CREATE TABLE IF NOT EXISTS videos (" \
+                "path TEXT NOT NULL, size INTEGER NOT NULL, " \
+                "mtime_ns INTEGER NOT NULL, signature TEXT NOT NULL, " \
+                "hash TEXT, props TEXT NOT NULL, rotation TEXT, " \
+                "updated REAL NOT NULL, " \
+                "PRIMARY KEY (path, size, mtime_ns, signature))"
+
+
+class MetadataCache(object):
+    """ On disk cache of the video properties (hash, exiftool tags and
+        rotation). Entries are keyed by the real path, size, modification
+        time and the config signature, so any change to the file or the
+        tags we read creates a new entry.
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, cache_path):
+        """ Initialization function for the class
+
+        Args:
+            cache_path (`str`): sqlite database path
+        """
+        self.cache_path = cache_path
+        self.configs = get_config()
+        self._connection = None
+        self._signature = None
+
+    @property
+    def connection(self):
+        """ sqlite connection, the database is created the first time
+
+        Returns:
+            `sqlite3.Connection`: Database connection
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.cache_path,
+                                               timeout=LOCK_TIMEOUT)
+            # Workers read while others are writing
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_CREATE_TABLE)
+            self._connection.commit()
+        return self._connection
+
+    @property
+    def signature(self):
+        """ Signature of the config entries that change the cached
+            values, a change in the tags or the hash settings gives a
+            different signature
+
+        Returns:
+            `str`: Signature of the config
+        """
+        if self._signature is None:
+            signature_data = dict(tags=self.configs.get("tags"),
+                                  hash=get_hash_engine().signature)
+            self._signature = xxhash.xxh64(
+                json.dumps(signature_data, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+        return self._signature
+
+    def key(self, video_path):
+        """ Cache key of the video
+
+        Args:
+            video_path (`str`): Video path value
+
+        Returns:
+            `tuple`: Real path, size, modification time and signature
+        """
+        real_path = os.path.realpath(video_path)
+        stat_result = os.stat(real_path)
+        return (real_path, stat_result.st_size, stat_result.st_mtime_ns,
+                self.signature)
+
+    def get(self, key):
+        """ Get the cached entry
+
+        Args:
+            key (`tuple`): Cache key (see key)
+
+        Returns:
+            `dict`: hash, props and rotation values or None if the video
+                    is not in the cache
+        """
+        row = self.connection.execute(
+            "SELECT hash, props, rotation FROM videos WHERE path=? AND "
+            "size=? AND mtime_ns=? AND signature=?", key).fetchone()
+        if row is None:
+            return None
+        return dict(hash=row[0], props=json.loads(row[1]),
+                    rotation=json.loads(row[2]))
+
+    def set(self, key, hash_value, props, rotation):
+        """ Store the video values in the cache
+
+        Args:
+            key (`tuple`): Cache key (see key)
+            hash_value (`str`): Hash of the video
+            props (`dict`): Video properties
+            rotation (`int`): Video rotation
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO videos (path, size, mtime_ns, "
+                "signature, hash, props, rotation, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (hash_value, json.dumps(props), json.dumps(rotation),
+                       time.time()))
+
+    def prune(self):
+        """ Remove the entries that can not be used anymore, the video
+            is gone or changed or the config signature is different
+
+        Returns:
+            `int`: Number of entries removed
+        """
+        stale_rows = list()
+        rows = self.connection.execute(
+            "SELECT path, size, mtime_ns, signature FROM videos").fetchall()
+        for row in rows:
+            if row[3] != self.signature:
+                stale_rows.append(row)
+                continue
+            try:
+                stat_result = os.stat(row[0])
+            except OSError:
+                stale_rows.append(row)
+                continue
+            if (stat_result.st_size, stat_result.st_mtime_ns) != row[1:3]:
+                stale_rows.append(row)
+
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM videos WHERE path=? AND size=? AND "
+                "mtime_ns=? AND signature=?", stale_rows)
+        self.connection.execute("VACUUM")
+        return len(stale_rows)
+
+    def clear(self):
+        """ Remove all the entries from the cache
+
+        Returns:
+            `int`: Number of entries removed
+        """
+        with self.connection:
+            removed = self.connection.execute("DELETE FROM videos").rowcount
+        self.connection.execute("VACUUM")
+        return removed
+
+
+def get_cache_path():
+    """ Get the path of the cache database from the config, by default it
+        is kept next to the appconfig.yml
+
+    Returns:
+        `str`: Cache database path
+    """
+    cache_config = get_config().get("cache", {})
+    return cache_config.get("path") or CACHE_PATH
+
+
+def get_cache():
+    """ Get the cache for the current worker
+
+    Returns:
+        `MetadataCache`: Cache object or None if the cache is disabled
+                         in the config
+    """
+    if not get_config().get("cache", {}).get("enabled", False):
+        return None
+    cache = getattr(_LOCAL, "cache", None)
+    if cache is None:
+        cache = _LOCAL.cache = MetadataCache(get_cache_path())
+    return cache
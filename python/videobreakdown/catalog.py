@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# std imports
+import os
+import csv
+import json
+
+# internal
+from .hashengine import get_hash_engine
+from .tagplan import get_tag_plan
+
+# Catalog file formats, one record per video
+CATALOG_FORMATS = ("jsonl", "csv")
+
+
+def get_catalog_fields():
+    """ Fields of the catalog records, in the column order of the CSV
+
+    Returns:
+        `list`: Field names, the video properties come from the tag plan
+    """
+    fields = ["path", "name", get_hash_engine().label]
+    fields.extend(get_tag_plan().property_names)
+    fields.append("error")
+    return fields
+
+
+class CatalogWriter(object):
+    """ Catalog of the video properties, every video is written as soon as
+        its result comes in, so the catalog of a big folder grows while it
+        is processed and no thumbnails are ever made for it
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, export_file_path, catalog_format="jsonl"):
+        """ Initialization function for the class
+
+        Args:
+            export_file_path (`str`): File path to export to
+            catalog_format (`str`): File format (see CATALOG_FORMATS)
+
+        Raises:
+            RuntimeError: Invalid catalog format
+        """
+        if catalog_format not in CATALOG_FORMATS:
+            raise RuntimeError("Invalid catalog format {0}, it should be one "
+                               "of {1}".format(catalog_format,
+                                               ", ".join(CATALOG_FORMATS)))
+        self.export_file_path = export_file_path
+        self.catalog_format = catalog_format
+        self.fields = get_catalog_fields()
+        self.video_count = 0
+        self._file = None
+        self._writer = None
+
+    def _open(self):
+        """ Create the catalog file, with the header for CSV
+
+        Raises:
+            RuntimeError: Catalog path already exists
+        """
+        # We do not want to overwrite anything
+        if os.path.exists(self.export_file_path):
+            raise RuntimeError("Catalog path {0} already"
+                               " exists!".format(self.export_file_path))
+        self._file = open(self.export_file_path, "w", newline="",
+                          encoding="utf-8")
+        if self.catalog_format == "csv":
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fields,
+                                          restval="", extrasaction="ignore")
+            self._writer.writeheader()
+
+    def add(self, result):
+        """ Write the record of the video, the file is created with the
+            first video. Errored videos get a record with the error
+
+        Args:
+            result (`dict`): Result of the video (see process_video)
+        """
+        if self._file is None:
+            self._open()
+        info = result.get("info") or {}
+        record = dict(path=result.get("path"), name=info.get("name"))
+        record.update(info.get("details") or {})
+        record["error"] = result.get("error")
+        if self._writer:
+            self._writer.writerow(record)
+        else:
+            self._file.write(json.dumps(record, default=str) + "\n")
+        # Readers can follow the catalog while it is written
+        self._file.flush()
+        self.video_count += 1
+
+    def close(self):
+        """ Close the catalog, nothing is written if no video was added.
+            It can be closed more than once
+
+        Returns:
+            `bool`: True if the catalog was written
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+        return self.video_count > 0
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# std imports
+import os
+import stat
+
+# internal
+from .base import get_config
+
+
+def _is_hidden(entry):
+    """ Is the directory entry hidden, dot files (including the "._"
+        AppleDouble sidecars) and the windows hidden attribute
+
+    Args:
+        entry (`os.DirEntry`): Directory entry
+
+    Returns:
+        `bool`: True if the entry is hidden
+    """
+    if entry.name.startswith("."):
+        return True
+    # On windows the stat of the entry comes for free with the scan
+    if hasattr(stat, "FILE_ATTRIBUTE_HIDDEN") and os.name == "nt":
+        try:
+            attributes = entry.stat(follow_symlinks=False).st_file_attributes
+        except OSError:
+            return False
+        return bool(attributes & stat.FILE_ATTRIBUTE_HIDDEN)
+    return False
+
+
+def scan_videos(root):
+    """ Walk the directory tree and give back the video files as they are
+        found. Only the formats in the config are given back, hidden files
+        and directories are skipped and directory symlinks are followed
+        only once (no symlink loops).
+
+    Args:
+        root (`str`): Directory path to search the video files from
+
+    Yields:
+        `os.DirEntry`: Directory entry of every video file
+    """
+    valid_formats = get_config().get("formats")
+    root_stat = os.stat(root)
+    visited = set([(root_stat.st_dev, root_stat.st_ino)])
+    # Iterators of the directories we are in, the last one is the deepest
+    dir_stack = [_scan_dir(root)]
+    while dir_stack:
+        entry = next(dir_stack[-1], None)
+        if entry is None:
+            dir_stack.pop()
+            continue
+        if _is_hidden(entry):
+            continue
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if is_dir:
+            # Symlinked directories can point back up the tree. On windows
+            # the entry stat has no inode (st_ino is 0), os.stat has it
+            try:
+                dir_stat = os.stat(entry.path)
+            except OSError:
+                continue
+            dir_key = (dir_stat.st_dev, dir_stat.st_ino)
+            if dir_key in visited:
+                continue
+            visited.add(dir_key)
+            dir_stack.append(_scan_dir(entry.path))
+            continue
+        path_ext = os.path.splitext(entry.name)[-1]
+        if path_ext and path_ext.lower() in valid_formats:
+            yield entry
+
+
+def _scan_dir(dir_path):
+    """ Entries of the directory, sorted by name so the order of the
+        videos is the same on every run
+
+    Args:
+        dir_path (`str`): Directory path
+
+    Returns:
+        `iterator`: Directory entries
+    """
+    try:
+        with os.scandir(dir_path) as dir_scan:
+            entries = sorted(dir_scan, key=lambda _entry: _entry.name)
+    except OSError as e:
+        print ("WARNING: Can't read the directory {0} - {1}".format(
+            dir_path, e))
+        entries = list()
+    return iter(entries)
+
+
+def walk_videos(root):
+    """ Walk the directory tree and give back the video paths as they are
+        found (see scan_videos)
+
+    Args:
+        root (`str`): Directory path to search the video files from
+
+    Yields:
+        `str`: Video path
+    """
+    for entry in scan_videos(root):
+        yield entry.path
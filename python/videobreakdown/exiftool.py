@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import atexit
+import threading
+from multiprocessing.util import Finalize
+from subprocess import Popen, PIPE, TimeoutExpired
+
+# internal
+from .base import GETTAGS_ARGS
+from .process import get_process_cpu
+
+# How long we wait for exiftool to close before killing it
+CLOSE_TIMEOUT = 10
+# Read size for the exiftool output pipes
+READ_SIZE = 65536
+
+# Every thread (and so every worker) gets its own sessions
+_LOCAL = threading.local()
+# All the sessions that are open, so we can close them on exit
+_OPEN_SESSIONS = list()
+_SESSIONS_LOCK = threading.Lock()
+
+
+class _PipeReader(object):
+    """ Reads the pipe of a process in a thread, so the process never
+        blocks on a full pipe while we wait on its other pipe
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, stream):
+        """ Initialization function for the class, the thread starts
+            reading right away
+
+        Args:
+            stream (`file`): Pipe of the process
+        """
+        self._stream = stream
+        self._output = b""
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        """ Collect the pipe output until it is closed
+        """
+        while True:
+            try:
+                chunk = os.read(self._stream.fileno(), READ_SIZE)
+            except (OSError, ValueError):
+                chunk = b""
+            with self._condition:
+                if not chunk:
+                    self._closed = True
+                else:
+                    self._output += chunk
+                self._condition.notify_all()
+            if not chunk:
+                return
+
+    def read_until(self, marker):
+        """ Wait till the ready marker shows up at the end of the output,
+            the output is taken out of the reader
+
+        Args:
+            marker (`bytes`): Ready marker for the current execute
+
+        Raises:
+            RuntimeError: The pipe was closed before the marker
+
+        Returns:
+            `bytes`: Output before the marker
+        """
+        with self._condition:
+            while not self._output.rstrip().endswith(marker):
+                if self._closed:
+                    raise RuntimeError("Pipe closed before {0}".format(
+                        marker))
+                self._condition.wait()
+            output, self._output = self._output, b""
+        return output.rstrip()[:-len(marker)]
+
+    def join(self, timeout=None):
+        """ Wait for the reading thread to finish, once the pipe is closed
+
+        Args:
+            timeout (`float`): Seconds to wait
+        """
+        self._thread.join(timeout)
+
+
+class ExifToolSession(object):
+    """ Persistent exiftool process, started with "-stay_open True -@ -"
+        so every read is sent as arguments on stdin and the JSON comes
+        back on stdout. One Perl interpreter is shared for all the reads.
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, tool_path):
+        """ Initialization function for the class
+
+        Args:
+            tool_path (`str`): exiftool executable path
+        """
+        self.tool_path = tool_path
+        self._process = None
+        self._stderr = None
+        self._counter = 0
+
+    @property
+    def running(self):
+        """ Is the exiftool process running
+
+        Returns:
+            `bool`: True if the process is alive
+        """
+        return self._process is not None and self._process.poll() is None
+
+    @property
+    def cpu_time(self):
+        """ CPU time the exiftool process used so far (linux only)
+
+        Returns:
+            `float`: CPU seconds, None if it is not known
+        """
+        if not self.running:
+            return None
+        return get_process_cpu(self._process.pid)
+
+    def start(self):
+        """ Start the exiftool process (if it is not running already)
+
+        Raises:
+            RuntimeError: Invalid exiftool path
+        """
+        if self.running:
+            return
+        if not self.tool_path or not os.path.exists(self.tool_path):
+            raise RuntimeError("Invalid EXIFTOOL path {0}".format(
+                self.tool_path))
+        self._process = Popen([self.tool_path, "-stay_open", "True",
+                               "-@", "-"],
+                              stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        # The warnings of a big batch can fill the stderr pipe while we
+        # read stdout, it is drained all the time
+        self._stderr = _PipeReader(self._process.stderr)
+        self._counter = 0
+
+    def close(self):
+        """ Ask exiftool to exit, kill it if it does not listen
+        """
+        if not self.running:
+            self._process = None
+            self._stderr = None
+            return
+        try:
+            self._process.stdin.write(b"-stay_open\nFalse\n")
+            self._process.stdin.flush()
+            self._process.stdin.close()
+            self._process.wait(timeout=CLOSE_TIMEOUT)
+        except (OSError, TimeoutExpired):
+            self._process.kill()
+            self._process.wait()
+        self._stderr.join(CLOSE_TIMEOUT)
+        self._process.stdout.close()
+        self._process = None
+        self._stderr = None
+
+    def _read_until(self, stream, marker):
+        """ Read the stream till the ready marker shows up at the end
+
+        Args:
+            stream (`file`): stdout of the exiftool process
+            marker (`bytes`): Ready marker for the current execute
+
+        Raises:
+            RuntimeError: exiftool exited while we were reading
+
+        Returns:
+            `bytes`: Output before the marker
+        """
+        output = b""
+        while not output.rstrip().endswith(marker):
+            chunk = os.read(stream.fileno(), READ_SIZE)
+            if not chunk:
+                raise RuntimeError("exiftool exited unexpectedly "
+                                   "{0}".format(self.tool_path))
+            output += chunk
+        return output.rstrip()[:-len(marker)]
+
+    def execute(self, args):
+        """ Run one exiftool command in the session
+
+        Args:
+            args (`list`): exiftool arguments, one entry per argument
+
+        Returns:
+            `bytes`, `bytes`: stdout and stderr output of the command
+        """
+        self.start()
+        self._counter += 1
+        marker = "{{ready{0}}}".format(self._counter)
+        command = list(args) + ["-echo4", marker,
+                                "-execute{0}".format(self._counter)]
+        try:
+            self._process.stdin.write(
+                ("\n".join(command) + "\n").encode("utf-8"))
+            self._process.stdin.flush()
+            std_out = self._read_until(self._process.stdout,
+                                       marker.encode("utf-8"))
+            try:
+                std_err = self._stderr.read_until(marker.encode("utf-8"))
+            except RuntimeError:
+                raise RuntimeError("exiftool exited unexpectedly "
+                                   "{0}".format(self.tool_path))
+        except (OSError, RuntimeError):
+            # Whatever state exiftool is in, we start a fresh one for
+            # the next command
+            self.close()
+            raise
+        return std_out, std_err
+
+    def get_tags(self, video_paths, tag_args):
+        """ Read the tags for a batch of videos
+
+        Args:
+            video_paths (`list`): Video paths to read
+            tag_args (`list`): Tags arguments, like ["-FileSize", ...]
+
+        Returns:
+            `dict`, `str`: Tags per video path and the error output.
+                           Videos that exiftool could not read are not
+                           part of the dictionary
+        """
+        args = ["-charset", "filename=utf8"] + GETTAGS_ARGS + \
+               list(tag_args) + list(video_paths)
+        std_out, std_err = self.execute(args)
+
+        property_data = list()
+        if std_out.strip():
+            property_data = json.loads(std_out)
+
+        # exiftool gives us back the SourceFile, we match it to the paths
+        # we sent (forward slashes on windows etc)
+        requested = dict((_normalize(_path), _path) for _path in video_paths)
+        tags_data = dict()
+        for _data in property_data:
+            _path = requested.get(_normalize(_data.get("SourceFile", "")))
+            if _path:
+                tags_data[_path] = _data
+        return tags_data, str(std_err, encoding="utf-8", errors="replace")
+
+
+def _normalize(path):
+    """ Normalize the path so we can compare exiftool output paths
+
+    Args:
+        path (`str`): File path
+
+    Returns:
+        `str`: Normalized path
+    """
+    return os.path.normcase(os.path.normpath(path))
+
+
+def get_session(tool_path):
+    """ Get the exiftool session for the current worker, it is started
+        on the first call and kept around till the application exits
+
+    Args:
+        tool_path (`str`): exiftool executable path
+
+    Returns:
+        `ExifToolSession`: Session object
+    """
+    sessions = getattr(_LOCAL, "sessions", None)
+    if sessions is None:
+        sessions = _LOCAL.sessions = dict()
+    if tool_path not in sessions:
+        session = ExifToolSession(tool_path)
+        sessions[tool_path] = session
+        with _SESSIONS_LOCK:
+            _OPEN_SESSIONS.append(session)
+    return sessions[tool_path]
+
+
+def close_sessions():
+    """ Close all the exiftool sessions that were opened, a session
+        will start a new exiftool process if it is used again
+    """
+    with _SESSIONS_LOCK:
+        for session in _OPEN_SESSIONS:
+            session.close()
+
+
+atexit.register(close_sessions)
+# Pool worker processes skip the atexit handlers, the multiprocessing
+# finalizers are run for them though
+_FINALIZER = Finalize(None, close_sessions, exitpriority=10)
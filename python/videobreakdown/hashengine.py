@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# std imports
+import os
+import mmap
+import threading
+import xxhash
+
+# internal
+from .base import get_config
+
+# Hash algorithms we support and the label used for them in the report
+HASH_ALGORITHMS = {
+    "xxh64": ("xxhash-64", xxhash.xxh64),
+    "xxh3_128": ("xxh3-128", xxhash.xxh3_128),
+}
+# Default read buffer, big reads keep the syscalls down on fast storage
+BUFFER_SIZE = 8 * 1024 * 1024
+# Default sampled mode values
+SAMPLE_BLOCKS = 16
+SAMPLE_SIZE = 1024 * 1024
+
+# Every thread (and so every worker) gets its own engine and buffer
+_LOCAL = threading.local()
+
+
+class HashEngine(object):
+    """ Hash engine for the video files. It either hashes every byte
+        ("full" mode) or, for fast triage runs, only the size plus the
+        head, the tail and a number of evenly spaced blocks ("sampled"
+        mode).
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, algorithm="xxh64", mode="full", reader="readinto",
+                 buffer_size=BUFFER_SIZE, sample_blocks=SAMPLE_BLOCKS,
+                 sample_size=SAMPLE_SIZE):
+        """ Initialization function for the class
+
+        Args:
+            algorithm (`str`): "xxh64" or "xxh3_128"
+            mode (`str`): "full" or "sampled"
+            reader (`str`): "readinto" or "mmap" for the full mode
+            buffer_size (`int`): Read buffer size of the full mode
+            sample_blocks (`int`): Evenly spaced blocks of the sampled mode,
+                                   on top of the head and the tail
+            sample_size (`int`): Size of every sampled block
+
+        Raises:
+            RuntimeError: Invalid algorithm, mode or reader value
+        """
+        if algorithm not in HASH_ALGORITHMS:
+            raise RuntimeError("Invalid hash algorithm {0}".format(algorithm))
+        if mode not in ("full", "sampled"):
+            raise RuntimeError("Invalid hash mode {0}".format(mode))
+        if reader not in ("readinto", "mmap"):
+            raise RuntimeError("Invalid hash reader {0}".format(reader))
+        self.algorithm = algorithm
+        self.mode = mode
+        self.reader = reader
+        self.buffer_size = int(buffer_size)
+        self.sample_blocks = int(sample_blocks)
+        self.sample_size = int(sample_size)
+        # The buffer is reused for all the files hashed by the engine
+        self._buffer = None
+        self.bytes_read = 0
+
+    @property
+    def label(self):
+        """ Label of the hash for the report, it tells which algorithm
+            and mode produced the hash
+
+        Returns:
+            `str`: Hash label
+        """
+        label = HASH_ALGORITHMS[self.algorithm][0]
+        if self.mode == "sampled":
+            label = label + " (sampled)"
+        return label
+
+    @property
+    def signature(self):
+        """ All the values that change the hash value
+
+        Returns:
+            `dict`: Hash settings
+        """
+        signature_data = dict(algorithm=self.algorithm, mode=self.mode)
+        if self.mode == "sampled":
+            signature_data.update(sample_blocks=self.sample_blocks,
+                                  sample_size=self.sample_size)
+        return signature_data
+
+    def _get_buffer(self, size):
+        """ Get the reusable read buffer
+
+        Args:
+            size (`int`): Minimum size of the buffer
+
+        Returns:
+            `memoryview`: Buffer view of the requested size
+        """
+        if self._buffer is None or len(self._buffer) < size:
+            self._buffer = bytearray(size)
+        return memoryview(self._buffer)[:size]
+
+    def hash_file(self, file_path):
+        """ Hash the file
+
+        Args:
+            file_path (`str`): File path to hash
+
+        Returns:
+            `str`: Hex digest of the file
+        """
+        hasher = HASH_ALGORITHMS[self.algorithm][1]()
+        self.bytes_read = 0
+        with open(file_path, "rb", buffering=0) as file_open:
+            if self.mode == "sampled":
+                self._hash_sampled(file_open, hasher)
+            elif self.reader == "mmap":
+                self._hash_mmap(file_open, hasher)
+            else:
+                self._hash_readinto(file_open, hasher)
+        return hasher.hexdigest()
+
+    def _advise(self, file_open, advice):
+        """ Tell the OS how we are going to read the file (posix only)
+
+        Args:
+            file_open (`file`): Opened file
+            advice (`str`): posix_fadvise advice name
+        """
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(file_open.fileno(), 0, 0,
+                                 getattr(os, advice))
+            except OSError:
+                # Not all the file systems support it
+                pass
+
+    def _hash_readinto(self, file_open, hasher):
+        """ Hash every byte of the file, reading into the reusable buffer
+
+        Args:
+            file_open (`file`): Opened file
+            hasher (`object`): xxhash hasher object
+        """
+        self._advise(file_open, "POSIX_FADV_SEQUENTIAL")
+        buffer = self._get_buffer(self.buffer_size)
+        read_size = file_open.readinto(buffer)
+        while read_size:
+            hasher.update(buffer[:read_size])
+            self.bytes_read += read_size
+            read_size = file_open.readinto(buffer)
+
+    def _hash_mmap(self, file_open, hasher):
+        """ Hash every byte of the file through a memory map
+
+        Args:
+            file_open (`file`): Opened file
+            hasher (`object`): xxhash hasher object
+        """
+        file_size = os.fstat(file_open.fileno()).st_size
+        # Empty files can not be mapped
+        if not file_size:
+            return
+        self._advise(file_open, "POSIX_FADV_SEQUENTIAL")
+        with mmap.mmap(file_open.fileno(), 0,
+                       access=mmap.ACCESS_READ) as file_map:
+            file_view = memoryview(file_map)
+            try:
+                for _offset in range(0, file_size, self.buffer_size):
+                    _block = file_view[_offset:_offset + self.buffer_size]
+                    hasher.update(_block)
+                    self.bytes_read += len(_block)
+                    _block.release()
+            finally:
+                file_view.release()
+
+    def _hash_sampled(self, file_open, hasher):
+        """ Hash the size, head, tail and evenly spaced blocks of the file.
+            Small files are hashed completely (still with the size).
+
+        Args:
+            file_open (`file`): Opened file
+            hasher (`object`): xxhash hasher object
+        """
+        file_size = os.fstat(file_open.fileno()).st_size
+        hasher.update(file_size.to_bytes(8, "little"))
+
+        total_blocks = self.sample_blocks + 2
+        if file_size <= total_blocks * self.sample_size:
+            offsets = range(0, file_size, self.sample_size)
+        else:
+            # Head, evenly spaced blocks and the tail
+            last_offset = file_size - self.sample_size
+            offsets = [last_offset * _index // (total_blocks - 1)
+                       for _index in range(total_blocks)]
+
+        self._advise(file_open, "POSIX_FADV_RANDOM")
+        buffer = self._get_buffer(self.sample_size)
+        for _offset in offsets:
+            file_open.seek(_offset)
+            read_size = file_open.readinto(buffer)
+            hasher.update(buffer[:read_size])
+            self.bytes_read += read_size
+
+
+def get_hash_engine():
+    """ Get the hash engine for the current worker, it is created from
+        the config the first time
+
+    Returns:
+        `HashEngine`: Hash engine object
+    """
+    engine = getattr(_LOCAL, "engine", None)
+    if engine is None:
+        engine = _LOCAL.engine = _create_hash_engine()
+    return engine
+
+
+def _create_hash_engine():
+    """ Create the hash engine from the config
+
+    Returns:
+        `HashEngine`: Hash engine object
+    """
+    hash_config = get_config().get("hash", {})
+    return HashEngine(algorithm=hash_config.get("algorithm", "xxh64"),
+                      mode=hash_config.get("mode", "full"),
+                      reader=hash_config.get("reader", "readinto"),
+                      buffer_size=hash_config.get("buffer_size", BUFFER_SIZE),
+                      sample_blocks=hash_config.get("sample_blocks",
+                                                    SAMPLE_BLOCKS),
+                      sample_size=hash_config.get("sample_size",
+                                                  SAMPLE_SIZE))
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import time
+import string
+from html import escape
+from urllib.parse import quote
+
+# third party imports
+from PIL import Image, ImageOps, features
+
+# internal imports
+from .base import get_config, USERNAME
+
+# Image formats of the thumbnails, PIL format and file extension
+IMAGE_FORMATS = dict(webp=("WEBP", ".webp"), jpeg=("JPEG", ".jpg"))
+# Heights in pixels of the rows on the page
+TITLE_HEIGHT = 26
+LINE_HEIGHT = 20
+ROW_PADDING = 16
+# The page only has the rows that are in view (and these many around
+# them), so thousands of videos open as quickly as a few
+PAGE_TEMPLATE = string.Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$title</title>
+<style>
+body { margin: 0; font: 13px/${line_height}px Helvetica, Arial, sans-serif;
+       color: #222; }
+header { padding: 12px 24px; border-bottom: 1px solid #ccc; }
+header h1 { margin: 0; font-size: 18px; line-height: 28px; }
+header p { margin: 0; color: #777; }
+#vb-rows { position: relative; }
+.vb-row { position: absolute; left: 0; right: 0; height: ${row_height}px;
+          box-sizing: border-box; padding: 8px 24px; display: flex;
+          gap: 24px; overflow: hidden; }
+.vb-odd { background: #add8e6; }
+.vb-title { font: bold italic 15px/${title_height}px Courier, monospace;
+            color: #00008b; white-space: nowrap; }
+.vb-info { flex: none; width: 360px; overflow: hidden; }
+.vb-info table { border-collapse: collapse; }
+.vb-info th { text-align: right; font-weight: normal; padding-right: 6px;
+              white-space: nowrap; }
+.vb-info td { color: #666; white-space: nowrap; }
+.vb-row img { margin-top: ${title_height}px; border: 1px solid #777;
+              height: auto; }
+</style>
+</head>
+<body>
+<header>
+<h1>$title</h1>
+<p>$count videos, $author, $created</p>
+</header>
+<noscript><p>The rows of this report are drawn with JavaScript.</p></noscript>
+<div id="vb-rows"></div>
+<script id="vb-data" type="application/json">$rows</script>
+<script>
+(function () {
+  var rows = JSON.parse(document.getElementById("vb-data").textContent);
+  var rowHeight = $row_height;
+  var overscan = 10;
+  var list = document.getElementById("vb-rows");
+  var rendered = {};
+  var pending = false;
+  list.style.height = (rows.length * rowHeight) + "px";
+
+  function makeRow(index) {
+    var row = rows[index];
+    var element = document.createElement("div");
+    element.className = "vb-row" + (index % 2 ? " vb-odd" : "");
+    element.style.top = (index * rowHeight) + "px";
+    var info = document.createElement("div");
+    info.className = "vb-info";
+    var title = document.createElement("div");
+    title.className = "vb-title";
+    title.textContent = row.name + (row.vertical ? " :(Vertical)" : "");
+    info.appendChild(title);
+    var table = document.createElement("table");
+    row.details.forEach(function (detail) {
+      var line = table.insertRow();
+      var key = document.createElement("th");
+      key.textContent = detail[0] + ":";
+      line.appendChild(key);
+      line.insertCell().textContent = detail[1];
+    });
+    info.appendChild(table);
+    element.appendChild(info);
+    if (row.thumbnail) {
+      var image = document.createElement("img");
+      image.loading = "lazy";
+      image.decoding = "async";
+      image.width = row.width;
+      image.height = row.height;
+      image.alt = row.name;
+      image.src = row.thumbnail;
+      element.appendChild(image);
+    }
+    return element;
+  }
+
+  function update() {
+    pending = false;
+    var top = window.scrollY - (list.getBoundingClientRect().top +
+                                window.scrollY);
+    var first = Math.max(Math.floor(top / rowHeight) - overscan, 0);
+    var last = Math.min(Math.ceil((top + window.innerHeight) / rowHeight) +
+                        overscan, rows.length);
+    Object.keys(rendered).forEach(function (index) {
+      if (index < first || index >= last) {
+        list.removeChild(rendered[index]);
+        delete rendered[index];
+      }
+    });
+    for (var index = first; index < last; index++) {
+      if (!rendered[index]) {
+        rendered[index] = list.appendChild(makeRow(index));
+      }
+    }
+  }
+
+  function schedule() {
+    if (!pending) {
+      pending = true;
+      window.requestAnimationFrame(update);
+    }
+  }
+
+  window.addEventListener("scroll", schedule, { passive: true });
+  window.addEventListener("resize", schedule);
+  update();
+})();
+</script>
+</body>
+</html>
+""")
+
+
+class HtmlCreator(object):
+    """ HTML report creator, a static page with the same details as the
+        PDF. The thumbnails are written as small WebP (or JPEG) files next
+        to the page and every video is added as soon as its result comes
+        in, so the thumbnails are never all held at once
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, video_details, export_file_path):
+        """ Initialization function for the class
+
+        Args:
+            video_details (`list`): Video details including the thumbnails
+                                    (see populate_html), the same as the
+                                    PDF ones
+            export_file_path (`str`): File path to export to
+        """
+        self.video_details = video_details
+        self.export_file_path = export_file_path
+        # The thumbnails go into a folder named after the page
+        self.files_dir = os.path.splitext(export_file_path)[0] + "_files"
+        self.config = get_config()
+        html_config = self.config.get("html") or {}
+        image_format = html_config.get("image_format", "webp")
+        if image_format not in IMAGE_FORMATS:
+            raise RuntimeError("Invalid html image format {0}".format(
+                image_format))
+        if image_format == "webp" and not features.check("webp"):
+            print ("WARNING: PIL can't write WebP images, the thumbnails "
+                   "are written as JPEG")
+            image_format = "jpeg"
+        self.image_format = image_format
+        self.quality = int(html_config.get("quality", 75))
+        self.thumbnail_height = int(html_config.get("thumbnail_height", 0))
+        self.video_count = 0
+        self._rows = list()
+        # Thumbnail file names by the content hash, the same thumbnail is
+        # written once
+        self._thumbnail_names = dict()
+
+    def _create_files_dir(self):
+        """ Create the folder of the thumbnails
+
+        Raises:
+            RuntimeError: HTML path already exists
+        """
+        # We do not want to overwrite anything
+        if os.path.exists(self.export_file_path):
+            raise RuntimeError("HTML path {0} already"
+                               " exists!".format(self.export_file_path))
+        if not os.path.exists(self.files_dir):
+            os.makedirs(self.files_dir)
+
+    def _save_thumbnail(self, thumbnail):
+        """ Write the thumbnail into the folder of the page
+
+        Args:
+            thumbnail (`Thumbnail`): Thumbnail of the video
+
+        Returns:
+            `str`, `int`, `int`: Thumbnail file name, width and height
+        """
+        saved = self._thumbnail_names.get(thumbnail.content_hash)
+        if saved:
+            return saved
+        if thumbnail.image is not None:
+            image = thumbnail.image.convert("RGB")
+        else:
+            # Read right away, the file is removed once it is added
+            with Image.open(thumbnail.path) as _image:
+                image = _image.convert("RGB")
+        # The frames are flipped for the PDF, the page shows them the
+        # right way up
+        image = ImageOps.flip(image)
+        if self.thumbnail_height and image.height > self.thumbnail_height:
+            width = max(int(round(image.width * self.thumbnail_height /
+                                  float(image.height))), 1)
+            image = image.resize((width, self.thumbnail_height),
+                                 Image.LANCZOS)
+        pil_format, extension = IMAGE_FORMATS[self.image_format]
+        file_name = thumbnail.content_hash + extension
+        image.save(os.path.join(self.files_dir, file_name),
+                   format=pil_format, quality=self.quality)
+        saved = self._thumbnail_names[thumbnail.content_hash] = (
+            file_name, image.width, image.height)
+        return saved
+
+    def add(self, video_detail):
+        """ Add the video to the page, its thumbnail is written right away
+            and its temporary thumbnail files are removed
+
+        Args:
+            video_detail (`dict`): Video details including the thumbnail
+        """
+        if self.video_count == 0:
+            self._create_files_dir()
+        details = video_detail.get("details")
+        row = dict(name=video_detail.get("name"),
+                   vertical=bool(video_detail.get("vertical")),
+                   details=[[str(_key), str(_value)]
+                            for _key, _value in details.items()],
+                   thumbnail=None)
+        thumbnail = video_detail.get("thumbnail")
+        if thumbnail:
+            file_name, width, height = self._save_thumbnail(thumbnail)
+            # Shown at the height of the details, like in the PDF
+            row["height"] = len(details) * LINE_HEIGHT
+            row["width"] = max(int(round(width * row["height"] /
+                                         float(height))), 1)
+            row["thumbnail"] = "{0}/{1}".format(
+                quote(os.path.basename(self.files_dir)), file_name)
+            thumbnail.cleanup()
+        self._rows.append(row)
+        self.video_count += 1
+
+    def close(self):
+        """ Write the page, nothing is written if no video was added
+
+        Returns:
+            `bool`: True if the page was written
+        """
+        if not self._rows:
+            return False
+        max_details = max(len(_row["details"]) for _row in self._rows)
+        # The data is in a script tag, it can not close the tag early
+        rows = json.dumps(self._rows, separators=(",", ":")).replace(
+            "<", "\\u003c")
+        _file_name = os.path.basename(self.export_file_path)
+        page = PAGE_TEMPLATE.substitute(
+            title=escape(_file_name), count=len(self._rows),
+            author=escape(USERNAME),
+            created=time.strftime("%Y-%m-%d %H:%M:%S"), rows=rows,
+            row_height=TITLE_HEIGHT + max_details * LINE_HEIGHT +
+            ROW_PADDING, title_height=TITLE_HEIGHT, line_height=LINE_HEIGHT)
+        with open(self.export_file_path, "w", encoding="utf-8") as file_open:
+            file_open.write(page)
+        return True
+
+    def populate_html(self):
+        """ Populate the HTML page with all the video details
+        """
+        for video_detail in self.video_details:
+            self.add(video_detail)
+        self.close()
+
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import time
+import uuid
+import shutil
+import collections
+
+# internal
+from .thumbnail import Thumbnail
+from .base import get_config
+
+# Journal file format version
+JOURNAL_VERSION = 1
+JOURNAL_NAME = "journal.jsonl"
+THUMBNAILS_DIR = "thumbnails"
+
+
+def get_run_dir(pdf_path):
+    """ Run folder of the PDF, it has the journal and the thumbnails
+
+    Args:
+        pdf_path (`str`): PDF file path
+
+    Returns:
+        `str`: Run folder path
+    """
+    return os.path.splitext(pdf_path)[0] + "_RUN"
+
+
+def journal_enabled():
+    """ Are the runs journaled
+
+    Returns:
+        `bool`: True if the journal is enabled in the config
+    """
+    return get_config().get("journal", {}).get("enabled", False)
+
+
+def save_thumbnail(thumbnail, thumbnails_dir):
+    """ Save the thumbnail in the folder, thumbnails with the same content
+        are saved once
+
+    Args:
+        thumbnail (`Thumbnail`): Thumbnail of the video
+        thumbnails_dir (`str`): Folder of the thumbnails
+
+    Returns:
+        `str`: Thumbnail file path
+    """
+    if thumbnail.path:
+        extension = os.path.splitext(thumbnail.path)[-1]
+    else:
+        extension = ".png"
+    thumbnail_path = os.path.join(thumbnails_dir,
+                                  thumbnail.content_hash + extension)
+    if not os.path.exists(thumbnail_path):
+        # Other processes can write the same thumbnail at the same time
+        temp_path = "{0}.{1}.tmp".format(thumbnail_path, uuid.uuid4().hex)
+        if thumbnail.path:
+            shutil.copyfile(thumbnail.path, temp_path)
+        else:
+            # Lossless, like the in memory thumbnail in the PDF
+            thumbnail.image.save(temp_path, format="PNG", compress_level=1)
+        os.replace(temp_path, thumbnail_path)
+    return thumbnail_path
+
+
+def dump_info(info, thumbnails_dir):
+    """ Frames info of the video as JSON data, the thumbnail is saved in
+        the folder
+
+    Args:
+        info (`dict`): Frames info dictionary (see process_video)
+        thumbnails_dir (`str`): Folder of the thumbnails
+
+    Returns:
+        `dict`: JSON data
+    """
+    info = dict(info)
+    thumbnail = info.get("thumbnail")
+    info["thumbnail"] = dict(width=thumbnail.width, height=thumbnail.height,
+                             content_hash=thumbnail.content_hash,
+                             path=save_thumbnail(thumbnail, thumbnails_dir))
+    return info
+
+
+def load_info(info_data):
+    """ Frames info of the video from the JSON data (see dump_info)
+
+    Args:
+        info_data (`dict`): JSON data
+
+    Returns:
+        `dict`: Frames info dictionary, None if the thumbnail is gone
+    """
+    info = dict(info_data)
+    thumbnail_data = info.get("thumbnail")
+    if not os.path.exists(thumbnail_data.get("path")):
+        return None
+    info["thumbnail"] = Thumbnail(thumbnail_data.get("width"),
+                                  thumbnail_data.get("height"),
+                                  thumbnail_data.get("content_hash"),
+                                  path=thumbnail_data.get("path"),
+                                  temporary=False)
+    return info
+
+
+class RunJournal(object):
+    """ Journal of a run, every processed video is written into it (with
+        its thumbnail) as soon as it is done, so a run that fails or is
+        stopped can be resumed without processing the videos again
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, run_dir, paths, pdf_path, since_last=False,
+                 entries=None):
+        """ Initialization function for the class, use create or load
+
+        Args:
+            run_dir (`str`): Run folder
+            paths (`list`): Paths of the run
+            pdf_path (`str`): PDF file path of the run
+            since_last (`bool`): The run only processes the changes since
+                                 the last snapshots
+            entries (`dict`): Journal entries of the done videos, path:
+                              {path, file (size and mtime), info}
+        """
+        self.run_dir = run_dir
+        self.paths = paths
+        self.pdf_path = pdf_path
+        self.since_last = since_last
+        self.entries = entries or dict()
+
+    @property
+    def journal_path(self):
+        """ Journal file path
+
+        Returns:
+            `str`: JSON lines file path
+        """
+        return os.path.join(self.run_dir, JOURNAL_NAME)
+
+    @property
+    def thumbnails_dir(self):
+        """ Folder of the thumbnails of the done videos
+
+        Returns:
+            `str`: Folder path
+        """
+        return os.path.join(self.run_dir, THUMBNAILS_DIR)
+
+    @classmethod
+    def create(cls, run_dir, paths, pdf_path, since_last=False):
+        """ Start the journal of a new run
+
+        Args:
+            run_dir (`str`): Run folder
+            paths (`list`): Paths of the run
+            pdf_path (`str`): PDF file path of the run
+            since_last (`bool`): The run only processes the changes since
+                                 the last snapshots
+
+        Raises:
+            RuntimeError: The run folder exists already
+
+        Returns:
+            `RunJournal`: Journal object
+        """
+        if os.path.exists(run_dir):
+            raise RuntimeError("Run {0} already exists, use --resume to go "
+                               "on with it.".format(run_dir))
+        journal = cls(run_dir, [os.path.abspath(_path) for _path in paths],
+                      os.path.abspath(pdf_path), since_last=since_last)
+        os.makedirs(journal.thumbnails_dir)
+        journal._write(dict(version=JOURNAL_VERSION, paths=journal.paths,
+                            pdf_path=journal.pdf_path, since_last=since_last,
+                            created=time.time()))
+        return journal
+
+    @classmethod
+    def load(cls, run_dir):
+        """ Load the journal of a run that was stopped
+
+        Args:
+            run_dir (`str`): Run folder or its journal file
+
+        Raises:
+            RuntimeError: No journal or the journal version does not match
+
+        Returns:
+            `RunJournal`: Journal object
+        """
+        if os.path.isfile(run_dir):
+            run_dir = os.path.dirname(run_dir)
+        journal_path = os.path.join(run_dir, JOURNAL_NAME)
+        if not os.path.exists(journal_path):
+            raise RuntimeError("There is no run journal in {0}".format(
+                run_dir))
+        header = None
+        entries = dict()
+        with open(journal_path, "r") as file_open:
+            for _line in file_open:
+                try:
+                    data = json.loads(_line)
+                except ValueError:
+                    # The last line can be cut short by a crash
+                    continue
+                if header is None:
+                    header = data
+                    continue
+                entries[data.get("path")] = data
+        if header is None or header.get("version") != JOURNAL_VERSION:
+            raise RuntimeError("Run journal {0} is not supported".format(
+                journal_path))
+        return cls(run_dir, header.get("paths"), header.get("pdf_path"),
+                   since_last=header.get("since_last", False),
+                   entries=entries)
+
+    def _write(self, data):
+        """ Append the line to the journal, it is on the disk once this
+            returns
+
+        Args:
+            data (`dict`): Line data
+        """
+        with open(self.journal_path, "a") as file_open:
+            file_open.write(json.dumps(data, default=str) + "\n")
+            file_open.flush()
+            os.fsync(file_open.fileno())
+
+    def record(self, result):
+        """ Write the processed video into the journal
+
+        Args:
+            result (`dict`): Result of the video (see process_video)
+        """
+        stat_result = os.stat(result.get("path"))
+        entry = dict(path=result.get("path"),
+                     file=[stat_result.st_size, stat_result.st_mtime_ns],
+                     info=dump_info(result.get("info"), self.thumbnails_dir))
+        self._write(entry)
+        self.entries[result.get("path")] = entry
+
+    def get_result(self, video_path):
+        """ Result of the video from the journal
+
+        Args:
+            video_path (`str`): Video path
+
+        Returns:
+            `dict`: Result of the video (see process_video), None if the
+                    video is not done yet
+        """
+        entry = self.entries.get(video_path)
+        if not entry:
+            return None
+        try:
+            stat_result = os.stat(video_path)
+        except OSError:
+            return None
+        # The video changed after it was done
+        if entry.get("file") != [stat_result.st_size,
+                                stat_result.st_mtime_ns]:
+            return None
+        info = load_info(entry.get("info"))
+        if info is None:
+            return None
+        return dict(path=video_path, info=info, error=None)
+
+    def replay(self, video_paths, process):
+        """ Results of the videos in the input order, the done videos come
+            from the journal and the others are processed and written into
+            the journal
+
+        Args:
+            video_paths (`iterable`): Video paths of the run
+            process (`function`): Processes the remaining video paths and
+                                  gives back their results in order (see
+                                  process_videos)
+
+        Yields:
+            `dict`: Result of every video
+        """
+        # Journal results and None for the videos that are processed, in
+        # the input order
+        pending = collections.deque()
+
+        def _remaining():
+            for _path in video_paths:
+                result = self.get_result(_path)
+                pending.append(result)
+                if result is None:
+                    yield _path
+
+        for result in process(_remaining()):
+            while pending[0] is not None:
+                yield pending.popleft()
+            pending.popleft()
+            if result.get("info"):
+                self.record(result)
+            yield result
+        while pending:
+            yield pending.popleft()
+
+    def remove(self):
+        """ Remove the run folder, once the PDF is exported
+        """
+        shutil.rmtree(self.run_dir, ignore_errors=True)
@@ -1,22 +1,191 @@
 #!/usr/bin/env python
 # std imports
-from distutils.util import change_root
-from fileinput import filename
 import os
-import shutil
-from PIL import Image
+import tempfile
 
 # third party imports
+from PIL import Image
 from reportlab.pdfgen import canvas
 from reportlab.lib import pagesizes
 from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
 from reportlab.lib.colors import (darkblue,
                                   gray,
                                   black,
                                   lightblue)
 
 # internal imports
-from .base import get_config, PdfConstants, USERNAME
+from .base import get_config, USERNAME
+
+
+class PdfConstants(object):
+    """ Constant object for the pdf, includes a bunch
+        of spaces, buffers and values
+    """
+    @property
+    def start_x(self):
+        """ PDF start x position
+
+        Returns:
+            `int`: x position value
+        """
+        return 25 * mm
+
+    @property
+    def start_y(self):
+        """ PDF start y position
+
+        Returns:
+            `int`: y position value
+        """
+        return 10 * mm
+
+    @property
+    def linefactor_x(self):
+        """ PDF line x position
+
+        Returns:
+            `int`: line x position value
+        """
+        return 1.5 * mm
+
+    @property
+    def linefactor_y(self):
+        """ PDF line y position
+
+        Returns:
+            `int`: line y position value
+        """
+        return 5 * mm
+
+    @property
+    def titlefactor_x(self):
+        """ PDF title x position
+
+        Returns:
+            `int`: title x position value
+        """
+        return 0
+
+    @property
+    def titlefactor_y(self):
+        """ PDF title y position
+
+        Returns:
+            `int`: title y position value
+        """
+        return 6 * mm
+
+    @property
+    def title_size(self):
+        """ PDF title font size value
+
+        Returns:
+            `int`: title font size value
+        """
+        return 12
+
+    @property
+    def text_size(self):
+        """ PDF text font size value
+
+        Returns:
+            `int`: pdf text font size value
+        """
+        return 10
+
+    @property
+    def title_color(self):
+        """ PDF title color value
+
+        Returns:
+            `str`: Color value for the title
+        """
+        return darkblue
+
+    @property
+    def key_color(self):
+        """ PDF details key color value
+
+        Returns:
+            `str`: Color value for the details key
+        """
+        return black
+
+    @property
+    def value_color(self):
+        """ PDF details value color
+
+        Returns:
+            `str`: Color value of the details
+        """
+        return gray
+
+    @property
+    def bbox_color(self):
+        """ Bounding box color for even entries in the pdf
+
+        Returns:
+            `str`: Color value of the bounding box
+        """
+        return lightblue
+
+    @property
+    def key_font(self):
+        """ Font value of the details key in the pdf
+
+        Returns:
+            `str`: Font name of the details key
+        """
+        # you can use the function canvas.getAvailableFonts
+        # for more options!
+        return "Helvetica-Bold"
+
+    @property
+    def title_font(self):
+        """ Font value of the title in the pdf
+
+        Returns:
+            `str`: Font value of the title
+        """
+        return "Courier-BoldOblique"
+
+    @property
+    def value_font(self):
+        """ Font value of the details in the pdf
+
+        Returns:
+            `str`: Font value of the detail entries
+        """
+        return "Helvetica"
+
+    @property
+    def bbox_overflow(self):
+        """ Top and bottom overflow value of the bbox
+            around the even entries in the PDF
+
+        Returns:
+            `int`: Overflow value
+        """
+        return 6 * mm
+
+    @property
+    def thumbnail_x_pos(self):
+        """ Thumbnail x position in the PDF
+
+        Returns:
+            `int`: Position where thumbnail will start
+        """
+        return 70 * mm
+
+    @property
+    def width_buffer(self):
+        """ Width buffer value to be added after thumbnail entries
+
+        Returns:
+            `int`: Buffer value to be added after thumbnails
+        """
+        return 10*mm
 
 
 class PdfCreator(object):
@@ -44,6 +213,15 @@ class PdfCreator(object):
         self.config = get_config()
         self.width, self.height = 0, 0
         self.canvas_obj = None
+        pdf_config = self.config.get("pdf") or {}
+        # Resolution the thumbnails are resampled to for the size they are
+        # drawn at, 0 embeds them at their full size
+        self.image_dpi = float(pdf_config.get("image_dpi", 0) or 0)
+        self.jpeg_quality = int(pdf_config.get("jpeg_quality", 80))
+        self.compression = bool(pdf_config.get("compression", True))
+        # Image sources for the canvas by the thumbnail content hash, so
+        # every thumbnail is read at most once and reportlab embeds it once
+        self._image_sources = dict()
 
 
     def _create_canvas(self):
@@ -54,6 +232,28 @@ class PdfCreator(object):
             RuntimeError: PDF Size format cannot be retrieved
             RuntimeError: PDF path already exists
         """
+        self._set_page_height()
+
+        # We check to ensure the PDF path does not already exists, we do not
+        # want to overwrite it.
+        if os.path.exists(self.export_file_path):
+            raise RuntimeError("PDF path {0} already"
+                               " exists!".format(self.export_file_path))
+
+        _len_details = len(self.video_details[0].get("details"))
+        self.pdf_width = self._get_pdf_width(_len_details)
+
+        self.canvas_obj = canvas.Canvas(filename=self.export_file_path,
+                                        pagesize=(self.pdf_width, self.height),
+                                        bottomup=0,
+                                        pageCompression=int(self.compression))
+
+    def _set_page_height(self):
+        """ Get the height of the PDF pages from the config
+
+        Raises:
+            RuntimeError: PDF Size format cannot be retrieved
+        """
         # Logic to get the correct size of the PDF
         # we want to export
         pdf_size = self.config.get("pdf").get("size")
@@ -72,23 +272,20 @@ class PdfCreator(object):
             raise RuntimeError("Invalid pdf size format"
                                " {0}".format(pdf_size))
 
-        # We check to ensure the PDF path does not already exists, we do not
-        # want to overwrite it.
-        if os.path.exists(self.export_file_path):
-            raise RuntimeError("PDF path {0} already"
-                               " exists!".format(self.export_path))
-
-        _len_details = len(self.video_details[0].get("details"))
-        _chng_fctr = (_len_details * self.const.linefactor_y)/self.tb_ht
-
-        self.pdf_width = self.tb_wt * _chng_fctr + \
-            self.const.thumbnail_x_pos + self.const.width_buffer
+    def _get_pdf_width(self, len_details):
+        """ Get the width of the PDF, wide enough for the widest
+            thumbnail at the height of the details
 
+        Args:
+            len_details (`int`): Number of details of a video
 
-        self.canvas_obj = canvas.Canvas(filename=self.export_file_path,
-                                        pagesize=(self.pdf_width, self.height),
-                                        bottomup=0)
+        Returns:
+            `float`: PDF width
+        """
+        _chng_fctr = (len_details * self.const.linefactor_y)/self.tb_ht
 
+        return self.tb_wt * _chng_fctr + \
+            self.const.thumbnail_x_pos + self.const.width_buffer
 
     def _set_custom_canvas_prop(self):
         """ Adding some custom canvas properties
@@ -102,8 +299,93 @@ class PdfCreator(object):
             process (mainly thumbnails and combined thumbnails)
         """
         for video_detail in self.video_details:
-            thumnail_path = video_detail.get("thumbnail")
-            shutil.rmtree(os.path.dirname(thumnail_path))
+            self._cleanup_thumbnail(video_detail)
+
+    def _cleanup_thumbnail(self, video_detail):
+        """ Clean the temporary thumbnail files of the video
+
+        Args:
+            video_detail (`dict`): Video details including the thumbnail
+        """
+        video_detail.get("thumbnail").cleanup()
+
+    def _get_image_source(self, thumbnail, width, height):
+        """ Get the image source of the thumbnail for the canvas, the same
+            thumbnail content gives back the same source
+
+        Args:
+            thumbnail (`Thumbnail`): Thumbnail of the video
+            width (`float`): Width of the box the thumbnail is drawn in
+            height (`float`): Height of the box the thumbnail is drawn in
+
+        Returns:
+            `str` or `ImageReader`: File path (jpeg files are embedded
+                                    as they are) or image reader
+        """
+        image_source = self._image_sources.get(thumbnail.content_hash)
+        if image_source is None:
+            if self.image_dpi:
+                image_source = self._get_resampled_source(thumbnail, width,
+                                                          height)
+            else:
+                image_source = thumbnail.path
+            if not image_source:
+                # In memory thumbnail, reportlab needs it as a reader
+                image_source = ImageReader(thumbnail.image)
+            self._image_sources[thumbnail.content_hash] = image_source
+        return image_source
+
+    def _get_resampled_source(self, thumbnail, width, height):
+        """ Resample the thumbnail to the image dpi at the size it is drawn
+            at and write it as a temporary jpeg file. reportlab embeds a
+            file path once however often it is drawn, so the file is only
+            needed for the first drawing (see _remove_resampled_source)
+
+        Args:
+            thumbnail (`Thumbnail`): Thumbnail of the video
+            width (`float`): Width of the box the thumbnail is drawn in
+            height (`float`): Height of the box the thumbnail is drawn in
+
+        Returns:
+            `str`: Thumbnail file path
+        """
+        # The thumbnail keeps its aspect ratio in the box
+        scale = min(width / float(thumbnail.width),
+                    height / float(thumbnail.height)) * self.image_dpi / 72.0
+        size = (max(int(round(thumbnail.width * scale)), 1),
+                max(int(round(thumbnail.height * scale)), 1))
+        is_jpeg = thumbnail.path and os.path.splitext(
+            thumbnail.path)[-1].lower() in (".jpg", ".jpeg")
+        if is_jpeg and size[0] >= thumbnail.width:
+            # Not bigger than it is drawn, the file is embedded as it is
+            return thumbnail.path
+        if thumbnail.path:
+            with Image.open(thumbnail.path) as _image:
+                image = _image.convert("RGB")
+        else:
+            image = thumbnail.image.convert("RGB")
+        if size[0] < image.width:
+            image = image.resize(size, Image.LANCZOS)
+        # The content hash is in the name, reportlab tells the images
+        # apart by their path
+        file_handle, image_path = tempfile.mkstemp(
+            prefix="{0}_".format(thumbnail.content_hash), suffix=".jpg")
+        with os.fdopen(file_handle, "wb") as file_open:
+            image.save(file_open, format="JPEG", quality=self.jpeg_quality,
+                       optimize=True)
+        return image_path
+
+    def _remove_resampled_source(self, thumbnail):
+        """ Remove the temporary resampled file of the thumbnail, the
+            canvas has read it once it is drawn
+
+        Args:
+            thumbnail (`Thumbnail`): Thumbnail of the video
+        """
+        image_source = self._image_sources.get(thumbnail.content_hash)
+        if (isinstance(image_source, str) and image_source != thumbnail.path
+                and os.path.exists(image_source)):
+            os.remove(image_source)
 
     def _populate_pdf(self):
         """ Using the canvas object and the video details
@@ -112,92 +394,121 @@ class PdfCreator(object):
         """
         x_pos, y_pos = self.const.start_x, self.const.start_y
         for video_counter, video_detail in enumerate(self.video_details):
-
-            # We check if we are exceeding the height limits and
-            # should we change the page
-            expected_end_y_pos = y_pos + self.const.titlefactor_y + \
-                                 len(video_detail["details"])*self.const.linefactor_y + \
-                                 self.const.linefactor_y
-
-            if (expected_end_y_pos > self.height):
-                    # Move to a new page
-                    self.canvas_obj.showPage()
-                    # let's move to the start positions on that page
-                    x_pos, y_pos = self.const.start_x, self.const.start_y
-                    expected_end_y_pos = y_pos + self.const.titlefactor_y + \
-                                 len(video_detail["details"])*self.const.linefactor_y + \
-                                 self.const.linefactor_y
-
-            # For every even entry we want to hightlight with blue
-            if video_counter % 2 == 1:
-                # Calculating the size (height) of the highlighted section
-                hlght_size = expected_end_y_pos - y_pos
-                # Add in the highlight rectangle
-                self.canvas_obj.setFillColor(self.const.bbox_color)
-                self.canvas_obj.rect(0,y_pos-self.const.bbox_overflow,
-                                     self.pdf_width, hlght_size, 0, 1)
-
-            # We will start with setting up the name of the video
-            # Set the font
-            self.canvas_obj.setFont(self.const.title_font,
-                                    self.const.title_size)
-            # Set the color
-            self.canvas_obj.setFillColor(self.const.title_color)
-            # Set the name
-            _name = video_detail["name"]
-            # Vertical video counter
-            vertical_video = video_detail.get("vertical")
-            if vertical_video:
-                _name = _name + " :(Vertical)"
-            self.canvas_obj.drawString(x_pos, y_pos, _name)
-
-            # We have to move the y pos
-            y_pos += self.const.titlefactor_y
-
-            # We will start adding the images just after the title
-            # so this is the thumbnails y value
-            thumb_y_pos = y_pos - self.const.linefactor_y/2
-            thumb_x_pos = self.const.thumbnail_x_pos
-            _thumbnails = video_detail.get("thumbnail")
-            _img = Image.open(_thumbnails)
-            _width = _img.width
-            _height = (len(video_detail["details"])*self.const.linefactor_y)
-
-            if _thumbnails:
-                self.canvas_obj.drawImage(_thumbnails, thumb_x_pos,
-                                          thumb_y_pos, width=_width,
-                                          height=_height,
-                                          preserveAspectRatio=True,
-                                          showBoundary=True,
-                                          anchor='sw')
-
-            # We will start printing the shot's values
-            for key, value in video_detail["details"].items():
-                # We have to reset the font and the color from
-                # previous change
-                # We start with Values and then move to Keys
-                self.canvas_obj.setFillColor(self.const.value_color)
-                self.canvas_obj.setFont(self.const.value_font,
-                                        self.const.text_size)
-                self.canvas_obj.drawString(x_pos + self.const.linefactor_x,
-                                           y_pos, str(value))
-                # Let's add in the key items
-                self.canvas_obj.setFillColor(self.const.key_color)
-                self.canvas_obj.setFont(self.const.value_font,
-                                        self.const.text_size)
-                self.canvas_obj.drawRightString(x_pos, y_pos,
-                                           str(key) + ":")
-                # We have to move the y position now
-                y_pos += self.const.linefactor_y
-
-            # Move the position, making it ready for the new entry
-            y_pos += self.const.linefactor_y
+            x_pos, y_pos = self._draw_video(video_counter, video_detail,
+                                            x_pos, y_pos)
 
         # Add some custom features
         self._set_custom_canvas_prop()
         # Let's save the canvas object
         self.canvas_obj.save()
 
+    def _get_thumbnail_width(self, img_width):
+        """ Width of the box the thumbnail is drawn in
+
+        Args:
+            img_width (`int`): Width of the thumbnail image
+
+        Returns:
+            `float`: Width of the thumbnail box
+        """
+        return img_width
+
+    def _draw_video(self, video_counter, video_detail, x_pos, y_pos):
+        """ Draw the information and the thumbnail of a video, a new page
+            is started if it does not fit on the current one
+
+        Args:
+            video_counter (`int`): Index of the video in the PDF
+            video_detail (`dict`): Video details including the thumbnail
+            x_pos (`float`): Current x position
+            y_pos (`float`): Current y position
+
+        Returns:
+            `float`, `float`: x and y position for the next video
+        """
+        # We check if we are exceeding the height limits and
+        # should we change the page
+        expected_end_y_pos = y_pos + self.const.titlefactor_y + \
+                             len(video_detail["details"])*self.const.linefactor_y + \
+                             self.const.linefactor_y
+
+        if (expected_end_y_pos > self.height):
+                # Move to a new page
+                self.canvas_obj.showPage()
+                # let's move to the start positions on that page
+                x_pos, y_pos = self.const.start_x, self.const.start_y
+                expected_end_y_pos = y_pos + self.const.titlefactor_y + \
+                             len(video_detail["details"])*self.const.linefactor_y + \
+                             self.const.linefactor_y
+
+        # For every even entry we want to hightlight with blue
+        if video_counter % 2 == 1:
+            # Calculating the size (height) of the highlighted section
+            hlght_size = expected_end_y_pos - y_pos
+            # Add in the highlight rectangle
+            self.canvas_obj.setFillColor(self.const.bbox_color)
+            self.canvas_obj.rect(0,y_pos-self.const.bbox_overflow,
+                                 self.pdf_width, hlght_size, 0, 1)
+
+        # We will start with setting up the name of the video
+        # Set the font
+        self.canvas_obj.setFont(self.const.title_font,
+                                self.const.title_size)
+        # Set the color
+        self.canvas_obj.setFillColor(self.const.title_color)
+        # Set the name
+        _name = video_detail["name"]
+        # Vertical video counter
+        vertical_video = video_detail.get("vertical")
+        if vertical_video:
+            _name = _name + " :(Vertical)"
+        self.canvas_obj.drawString(x_pos, y_pos, _name)
+
+        # We have to move the y pos
+        y_pos += self.const.titlefactor_y
+
+        # We will start adding the images just after the title
+        # so this is the thumbnails y value
+        thumb_y_pos = y_pos - self.const.linefactor_y/2
+        thumb_x_pos = self.const.thumbnail_x_pos
+        _thumbnail = video_detail.get("thumbnail")
+        _width = self._get_thumbnail_width(_thumbnail.width)
+        _height = (len(video_detail["details"])*self.const.linefactor_y)
+
+        if _thumbnail:
+            self.canvas_obj.drawImage(self._get_image_source(_thumbnail,
+                                                             _width, _height),
+                                      thumb_x_pos,
+                                      thumb_y_pos, width=_width,
+                                      height=_height,
+                                      preserveAspectRatio=True,
+                                      showBoundary=True,
+                                      anchor='sw')
+            self._remove_resampled_source(_thumbnail)
+
+        # We will start printing the shot's values
+        for key, value in video_detail["details"].items():
+            # We have to reset the font and the color from
+            # previous change
+            # We start with Values and then move to Keys
+            self.canvas_obj.setFillColor(self.const.value_color)
+            self.canvas_obj.setFont(self.const.value_font,
+                                    self.const.text_size)
+            self.canvas_obj.drawString(x_pos + self.const.linefactor_x,
+                                       y_pos, str(value))
+            # Let's add in the key items
+            self.canvas_obj.setFillColor(self.const.key_color)
+            self.canvas_obj.setFont(self.const.value_font,
+                                    self.const.text_size)
+            self.canvas_obj.drawRightString(x_pos, y_pos,
+                                       str(key) + ":")
+            # We have to move the y position now
+            y_pos += self.const.linefactor_y
+
+        # Move the position, making it ready for the new entry
+        y_pos += self.const.linefactor_y
+        return x_pos, y_pos
+
     def populate_pdf(self):
         """ Populate the PDF values
         """
@@ -207,3 +518,96 @@ class PdfCreator(object):
         self._populate_pdf()
         # Cleanup the temporary files
         self._cleanup_temp_files()
+
+
+class StreamingPdfCreator(PdfCreator):
+    """ PDF Creator that draws every video as soon as its result comes
+        in, instead of waiting for all the videos. The thumbnails get a
+        fixed width budget that is decided up front, so the page width
+        does not depend on the videos that are still to come.
+
+    Args:
+        PdfCreator (_type_): _description_
+    """
+    def __init__(self, export_file_path, thumbnail_width=None):
+        """ Initialization function for the class
+
+        Args:
+            export_file_path (`str`): File path to export to
+            thumbnail_width (`float`): Width budget of the thumbnails in
+                                       mm, by default it comes from the
+                                       config
+        """
+        super(StreamingPdfCreator, self).__init__(
+            video_details=list(), export_file_path=export_file_path,
+            pdf_dimensions=(0, 0))
+        if thumbnail_width is None:
+            thumbnail_width = self.config.get("pdf").get("thumbnail_width")
+        self.thumbnail_width = thumbnail_width
+        self.video_count = 0
+        self._x_pos, self._y_pos = self.const.start_x, self.const.start_y
+
+    def _get_pdf_width(self, len_details):
+        """ Get the width of the PDF from the thumbnail width budget
+
+        Args:
+            len_details (`int`): Number of details of a video
+
+        Returns:
+            `float`: PDF width
+        """
+        if not self.thumbnail_width:
+            # Room for all the frames at 16:9 at the height of the details
+            frame_height = len_details * self.const.linefactor_y
+            self.thumbnail_width = self.config.get("framecount") * \
+                frame_height * 16 / 9 / mm
+        return self.thumbnail_width * mm + \
+            self.const.thumbnail_x_pos + self.const.width_buffer
+
+    def _get_thumbnail_width(self, img_width):
+        """ Width of the box the thumbnail is drawn in, within the budget
+
+        Args:
+            img_width (`int`): Width of the thumbnail image
+
+        Returns:
+            `float`: Width of the thumbnail box
+        """
+        return min(img_width, self.thumbnail_width * mm)
+
+    def add(self, video_detail):
+        """ Draw the video in the PDF, the canvas is created with the first
+            video. The temporary thumbnail files of the video are removed
+            once it is drawn.
+
+        Args:
+            video_detail (`dict`): Video details including the thumbnail
+        """
+        if self.canvas_obj is None:
+            self.video_details = [video_detail]
+            self._create_canvas()
+        self._x_pos, self._y_pos = self._draw_video(self.video_count,
+                                                    video_detail,
+                                                    self._x_pos, self._y_pos)
+        self.video_count += 1
+        self._cleanup_thumbnail(video_detail)
+        # The canvas has the image now, keeping the reader would only keep
+        # the thumbnail in memory until the end
+        _thumbnail = video_detail.get("thumbnail")
+        if isinstance(self._image_sources.get(_thumbnail.content_hash),
+                      ImageReader):
+            self._image_sources.pop(_thumbnail.content_hash, None)
+
+    def close(self):
+        """ Save the PDF, nothing is written if no video was added
+
+        Returns:
+            `bool`: True if the PDF was written
+        """
+        if self.canvas_obj is None:
+            return False
+        # Add some custom features
+        self._set_custom_canvas_prop()
+        # Let's save the canvas object
+        self.canvas_obj.save()
+        return True
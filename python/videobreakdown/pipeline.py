@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# std imports
+import os
+import time
+import itertools
+import collections
+
+# internal
+from .videoinfo import VideoInfo, prefetch_tags
+from .cache import get_cache
+from .exiftool import get_session
+from .hashengine import get_hash_engine
+from .base import get_config, validate_input, OS
+from .tracing import collect_spans, span, VIDEO
+
+# How many batches per worker we keep queued up in the pool, this keeps
+# the workers busy without submitting the whole list in one go
+QUEUE_FACTOR = 2
+
+
+def process_video(video_path, video_data=None, submitted=None,
+                  metadata_only=False):
+    """ Run the video info and the frames export for a single video
+
+    Args:
+        video_path (`str`): Video path value
+        video_data (`VideoInfo`): Video info object for the path, if it
+                                  was already created for the batch
+        submitted (`float`): Time the video was handed to the workers, for
+                             the queue wait in the trace
+        metadata_only (`bool`): Only read the video info, the frames are
+                                not exported and "info" has no thumbnail
+
+    Returns:
+        `dict`: Result of the video, "info" has the frames info dictionary
+                for the pdf and "error" has the error string (if any). Both
+                are None if the video was skipped
+    """
+    with span(VIDEO, video=video_path) as _span:
+        if submitted:
+            _span["queue_wait"] = max(time.time() - submitted, 0.0)
+        result = _process_video(video_path, video_data, metadata_only)
+        if result.get("error"):
+            _span["status"] = "error"
+        elif result.get("info"):
+            _span["status"] = "ok"
+        else:
+            _span["status"] = "skipped"
+    return result
+
+
+def _process_video(video_path, video_data, metadata_only=False):
+    """ Run the video info and the frames export for a single video
+
+    Args:
+        video_path (`str`): Video path value
+        video_data (`VideoInfo`): Video info object for the path
+        metadata_only (`bool`): Only read the video info
+
+    Returns:
+        `dict`: Result of the video (see process_video)
+    """
+    result = dict(path=video_path, info=None, error=None)
+    print ("Processing - {0}".format(video_path))
+    if not validate_input(video_path):
+        print ("WARNING: Cannot process the path, format does not match"
+               " the allowed formats. SKIPPING...\n\n")
+        return result
+    try:
+        # Video Info object will be created for the video path
+        if video_data is None:
+            video_data = VideoInfo(video_path=video_path)
+        video_info = video_data.videoprops
+        video_name = video_data.name
+    except Exception as e:
+        print ("WARNING: Can't get video info {0}, check error" \
+               " output file for details.".format(video_path))
+        result["error"] = str(e)
+        return result
+
+    print ("Information gathered for {0}".format(video_name))
+    vertical = False if video_data.videorotation==0 else True
+    if metadata_only:
+        result["info"] = dict(name=video_name, details=video_info,
+                              vertical=vertical)
+        print ("="*80)
+        return result
+
+    print ("Exporting frames...")
+    # numpy and PIL are only loaded by the workers that export frames, the
+    # catalogs and the short command line calls never pay for them
+    from .videoframes import VideoFrames
+    # Let's export the frames
+    try:
+        frames_data = VideoFrames(video_path=video_path,
+                                  video_name=video_name,
+                                  video_framecount=video_info.get("Frames"),
+                                  resolution=video_info.get("Resolution"),
+                                  video_rotation=video_data.videorotation,
+                                  fps=video_info.get("FPS"))
+
+        thumbnail = frames_data.export_frames()
+    except Exception as e:
+        print ("WARNING: Can't export video frames {0}, check error" \
+               " output file for details.".format(video_path))
+        result["error"] = str(e)
+        return result
+
+    print ("Frames exporting and combining finished")
+    # Store all this in the information
+    result["info"] = dict(name=video_name,
+                          details=video_info,
+                          thumbnail=thumbnail,
+                          scale=frames_data.scale,
+                          vertical=vertical)
+    print ("="*80)
+    return result
+
+
+def process_batch(video_paths, use_cache=True, trace=False,
+                  submitted=None, metadata_only=False):
+    """ Process a batch of videos, the exiftool tags for the whole batch
+        are read in one go. This is the unit of work the workers run
+
+    Args:
+        video_paths (`list`): Video paths of the batch
+        use_cache (`bool`): Use the metadata cache (if enabled in config)
+        trace (`bool`): Trace the stages, the spans are added to the
+                        results as "spans"
+        submitted (`float`): Time the batch was handed to the workers
+        metadata_only (`bool`): Only read the video info (see
+                                process_video)
+
+    Returns:
+        `list`: Result of every video (see process_video)
+    """
+    with collect_spans(enabled=trace) as spans:
+        cache = get_cache() if use_cache else None
+        video_datas = dict()
+        for _path in video_paths:
+            if validate_input(_path):
+                video_datas[_path] = VideoInfo(video_path=_path, cache=cache)
+        try:
+            prefetch_tags(list(video_datas.values()))
+        except Exception:
+            # Every video will read its own tags and report the error
+            pass
+
+        results = [process_video(_path, video_data=video_datas.get(_path),
+                                 submitted=submitted,
+                                 metadata_only=metadata_only)
+                   for _path in video_paths]
+
+    if trace:
+        # Every result takes the spans of its video, the ones of the whole
+        # batch go with the first one
+        for result in results:
+            result["spans"] = [_span for _span in spans
+                               if _span["video"] == result["path"]]
+        if results:
+            results[0]["spans"].extend(_span for _span in spans
+                                       if _span["video"] is None)
+    return results
+
+
+def _batches(video_paths):
+    """ Split the video paths into the metadata batches
+
+    Args:
+        video_paths (`iterable`): Video paths to process
+
+    Yields:
+        `list`: Batch of video paths
+    """
+    metadata_config = get_config().get("metadata", {})
+    batch_size = max(int(metadata_config.get("batch_size", 1)), 1)
+    video_paths = iter(video_paths)
+    while True:
+        batch = list(itertools.islice(video_paths, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def process_videos(video_paths, jobs=1, use_cache=True, threads=False,
+                   trace=False, executor=None, metadata_only=False):
+    """ Process the videos, either one after the other or with a pool
+        of workers
+
+    Args:
+        video_paths (`iterable`): Video paths to process
+        jobs (`int`): Number of videos to process at the same time
+        use_cache (`bool`): Use the metadata cache (if enabled in config)
+        threads (`bool`): Use worker threads instead of processes, all of
+                          them share the process runner so the external
+                          tools are limited by the "processes" config
+        trace (`bool`): Trace the stages, every result has its "spans"
+        executor (`Executor`): Pool of jobs workers to use instead of a
+                               new one, it is left running so the workers
+                               stay warm for the next call
+        metadata_only (`bool`): Only read the video info, for the catalogs
+                                that do not need the thumbnails
+
+    Yields:
+        `dict`: Result of every video (see process_video) in the same
+                order as the input paths
+    """
+    if executor is not None:
+        for result in _process_pool(executor, video_paths, jobs,
+                                    use_cache=use_cache, trace=trace,
+                                    metadata_only=metadata_only):
+            yield result
+        return
+
+    if jobs <= 1:
+        for _batch in _batches(video_paths):
+            for result in process_batch(_batch, use_cache=use_cache,
+                                        trace=trace, submitted=time.time(),
+                                        metadata_only=metadata_only):
+                yield result
+        return
+
+    with create_executor(jobs, threads=threads) as executor:
+        for result in _process_pool(executor, video_paths, jobs,
+                                    use_cache=use_cache, trace=trace,
+                                    metadata_only=metadata_only):
+            yield result
+
+
+def _process_pool(executor, video_paths, jobs, use_cache=True, trace=False,
+                  metadata_only=False):
+    """ Process the videos with the pool of workers
+
+    Args:
+        executor (`Executor`): Pool of workers
+        video_paths (`iterable`): Video paths to process
+        jobs (`int`): Number of workers of the pool
+        use_cache (`bool`): Use the metadata cache (if enabled in config)
+        trace (`bool`): Trace the stages
+        metadata_only (`bool`): Only read the video info
+
+    Yields:
+        `dict`: Result of every video in the same order as the input paths
+    """
+    # We keep the futures in the input order, the first one is
+    # always the next batch we have to hand back
+    pending = collections.deque()
+    for _batch in _batches(video_paths):
+        pending.append(executor.submit(process_batch, _batch,
+                                       use_cache=use_cache, trace=trace,
+                                       submitted=time.time(),
+                                       metadata_only=metadata_only))
+        if len(pending) >= max(jobs, 1) * QUEUE_FACTOR:
+            for result in pending.popleft().result():
+                yield result
+    while pending:
+        for result in pending.popleft().result():
+            yield result
+
+
+def create_executor(jobs, threads=False, warm=False):
+    """ Create the pool of workers
+
+    Args:
+        jobs (`int`): Number of workers
+        threads (`bool`): Use worker threads instead of processes
+        warm (`bool`): Start the tools of every worker as soon as it is
+                       started (see warm_up), for pools that are kept
+                       running
+
+    Returns:
+        `Executor`: Pool of workers
+    """
+    # Single job runs never start a pool, so it is not loaded up front
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    executor_class = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    return executor_class(max_workers=jobs,
+                          initializer=warm_up if warm else None)
+
+
+def warm_up():
+    """ Start the exiftool session (for the "session" metadata backend),
+        the hash engine and the cache connection of the worker, so the
+        first video does not pay for them
+    """
+    configs = get_config()
+    try:
+        if configs.get("metadata", {}).get("backend",
+                                           "command") == "session":
+            get_session(configs.get("tools").get("exiftool").get(OS)).start()
+        get_hash_engine()
+        get_cache()
+    except Exception as e:
+        # The videos will report the error themselves
+        print ("WARNING: Can't warm up the worker - {0}".format(e))
+
+
+def get_jobs(jobs):
+    """ Resolve the jobs value from the command line
+
+    Args:
+        jobs (`int`): Requested jobs value, 0 means use all the cores
+
+    Returns:
+        `int`: Number of worker processes to use
+    """
+    if jobs < 0:
+        raise RuntimeError("Invalid jobs value {0}".format(jobs))
+    if jobs == 0:
+        return os.cpu_count() or 1
+    return jobs
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# std imports
+import os
+import time
+import asyncio
+import threading
+from asyncio.subprocess import PIPE
+
+# internal
+from .base import get_config
+
+# Kinds of jobs, every kind has its own limit of processes running at the
+# same time. Metadata probes are light, decodes are heavy.
+METADATA = "metadata"
+DECODE = "decode"
+# Default limits if they are not in the config
+DEFAULT_LIMITS = {METADATA: 16, DECODE: 4}
+# Size of the reads of the process output
+READ_SIZE = 1024 * 1024
+
+_RUNNER = None
+_RUNNER_LOCK = threading.Lock()
+
+
+class ProcessResult(object):
+    """ Result of a finished process
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, args, returncode, stdout, stderr, wall=None,
+                 cpu=None):
+        """ Initialization function for the class
+
+        Args:
+            args (`list`): Command arguments
+            returncode (`int`): Exit code of the process
+            stdout (`bytes`): Standard output of the process
+            stderr (`str`): Error output of the process
+            wall (`float`): Seconds the process was running
+            cpu (`float`): CPU seconds of the process, None if it is not
+                           known (see get_process_cpu)
+        """
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.wall = wall
+        self.cpu = cpu
+
+
+class ProcessRunner(object):
+    """ Runs the external tools (exiftool, ffmpeg etc) directly, without a
+        shell in between. The processes are run on an asyncio loop in a
+        background thread, so any thread can run them and every kind of
+        job (metadata, decode) has its own limit of running processes.
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, limits=None):
+        """ Initialization function for the class
+
+        Args:
+            limits (`dict`): Maximum processes running at the same time
+                             for every kind of job
+        """
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self._loop = None
+        self._thread = None
+        self._semaphores = dict()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """ Event loop of the runner, it is started the first time
+
+        Returns:
+            `asyncio.AbstractEventLoop`: Event loop running the processes
+        """
+        with self._lock:
+            # A forked worker gets a copy of the loop but not the thread
+            # running it, so it needs its own
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._loop = asyncio.new_event_loop()
+                self._semaphores = dict()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name="ProcessRunner",
+                                                daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _get_semaphore(self, kind):
+        """ Get the semaphore of the kind of job, only called on the loop
+
+        Args:
+            kind (`str`): Kind of job
+
+        Returns:
+            `asyncio.Semaphore`: Semaphore for the kind
+        """
+        if kind not in self._semaphores:
+            limit = max(int(self.limits.get(kind, 1)), 1)
+            self._semaphores[kind] = asyncio.Semaphore(limit)
+        return self._semaphores[kind]
+
+    async def run_async(self, args, kind=None, stderr_callback=None,
+                        timeout=None):
+        """ Run the process and wait for it to finish. If the coroutine is
+            cancelled (or times out) the process is killed.
+
+        Args:
+            args (`list`): Command arguments, the first one is the tool
+            kind (`str`): Kind of job, None runs it without a limit
+            stderr_callback (`function`): Called with every stderr line
+                                          while the process runs
+            timeout (`float`): Seconds before the process is killed
+
+        Raises:
+            asyncio.TimeoutError: Process did not finish in time
+
+        Returns:
+            `ProcessResult`: Result of the process
+        """
+        if kind is None:
+            return await self._run(args, stderr_callback, timeout)
+        async with self._get_semaphore(kind):
+            return await self._run(args, stderr_callback, timeout)
+
+    async def _run(self, args, stderr_callback, timeout):
+        """ Start the process and collect the outputs
+
+        Args:
+            args (`list`): Command arguments, the first one is the tool
+            stderr_callback (`function`): Called with every stderr line
+            timeout (`float`): Seconds before the process is killed
+
+        Returns:
+            `ProcessResult`: Result of the process
+        """
+        wall_start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *[str(_arg) for _arg in args], stdin=asyncio.subprocess.DEVNULL,
+            stdout=PIPE, stderr=PIPE)
+        usage = dict(cpu=None)
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                asyncio.gather(self._read_stdout(process.stdout,
+                                                 process.pid, usage),
+                               self._read_stderr(process.stderr,
+                                                 process.pid, usage,
+                                                 stderr_callback)),
+                timeout)
+            returncode = await process.wait()
+        except BaseException:
+            # Cancelled, timed out or failed, the process can not keep
+            # running without anyone waiting for it
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        return ProcessResult(args, returncode, stdout, stderr,
+                             wall=time.perf_counter() - wall_start,
+                             cpu=usage["cpu"])
+
+    @staticmethod
+    def _sample_cpu(pid, usage):
+        """ Sample the CPU time of the process, it can only be read while
+            the process is there (the asyncio child watcher reaps it, so
+            its rusage is not ours to read). Both pipes sample it up to
+            their end of file, which comes with the exit of the process
+
+        Args:
+            pid (`int`): Process id
+            usage (`dict`): Latest "cpu" time of the process is set in it
+        """
+        cpu = get_process_cpu(pid)
+        if cpu is not None:
+            usage["cpu"] = max(cpu, usage["cpu"] or 0.0)
+
+    async def _read_stdout(self, stream, pid, usage):
+        """ Read the stdout while the process runs, the CPU time of the
+            process is sampled with every read (see _sample_cpu)
+
+        Args:
+            stream (`asyncio.StreamReader`): stdout of the process
+            pid (`int`): Process id
+            usage (`dict`): Latest "cpu" time of the process is set in it
+
+        Returns:
+            `bytes`: Full output
+        """
+        chunks = list()
+        while True:
+            chunk = await stream.read(READ_SIZE)
+            self._sample_cpu(pid, usage)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def _read_stderr(self, stream, pid, usage, stderr_callback):
+        """ Read the stderr line by line while the process runs, the CPU
+            time of the process is sampled with every line (see
+            _sample_cpu)
+
+        Args:
+            stream (`asyncio.StreamReader`): stderr of the process
+            pid (`int`): Process id
+            usage (`dict`): Latest "cpu" time of the process is set in it
+            stderr_callback (`function`): Called with every line
+
+        Returns:
+            `str`: Full error output
+        """
+        lines = list()
+        while True:
+            line = await stream.readline()
+            self._sample_cpu(pid, usage)
+            if not line:
+                break
+            line = str(line, encoding="utf-8", errors="replace")
+            lines.append(line)
+            if stderr_callback:
+                stderr_callback(line)
+        return "".join(lines)
+
+    def run(self, args, kind=None, stderr_callback=None, timeout=None):
+        """ Run the process from synchronous code and wait for it
+
+        Args:
+            args (`list`): Command arguments, the first one is the tool
+            kind (`str`): Kind of job, None runs it without a limit
+            stderr_callback (`function`): Called with every stderr line
+            timeout (`float`): Seconds before the process is killed
+
+        Returns:
+            `ProcessResult`: Result of the process
+        """
+        return self.run_many([args], kind=kind,
+                             stderr_callback=stderr_callback,
+                             timeout=timeout)[0]
+
+    def run_many(self, args_list, kind=None, stderr_callback=None,
+                 timeout=None):
+        """ Run the processes at the same time (within the limit of the
+            kind) from synchronous code and wait for all of them
+
+        Args:
+            args_list (`list`): Command arguments of every process
+            kind (`str`): Kind of job, None runs them without a limit
+            stderr_callback (`function`): Called with every stderr line
+            timeout (`float`): Seconds before a process is killed
+
+        Returns:
+            `list`: ProcessResult of every process, in the same order
+        """
+        async def _run_all():
+            return await asyncio.gather(
+                *[self.run_async(_args, kind=kind,
+                                 stderr_callback=stderr_callback,
+                                 timeout=timeout)
+                  for _args in args_list])
+
+        future = asyncio.run_coroutine_threadsafe(_run_all(), self.loop)
+        try:
+            return future.result()
+        except BaseException:
+            # KeyboardInterrupt etc, the processes get killed
+            future.cancel()
+            raise
+
+
+def get_process_cpu(pid):
+    """ CPU time (user and system) of a running process, only available
+        on linux
+
+    Args:
+        pid (`int`): Process id
+
+    Returns:
+        `float`: CPU seconds, None if it can not be read
+    """
+    try:
+        with open("/proc/{0}/stat".format(pid), "r") as file_open:
+            stat_values = file_open.read()
+    except OSError:
+        return None
+    # The name of the process can have spaces, the values are after it
+    stat_values = stat_values[stat_values.rindex(")") + 2:].split()
+    return (int(stat_values[11]) + int(stat_values[12])) / \
+        os.sysconf("SC_CLK_TCK")
+
+
+def get_runner():
+    """ Get the process runner of the application, the limits come from
+        the config
+
+    Returns:
+        `ProcessRunner`: Process runner object
+    """
+    global _RUNNER
+    with _RUNNER_LOCK:
+        if _RUNNER is None:
+            _RUNNER = ProcessRunner(limits=get_config().get("processes"))
+    return _RUNNER
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# std imports
+import os
+import time
+
+# internal
+from .catalog import CatalogWriter, CATALOG_FORMATS
+from .pipeline import process_videos
+from .tracing import TraceRecorder, span, PDF
+from .base import get_config, get_dimensions, DEBUG_COUNTER
+
+# Report outputs that can be asked for, the PDF, the HTML page or a catalog
+# of the video properties only
+REPORT_OUTPUTS = ("pdf", "html") + CATALOG_FORMATS
+
+
+def get_report_path(export_dir, output="pdf", reserved=()):
+    """ Path for a new report in the directory, named with the current
+        time stamp
+
+    Args:
+        export_dir (`str`): Directory of the report
+        output (`str`): Report output, it is the file extension (see
+                        REPORT_OUTPUTS)
+        reserved (`set`): Paths of the reports that are not written yet
+                          (normalized, see os.path.normcase), they are
+                          taken as well
+
+    Returns:
+        `str`: Report file path that does not exist yet
+    """
+    report_name = time.strftime("%Y%m%d_%H%M%S_vb")
+    export_path = os.path.join(export_dir, "{0}.{1}".format(report_name,
+                                                            output))
+    counter = 1
+    # Reports can come in quicker than one every second
+    while os.path.exists(export_path) or \
+            os.path.normcase(os.path.abspath(export_path)) in reserved:
+        export_path = os.path.join(export_dir, "{0}_{1}.{2}".format(
+            report_name, counter, output))
+        counter += 1
+    return export_path
+
+
+def get_output_paths(export_path):
+    """ Paths of the files that are written next to the report
+
+    Args:
+        export_path (`str`): PDF or catalog file path
+
+    Returns:
+        `dict`: errors, delta, trace and metrics file paths
+    """
+    _pdf_name = os.path.splitext(export_path)[0]
+    return dict(errors=_pdf_name + "_ERRORS.txt",
+                delta=_pdf_name + "_DELTA.txt",
+                trace=_pdf_name + "_TRACE.json",
+                metrics=_pdf_name + "_METRICS.prom")
+
+
+def _save_snapshots(snapshots, export_errors, delta_output):
+    """ Save the folder snapshots and write the delta report
+
+    Args:
+        snapshots (`list`): ScanSnapshot objects of the folders
+        export_errors (`dict`): Errored video paths, these are left out of
+                                the snapshots so they are tried again
+        delta_output (`str`): Delta report file path
+    """
+    delta_string = ""
+    for snapshot in snapshots:
+        for _path in export_errors.keys():
+            snapshot.forget(_path)
+        snapshot.save()
+        delta_string += snapshot.delta_report()
+        delta_string += "\n" + "*"*80 + "\n\n"
+
+    with open(delta_output, "w") as file_open:
+        file_open.write(delta_string)
+
+    print ("NOTE: Changes since the last run are in \"{0}\"".format(
+        delta_output))
+
+
+def _write_errors(export_errors, error_output):
+    """ Write the errored videos into a text file
+
+    Args:
+        export_errors (`dict`): Error string of every errored video path
+        error_output (`str`): Errors file path
+    """
+    _final_error_string = ""
+    for path, error_str in export_errors.items():
+        _final_error_string += "{0} - {1}".format(path, error_str)
+        _final_error_string += "\n\n" + "*"*80 + "\n\n"
+
+    with open(error_output, "w") as file_open:
+        file_open.write(_final_error_string)
+
+    print ("NOTE: Please look at \"{0}\" for full details about" \
+           " errors".format(error_output))
+
+
+def create_report(video_paths, export_path, jobs=1, use_cache=True,
+                  threads=False, trace=False, snapshots=None,
+                  executor=None, progress=None, journal=None, output="pdf"):
+    """ Process the videos and export the PDF report (or the catalog), the
+        errors, delta and trace files are written next to it
+
+    Args:
+        video_paths (`iterable`): Video paths to process
+        export_path (`str`): PDF or catalog file path
+        jobs (`int`): Number of videos to process at the same time
+        use_cache (`bool`): Use the metadata cache (if enabled in config)
+        threads (`bool`): Use worker threads instead of processes
+        trace (`bool`): Trace the stages and write the trace files
+        snapshots (`list`): ScanSnapshot objects of the folders, they are
+                            saved once the videos are processed
+        executor (`Executor`): Pool of workers that is kept running
+                               between the reports (see process_videos)
+        progress (`function`): Called with the result of every video
+                               once it is processed
+        journal (`RunJournal`): Journal of the run, the videos that are in
+                                it already are not processed again. It is
+                                removed once the PDF is exported
+        output (`str`): Report output (see REPORT_OUTPUTS), the catalogs
+                        only read the video info of every video
+
+    Raises:
+        RuntimeError: Journals are not kept for the catalogs
+        RuntimeError: Snapshots are not saved for the catalogs
+        RuntimeError: PDF exporting failed
+
+    Returns:
+        `dict`: Summary of the report (see export_report)
+    """
+    metadata_only = output in CATALOG_FORMATS
+    if journal and metadata_only:
+        raise RuntimeError("Run journals can not be used for the catalogs")
+    if snapshots and metadata_only:
+        # The catalog would use up the delta, the next PDF run would not
+        # make thumbnails for its videos
+        raise RuntimeError("Snapshots can not be used for the catalogs")
+    trace = bool(trace or DEBUG_COUNTER)
+
+    def _process(_video_paths):
+        return process_videos(_video_paths, jobs=jobs, use_cache=use_cache,
+                              threads=threads, trace=trace,
+                              executor=executor,
+                              metadata_only=metadata_only)
+
+    if journal:
+        results = journal.replay(video_paths, _process)
+    else:
+        results = _process(video_paths)
+    try:
+        report = export_report(results, export_path, trace=trace,
+                               snapshots=snapshots, progress=progress,
+                               output=output)
+    except BaseException:
+        if journal:
+            print ("NOTE: The done videos are in the run journal, go on "
+                   "with --resume \"{0}\"".format(journal.run_dir))
+        raise
+    if journal:
+        journal.remove()
+    return report
+
+
+def export_report(results, export_path, trace=False, snapshots=None,
+                  progress=None, output="pdf"):
+    """ Export the PDF report (or the catalog) of the video results, the
+        errors, delta and trace files are written next to it
+
+    Args:
+        results (`iterable`): Result of every video (see process_video),
+                              in the PDF order
+        export_path (`str`): PDF or catalog file path
+        trace (`bool`): Trace the stages and write the trace files
+        snapshots (`list`): ScanSnapshot objects of the folders, they are
+                            saved once the PDF is exported
+        progress (`function`): Called with the result of every video
+        output (`str`): Report output (see REPORT_OUTPUTS)
+
+    Raises:
+        RuntimeError: PDF exporting failed
+
+    Returns:
+        `dict`: Summary of the report, "exported" is False if there was
+                nothing to export and "errors" has the error string of
+                every errored video path
+    """
+    outputs = get_output_paths(export_path)
+    # store the thumbnails
+    thumbnails = []
+    pdf_info_list = list()
+    # store the skipped or errored paths
+    export_errors = dict()
+    # Spans of the workers come back with the results, the pdf ones are
+    # collected here
+    trace_recorder = None
+    if trace:
+        trace_recorder = TraceRecorder()
+        trace_recorder.start()
+    # The streaming PDF is written while the videos are processed, so the
+    # thumbnails are not kept around until the end
+    pdf_streaming = get_config().get("pdf").get("streaming", False)
+    pdf_creator_object = None
+    # The catalog and the HTML page are written while the videos are
+    # processed as well
+    catalog_writer = None
+    if output in CATALOG_FORMATS:
+        catalog_writer = CatalogWriter(export_file_path=export_path,
+                                       catalog_format=output)
+    elif output == "html":
+        # PIL is only loaded for the HTML page and reportlab for the PDF
+        from .htmlcreator import HtmlCreator
+        pdf_creator_object = HtmlCreator(video_details=list(),
+                                         export_file_path=export_path)
+    else:
+        from .pdfcreator import PdfCreator, StreamingPdfCreator
+        if pdf_streaming:
+            pdf_creator_object = StreamingPdfCreator(
+                export_file_path=export_path)
+    videos_exported = 0
+    try:
+        for result in results:
+            if trace_recorder:
+                trace_recorder.add_spans(result.pop("spans", None))
+            if progress:
+                progress(result)
+            if result.get("error"):
+                export_errors[result.get("path")] = result.get("error")
+                if catalog_writer:
+                    catalog_writer.add(result)
+                continue
+            frames_info_dict = result.get("info")
+            # Skipped videos do not have any information
+            if not frames_info_dict:
+                continue
+            videos_exported += 1
+            if catalog_writer:
+                catalog_writer.add(result)
+                continue
+            if pdf_creator_object:
+                try:
+                    with span(PDF, video=result.get("path")):
+                        pdf_creator_object.add(frames_info_dict)
+                except Exception as e:
+                    print ("ERROR: {0} exporting failed!".format(
+                        output.upper()))
+                    raise
+                continue
+            thumbnails.append(frames_info_dict.get("thumbnail"))
+            # Insert into the pdf info list
+            pdf_info_list.append(frames_info_dict)
+
+        pdf_exported = False
+        if catalog_writer:
+            pdf_exported = catalog_writer.close()
+        elif pdf_creator_object:
+            try:
+                with span(PDF):
+                    pdf_exported = pdf_creator_object.close()
+            except Exception as e:
+                print ("ERROR: {0} exporting failed!".format(output.upper()))
+                raise
+        elif len(pdf_info_list):
+            # Let's start creating the PDF creator object
+            print ("Exporting final PDF")
+            try:
+                with span(PDF):
+                    pdf_creator_object = PdfCreator(
+                        video_details=pdf_info_list,
+                        export_file_path=export_path,
+                        pdf_dimensions=get_dimensions(thumbnails))
+                    pdf_creator_object.populate_pdf()
+            except Exception as e:
+                print ("ERROR: PDF exporting failed!")
+                raise
+            pdf_exported = True
+
+        # Saved once the report is there, a run that fails is done again
+        if snapshots:
+            _save_snapshots(snapshots, export_errors, outputs["delta"])
+    finally:
+        # A run that fails keeps what the catalog has so far, the file is
+        # closed either way
+        if catalog_writer:
+            catalog_writer.close()
+        if trace_recorder:
+            trace_recorder.stop()
+
+    if trace_recorder:
+        trace_recorder.write_chrome_trace(outputs["trace"])
+        trace_recorder.write_metrics(outputs["metrics"])
+        print ("NOTE: Trace of the run is in \"{0}\" and \"{1}\"".format(
+            outputs["trace"], outputs["metrics"]))
+
+    # If we have errored frames then let's print export them in a text file
+    if pdf_exported and len(export_errors.keys()) > 0:
+        _write_errors(export_errors, outputs["errors"])
+
+    return dict(export_path=export_path, output=output,
+                exported=pdf_exported, videos=videos_exported,
+                errors=export_errors)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# internal
+from .base import get_config
+
+
+class SamplePlan(object):
+    """ Positions of the thumbnails in a video, as frame numbers and as
+        timestamps (seconds)
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, frames, fps=None):
+        """ Initialization function for the class
+
+        Args:
+            frames (`list`): Frame numbers of the thumbnails, in order
+            fps (`float`): Frame rate of the video, needed for the
+                           timestamps
+        """
+        self.frames = frames
+        self.fps = fps
+
+    @property
+    def timestamps(self):
+        """ Timestamps of the thumbnails
+
+        Returns:
+            `list`: Seconds of every thumbnail, None if the frame rate is
+                    not known
+        """
+        if not self.fps:
+            return None
+        return [_frame / self.fps for _frame in self.frames]
+
+    def __len__(self):
+        """ Number of thumbnails
+
+        Returns:
+            `int`: Number of thumbnails
+        """
+        return len(self.frames)
+
+
+def _spread(first, last, count):
+    """ Frame numbers evenly spread from the first to the last frame
+
+    Args:
+        first (`int`): First frame
+        last (`int`): Last frame
+        count (`int`): Number of frames
+
+    Returns:
+        `list`: Frame numbers
+    """
+    if last < first or count < 1:
+        return list()
+    if last - first + 1 <= count:
+        return list(range(first, last + 1))
+    if count == 1:
+        return [(first + last) // 2]
+    return [first + (last - first) * _index // (count - 1)
+            for _index in range(count)]
+
+
+def uniform(framecount, count, fps=None):
+    """ Thumbnails evenly spread from the first to the last frame
+
+    Args:
+        framecount (`int`): Number of frames of the video
+        count (`int`): Number of thumbnails
+        fps (`float`): Frame rate of the video
+
+    Returns:
+        `list`: Frame numbers
+    """
+    return _spread(0, framecount - 1, count)
+
+
+def skip_intro_outro(framecount, count, fps=None, intro=0, outro=0):
+    """ Thumbnails evenly spread, leaving out the seconds at the start
+        (slates, black frames) and at the end (credits) of the video. The
+        whole video is used if there is nothing left after skipping
+
+    Args:
+        framecount (`int`): Number of frames of the video
+        count (`int`): Number of thumbnails
+        fps (`float`): Frame rate of the video, without it nothing is
+                       skipped
+        intro (`float`): Seconds to skip at the start
+        outro (`float`): Seconds to skip at the end
+
+    Returns:
+        `list`: Frame numbers
+    """
+    if not fps:
+        return uniform(framecount, count)
+    first = int(float(intro) * fps)
+    last = framecount - 1 - int(float(outro) * fps)
+    if last < first:
+        return uniform(framecount, count)
+    return _spread(first, last, count)
+
+
+def time_based(framecount, count, fps=None, interval=60):
+    """ A thumbnail every interval seconds from the start, up to count
+        thumbnails
+
+    Args:
+        framecount (`int`): Number of frames of the video
+        count (`int`): Maximum number of thumbnails
+        fps (`float`): Frame rate of the video, without it the thumbnails
+                       are spread evenly
+        interval (`float`): Seconds between the thumbnails
+
+    Returns:
+        `list`: Frame numbers
+    """
+    step = int(float(interval) * fps) if fps else 0
+    if step < 1:
+        return uniform(framecount, count)
+    return list(range(0, framecount, step)[:count])
+
+
+# Sampling strategies, they give back the frame numbers of the thumbnails
+# for the frame count, thumbnail count, frame rate and their own options
+SAMPLING_STRATEGIES = {
+    "uniform": uniform,
+    "skip_intro_outro": skip_intro_outro,
+    "time": time_based,
+}
+
+
+def register_strategy(name, strategy):
+    """ Add a sampling strategy
+
+    Args:
+        name (`str`): Name of the strategy in the config
+        strategy (`function`): Gives back the frame numbers, called with
+                               the frame count, thumbnail count, frame
+                               rate and the options from the config
+    """
+    SAMPLING_STRATEGIES[name] = strategy
+
+
+def plan_samples(framecount, count, fps=None, strategy="uniform",
+                 **options):
+    """ Plan the thumbnail positions of the video, the cost only depends
+        on the number of thumbnails
+
+    Args:
+        framecount (`int`): Number of frames of the video
+        count (`int`): Number of thumbnails
+        fps (`float`): Frame rate of the video
+        strategy (`str`): Sampling strategy name
+
+    Raises:
+        RuntimeError: Invalid sampling strategy
+
+    Returns:
+        `SamplePlan`: Thumbnail positions
+    """
+    if strategy not in SAMPLING_STRATEGIES:
+        raise RuntimeError("Invalid sampling strategy {0}".format(strategy))
+    frames = SAMPLING_STRATEGIES[strategy](max(int(framecount or 0), 0),
+                                           int(count), fps, **options)
+    return SamplePlan(frames, fps=fps)
+
+
+def get_sample_plan(framecount, fps=None):
+    """ Plan the thumbnail positions with the strategy from the config
+
+    Args:
+        framecount (`int`): Number of frames of the video
+        fps (`float`): Frame rate of the video
+
+    Returns:
+        `SamplePlan`: Thumbnail positions
+    """
+    config = get_config()
+    sampling_config = config.get("frames", {}).get("sampling") or {}
+    strategy = sampling_config.get("strategy", "uniform")
+    # Every strategy has its own options
+    options = sampling_config.get(strategy) or {}
+    return plan_samples(framecount, config.get("framecount"), fps=fps,
+                        strategy=strategy, **options)
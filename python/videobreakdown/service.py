@@ -0,0 +1,547 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import time
+import uuid
+import heapq
+import itertools
+import threading
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# internal
+from .report import create_report, get_report_path, REPORT_OUTPUTS
+from .pipeline import create_executor, warm_up
+from .discovery import walk_videos
+from .base import get_config
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# Largest job request body we read, in bytes
+MAX_BODY_SIZE = 1048576
+
+
+class ExportPathConflict(RuntimeError):
+    """ The export path is taken by a job that is queued or running
+
+    Args:
+        RuntimeError (_type_): _description_
+    """
+
+
+def _export_key(export_path):
+    """ Key of the export path, the same file gives the same key
+
+    Args:
+        export_path (`str`): Report file path
+
+    Returns:
+        `str`: Normalized absolute path
+    """
+    return os.path.normcase(os.path.abspath(export_path))
+
+
+class Job(object):
+    """ Breakdown job of the service, the videos of the paths go into one
+        report
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, paths, output="pdf", priority=0, export_path=None,
+                 use_cache=True):
+        """ Initialization function for the class
+
+        Args:
+            paths (`list`): Video files and folders
+            output (`str`): Report output (see REPORT_OUTPUTS)
+            priority (`int`): Jobs with a higher priority run first
+            export_path (`str`): PDF or catalog file path, by default it
+                                 is named with the time stamp in the
+                                 folder of the first path
+            use_cache (`bool`): Use the metadata cache
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.paths = paths
+        self.output = output
+        self.priority = priority
+        self.export_path = export_path
+        self.use_cache = use_cache
+        self.status = QUEUED
+        self.error = None
+        # Progress, total is known once the folders are walked
+        self.total = None
+        self.processed = 0
+        self.errored = 0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def add_result(self, result):
+        """ Count the processed video (see create_report)
+
+        Args:
+            result (`dict`): Result of the video
+        """
+        self.processed += 1
+        if result.get("error"):
+            self.errored += 1
+
+    def to_dict(self):
+        """ Job details for the API
+
+        Returns:
+            `dict`: Job details
+        """
+        progress = None
+        if self.total:
+            progress = round(self.processed / float(self.total), 3)
+        elif self.status == DONE:
+            progress = 1.0
+        return dict(id=self.id, status=self.status, paths=self.paths,
+                    output=self.output, priority=self.priority,
+                    export_path=self.export_path if self.status == DONE
+                    else None,
+                    error=self.error, total=self.total,
+                    processed=self.processed, errored=self.errored,
+                    progress=progress, submitted=self.submitted,
+                    started=self.started, finished=self.finished)
+
+
+class BreakdownService(object):
+    """ Queue of breakdown jobs that all run on one pool of workers, so the
+        throughput of all the jobs is controlled in one place
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, jobs=1, threads=False, use_cache=True, runners=None,
+                 keep_jobs=None):
+        """ Initialization function for the class, the values that are not
+            given come from the service config
+
+        Args:
+            jobs (`int`): Number of videos processed at the same time, for
+                          all the jobs together
+            threads (`bool`): Use worker threads instead of processes
+            use_cache (`bool`): Use the metadata cache
+            runners (`int`): Number of jobs that run at the same time,
+                             their videos share the workers
+            keep_jobs (`int`): Number of finished jobs that are kept for
+                               the status requests
+        """
+        service_config = get_config().get("service") or {}
+        self.jobs = jobs
+        self.threads = threads
+        self.use_cache = use_cache
+        self.runners = max(int(runners or service_config.get("runners", 1)),
+                           1)
+        self.keep_jobs = int(keep_jobs or service_config.get("keep_jobs",
+                                                             100))
+        # (-priority, order, job), first in first out for the same priority
+        self._queue = list()
+        self._order = itertools.count()
+        self._jobs = collections.OrderedDict()
+        self._condition = threading.Condition()
+        # Export paths of the queued and running jobs, the reports are only
+        # written at the end so the paths are reserved till then
+        self._export_paths = set()
+        self._threads = list()
+        self._executor = None
+        self._stopped = False
+
+    def submit(self, paths, output="pdf", priority=0, export_path=None,
+               use_cache=True):
+        """ Add a job to the queue
+
+        Args:
+            paths (`list`): Video files and folders
+            output (`str`): Report output (see REPORT_OUTPUTS)
+            priority (`int`): Jobs with a higher priority run first
+            export_path (`str`): PDF or catalog file path
+            use_cache (`bool`): Use the metadata cache (if the service does)
+
+        Raises:
+            RuntimeError: Invalid job values
+            ExportPathConflict: Another job exports to the same path
+
+        Returns:
+            `Job`: Queued job
+        """
+        if not paths or not isinstance(paths, list) or \
+                not all(isinstance(_path, str) for _path in paths):
+            raise RuntimeError("Paths should be a list of file or folder "
+                               "paths")
+        errored_paths = [_path for _path in paths
+                         if not os.path.exists(_path)]
+        if errored_paths:
+            raise RuntimeError("Following paths do not exists"
+                               " {0}".format(", ".join(errored_paths)))
+        if output not in REPORT_OUTPUTS:
+            raise RuntimeError("Invalid output {0}, it should be one of "
+                               "{1}".format(output, ", ".join(REPORT_OUTPUTS)))
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            raise RuntimeError("Invalid priority {0}".format(priority))
+        if export_path:
+            if os.path.isdir(export_path):
+                raise RuntimeError("Path {0} is not a" \
+                                   " file path!".format(export_path))
+            if os.path.exists(export_path):
+                raise RuntimeError("Path {0} already exists.".format(
+                    export_path))
+
+        job = Job([os.path.abspath(_path) for _path in paths], output=output,
+                  priority=priority, export_path=export_path,
+                  use_cache=use_cache and self.use_cache)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("The service is stopping")
+            if export_path:
+                export_key = _export_key(export_path)
+                if export_key in self._export_paths:
+                    raise ExportPathConflict("Path {0} is the export path "
+                                             "of another job.".format(
+                                                 export_path))
+                self._export_paths.add(export_key)
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (-priority, next(self._order), job))
+            self._condition.notify()
+        return job
+
+    def get_job(self, job_id):
+        """ Get the job
+
+        Args:
+            job_id (`str`): Job id
+
+        Returns:
+            `Job`: Job, None if there is no such job
+        """
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        """ All the jobs the service knows about, in the submit order
+
+        Returns:
+            `list`: Jobs
+        """
+        with self._condition:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """ Cancel the queued job, running jobs can not be cancelled
+
+        Args:
+            job_id (`str`): Job id
+
+        Returns:
+            `bool`: True if the job was cancelled
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            job.status = CANCELLED
+            job.finished = time.time()
+            self._release_export_path(job)
+            # It is left in the queue, the runners skip it
+            self._forget_finished()
+            return True
+
+    def get_status(self):
+        """ Status of the service
+
+        Returns:
+            `dict`: Number of jobs in every state and the workers
+        """
+        with self._condition:
+            states = collections.Counter(_job.status
+                                         for _job in self._jobs.values())
+        return dict(jobs=dict(states), workers=self.jobs,
+                    runners=self.runners)
+
+    def _forget_finished(self):
+        """ Drop the oldest finished jobs once there are more than
+            keep_jobs of them, the lock has to be held
+        """
+        finished = [_job.id for _job in self._jobs.values()
+                    if _job.status in (DONE, FAILED, CANCELLED)]
+        for job_id in finished[:max(len(finished) - self.keep_jobs, 0)]:
+            del self._jobs[job_id]
+
+    def _release_export_path(self, job):
+        """ Give the export path of the finished job free, the lock has to
+            be held
+
+        Args:
+            job (`Job`): Finished job
+        """
+        if job.export_path:
+            self._export_paths.discard(_export_key(job.export_path))
+
+    def _next_job(self):
+        """ Wait for the next queued job
+
+        Returns:
+            `Job`: Job to run, None once the service is stopped
+        """
+        with self._condition:
+            while True:
+                while self._queue and \
+                        self._queue[0][-1].status == CANCELLED:
+                    heapq.heappop(self._queue)
+                if self._stopped:
+                    return None
+                if self._queue:
+                    job = heapq.heappop(self._queue)[-1]
+                    job.status = RUNNING
+                    job.started = time.time()
+                    return job
+                self._condition.wait()
+
+    def _run_job(self, job):
+        """ Run the job on the shared workers
+
+        Args:
+            job (`Job`): Job to run
+        """
+        video_paths = list()
+        for _path in job.paths:
+            if os.path.isdir(_path):
+                video_paths.extend(walk_videos(_path))
+            else:
+                video_paths.append(_path)
+        job.total = len(video_paths)
+        if not job.export_path:
+            # NOTE: WE TAKE THE FIRST ELEMENT OF THE PATH LIST
+            if os.path.isdir(job.paths[0]):
+                export_dir = job.paths[0]
+            else:
+                export_dir = os.path.dirname(job.paths[0])
+            # Other runners can name a report in the same second
+            with self._condition:
+                job.export_path = get_report_path(
+                    export_dir, output=job.output,
+                    reserved=self._export_paths)
+                self._export_paths.add(_export_key(job.export_path))
+        report = create_report(video_paths, job.export_path, jobs=self.jobs,
+                               use_cache=job.use_cache, threads=self.threads,
+                               executor=self._executor,
+                               progress=job.add_result, output=job.output)
+        if not report.get("exported"):
+            raise RuntimeError("Noting to export!")
+
+    def _run(self):
+        """ Run the queued jobs until the service is stopped
+        """
+        if self._executor is None:
+            # The videos run in this thread, so it gets the warm tools
+            warm_up()
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._run_job(job)
+                status = DONE
+            except Exception as e:
+                print ("ERROR: Job {0} failed - {1}".format(job.id, e))
+                job.error = str(e)
+                status = FAILED
+            with self._condition:
+                job.status = status
+                job.finished = time.time()
+                self._release_export_path(job)
+                self._forget_finished()
+
+    def start(self):
+        """ Start the workers and the job runners
+        """
+        if self.jobs > 1:
+            self._executor = create_executor(self.jobs, threads=self.threads,
+                                             warm=True)
+            # Start the workers now rather than with the first job
+            for _future in [self._executor.submit(os.getpid)
+                            for _ in range(self.jobs)]:
+                _future.result()
+        for _ in range(self.runners):
+            thread = threading.Thread(target=self._run, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """ Stop the service once the running jobs are done, the queued
+            jobs are dropped
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = list()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """ HTTP/JSON API of the service
+
+        POST /jobs          - submit a job, {"paths": [...], "output": "pdf",
+                              "priority": 0, "export_path": "..."}
+        GET /jobs           - all the jobs
+        GET /jobs/<id>      - status, progress and the PDF path of the job
+        DELETE /jobs/<id>   - cancel the queued job
+        GET /status         - jobs in every state and the workers
+
+    Args:
+        BaseHTTPRequestHandler (_type_): _description_
+    """
+    server_version = "videobreakdown"
+
+    @property
+    def service(self):
+        """ Service of the server
+
+        Returns:
+            `BreakdownService`: Service object
+        """
+        return self.server.service
+
+    def _send_json(self, status, data):
+        """ Send the JSON response
+
+        Args:
+            status (`int`): HTTP status code
+            data (`dict`): Response data
+        """
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        """ Send the JSON error response
+
+        Args:
+            status (`int`): HTTP status code
+            message (`str`): Error message
+        """
+        self._send_json(status, dict(error=message))
+
+    def _get_job_id(self):
+        """ Job id of the /jobs/<id> path
+
+        Returns:
+            `str`: Job id, None for the other paths
+        """
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs":
+            return parts[1]
+        return None
+
+    def _read_json(self):
+        """ Read the JSON body of the request
+
+        Raises:
+            RuntimeError: Invalid body
+
+        Returns:
+            `dict`: Request data
+        """
+        try:
+            size = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            raise RuntimeError("Invalid Content-Length")
+        if size > MAX_BODY_SIZE:
+            raise RuntimeError("Request is too large")
+        try:
+            data = json.loads(self.rfile.read(size) or b"{}")
+        except ValueError as e:
+            raise RuntimeError("Invalid JSON - {0}".format(e))
+        if not isinstance(data, dict):
+            raise RuntimeError("Request should be a JSON object")
+        return data
+
+    def do_GET(self):
+        """ Jobs and status requests
+        """
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/status":
+            self._send_json(200, self.service.get_status())
+            return
+        if path == "/jobs":
+            self._send_json(200, dict(jobs=[_job.to_dict() for _job in
+                                            self.service.list_jobs()]))
+            return
+        job_id = self._get_job_id()
+        job = self.service.get_job(job_id) if job_id else None
+        if job is None:
+            self._send_error(404, "Not found")
+            return
+        self._send_json(200, job.to_dict())
+
+    def do_POST(self):
+        """ Job submit requests
+        """
+        if self.path.split("?")[0].rstrip("/") != "/jobs":
+            self._send_error(404, "Not found")
+            return
+        try:
+            data = self._read_json()
+            job = self.service.submit(data.get("paths"),
+                                      output=data.get("output", "pdf"),
+                                      priority=data.get("priority", 0),
+                                      export_path=data.get("export_path"),
+                                      use_cache=data.get("use_cache", True))
+        except ExportPathConflict as e:
+            self._send_error(409, str(e))
+            return
+        except RuntimeError as e:
+            self._send_error(400, str(e))
+            return
+        self._send_json(201, job.to_dict())
+
+    def do_DELETE(self):
+        """ Job cancel requests
+        """
+        job_id = self._get_job_id()
+        job = self.service.get_job(job_id) if job_id else None
+        if job is None:
+            self._send_error(404, "Not found")
+            return
+        if not self.service.cancel(job_id):
+            self._send_error(409, "Only the queued jobs can be cancelled")
+            return
+        self._send_json(200, job.to_dict())
+
+
+def create_server(service, host=None, port=None):
+    """ Create the HTTP server of the service, the values that are not
+        given come from the service config
+
+    Args:
+        service (`BreakdownService`): Service object
+        host (`str`): Address to listen on
+        port (`int`): Port to listen on
+
+    Returns:
+        `ThreadingHTTPServer`: HTTP server
+    """
+    service_config = get_config().get("service") or {}
+    if host is None:
+        host = service_config.get("host", "127.0.0.1")
+    if port is None:
+        port = service_config.get("port", 8765)
+    server = ThreadingHTTPServer((host, int(port)), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import time
+import xxhash
+
+# internal
+from .base import get_config, validate_input, SNAPSHOTS_PATH
+
+# Snapshot file format version
+SNAPSHOT_VERSION = 1
+
+
+class ScanSnapshot(object):
+    """ Snapshot index of a scanned root directory. It stores the size,
+        modification time and inode of every video, so the next scan can
+        work only on the new or modified videos.
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, root, snapshot_dir=None):
+        """ Initialization function for the class
+
+        Args:
+            root (`str`): Root directory that is scanned
+            snapshot_dir (`str`): Directory of the snapshot files, by
+                                  default it comes from the config
+        """
+        self.root = os.path.realpath(root)
+        self.snapshot_dir = snapshot_dir or get_snapshot_dir()
+        # Previous and current entries, path: [size, mtime_ns, inode]
+        self.previous = None
+        self.entries = dict()
+        self.seen = set()
+        self.new = list()
+        self.modified = list()
+
+    @property
+    def snapshot_path(self):
+        """ Snapshot file path of the root directory
+
+        Returns:
+            `str`: Snapshot file path
+        """
+        root_hash = xxhash.xxh64(self.root.encode("utf-8")).hexdigest()
+        return os.path.join(self.snapshot_dir,
+                            "{0}.json".format(root_hash))
+
+    @property
+    def removed(self):
+        """ Videos that were in the previous snapshot but are gone now
+
+        Returns:
+            `list`: Removed video paths
+        """
+        return sorted(set(self.load()) - self.seen)
+
+    def load(self):
+        """ Load the previous snapshot of the root (only once)
+
+        Returns:
+            `dict`: Previous entries, empty if there is no snapshot yet
+        """
+        if self.previous is None:
+            self.previous = dict()
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r") as file_open:
+                    snapshot_data = json.load(file_open)
+                if snapshot_data.get("version") == SNAPSHOT_VERSION:
+                    self.previous = snapshot_data.get("entries", {})
+        return self.previous
+
+    def update(self, video_paths):
+        """ Add the videos to the snapshot and give back the ones that are
+            new or modified since the previous snapshot
+
+        Args:
+            video_paths (`iterable`): Video paths or directory entries
+                                      (see scan_videos) found in the scan
+
+        Yields:
+            `str`: New or modified video paths
+        """
+        previous = self.load()
+        for _path in video_paths:
+            try:
+                if isinstance(_path, os.DirEntry):
+                    # The entry has the stat cached (free on windows)
+                    stat_result = _path.stat()
+                    _path = _path.path
+                elif validate_input(_path):
+                    stat_result = os.stat(_path)
+                else:
+                    continue
+            except OSError:
+                # Gone between the scan and now, nothing to do for it
+                continue
+            entry = _get_entry(stat_result)
+            # Same key whatever way the root was given
+            _key = os.path.abspath(_path)
+            self.entries[_key] = entry
+            self.seen.add(_key)
+            previous_entry = previous.get(_key)
+            if previous_entry is None:
+                self.new.append(_key)
+            elif previous_entry != entry:
+                self.modified.append(_key)
+            else:
+                continue
+            yield _path
+
+    def is_current(self, video_path):
+        """ Is the video in the snapshot and unchanged since it was added
+
+        Args:
+            video_path (`str`): Video path
+
+        Returns:
+            `bool`: True if the size, modification time and inode are the
+                    same as in the snapshot
+        """
+        try:
+            stat_result = os.stat(video_path)
+        except OSError:
+            return False
+        return self.entries.get(os.path.abspath(video_path)) == \
+            _get_entry(stat_result)
+
+    def forget(self, video_path):
+        """ Remove the video from the snapshot, so it is processed again
+            on the next scan (for the videos that failed)
+
+        Args:
+            video_path (`str`): Video path
+        """
+        self.entries.pop(os.path.abspath(video_path), None)
+
+    def save(self):
+        """ Write the snapshot, the old one is replaced only once the new
+            one is fully written
+        """
+        if not os.path.exists(self.snapshot_dir):
+            os.makedirs(self.snapshot_dir)
+        snapshot_data = dict(version=SNAPSHOT_VERSION, root=self.root,
+                             created=time.time(), entries=self.entries)
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w") as file_open:
+            json.dump(snapshot_data, file_open)
+        os.replace(temp_path, self.snapshot_path)
+
+    def delta_report(self):
+        """ Report of the changes since the previous snapshot
+
+        Returns:
+            `str`: New, modified and removed videos
+        """
+        report_string = "Root - {0}\n".format(self.root)
+        for title, paths in (("NEW", self.new),
+                             ("MODIFIED", self.modified),
+                             ("REMOVED", self.removed)):
+            report_string += "\n{0} ({1})\n".format(title, len(paths))
+            for _path in paths:
+                report_string += "    {0}\n".format(_path)
+        return report_string
+
+
+def _get_entry(stat_result):
+    """ Snapshot entry of a video
+
+    Args:
+        stat_result (`os.stat_result`): Stat of the video
+
+    Returns:
+        `list`: Size, modification time and inode
+    """
+    return [stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino]
+
+
+def get_snapshot_dir():
+    """ Get the snapshots directory from the config, by default it is
+        kept next to the appconfig.yml
+
+    Returns:
+        `str`: Snapshots directory
+    """
+    snapshot_config = get_config().get("snapshots", {})
+    return snapshot_config.get("path") or SNAPSHOTS_PATH
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# std imports
+import re
+import types
+
+# internal
+from .base import get_config
+
+# Tag groups of the config that are not extension specific tags
+TAG_GROUPS = ("default", "calculated", "camera_model", "camera_specific",
+              "misc")
+# exiftool tag with the rotation of the video
+ROTATION_TAG = "Rotation"
+
+_TAG_PLAN = None
+
+
+class TagPlan(object):
+    """ Compiled plan of the exiftool tags, built once from the tags config
+        and shared by all the videos (and the threads) of the worker. Every
+        value is a tuple or a read only mapping, the config itself is never
+        changed
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, tags_config):
+        """ Initialization function for the class
+
+        Args:
+            tags_config (`dict`): "tags" entry of the config
+        """
+        default_tags = dict(tags_config.get("default"))
+        # Display name of every tag, for the videos without extension
+        # specific tags and for every extension that has them
+        tag_maps = dict()
+        for _group, _tags in tags_config.items():
+            if _group in TAG_GROUPS:
+                continue
+            tag_maps[_group.lower()] = types.MappingProxyType(
+                dict(default_tags, **_tags))
+        self._default_map = types.MappingProxyType(default_tags)
+        self._tag_maps = types.MappingProxyType(tag_maps)
+
+        self.camera_model_tags = tuple(tags_config.get("camera_model"))
+        # (camera name, pattern) matched against the camera model values,
+        # the last camera that matches wins
+        self.camera_patterns = tuple(
+            (_camera, re.compile(_camera, re.I))
+            for _camera in tags_config.get("camera_specific").keys())
+        self.colorspace_tags = types.MappingProxyType(
+            dict(tags_config.get("camera_specific")))
+        self.misc_tags = frozenset(tags_config.get("misc").keys())
+        # (property name, names of the properties it is calculated from)
+        self.calculated = tuple(
+            (_key, tuple(_values))
+            for _key, _values in tags_config.get("calculated").items())
+
+        # exiftool arguments of every tag map
+        extra_tags = list(self.camera_model_tags)
+        extra_tags.extend(self.colorspace_tags.values())
+        extra_tags.extend(tags_config.get("misc").keys())
+        self._default_args = self._get_tag_args(self._default_map,
+                                                extra_tags)
+        self._tag_args = types.MappingProxyType(dict(
+            (_ext, self._get_tag_args(_map, extra_tags))
+            for _ext, _map in self._tag_maps.items()))
+
+        # Every property a video can have, in the order of the config
+        property_names = list(default_tags.values())
+        for _map in self._tag_maps.values():
+            property_names.extend(_name for _name in _map.values()
+                                  if _name not in property_names)
+        property_names.extend(_key for _key, _ in self.calculated)
+        property_names.append("Colorspace")
+        self.property_names = tuple(property_names)
+
+    @staticmethod
+    def _get_tag_args(tag_map, extra_tags):
+        """ exiftool arguments reading the tags
+
+        Args:
+            tag_map (`Mapping`): Display name of every tag
+            extra_tags (`list`): Camera, colorspace and misc tags
+
+        Returns:
+            `tuple`: Tag arguments
+        """
+        return tuple("-" + _tag for _tag in list(tag_map.keys()) + extra_tags)
+
+    def get_tag_map(self, extension):
+        """ Display name of every tag that is read for the extension
+
+        Args:
+            extension (`str`): File extension of the video
+
+        Returns:
+            `Mapping`: Tag to display name, read only
+        """
+        return self._tag_maps.get(extension.lower(), self._default_map)
+
+    def get_tag_args(self, extension):
+        """ exiftool arguments reading the tags for the extension, videos
+            with the same arguments can be read in one exiftool call
+
+        Args:
+            extension (`str`): File extension of the video
+
+        Returns:
+            `tuple`: Tag arguments
+        """
+        return self._tag_args.get(extension.lower(), self._default_args)
+
+    def get_camera_type(self, video_tags):
+        """ Camera of the video, from the camera model tags
+
+        Args:
+            video_tags (`dict`): exiftool tags of the video
+
+        Returns:
+            `str`: Camera name of the camera_specific config, None if it
+                   is not one of them
+        """
+        camera_model_values = list()
+        for _tag in self.camera_model_tags:
+            tag_value = (video_tags.get(_tag) or {}).get("val", "-")
+            if tag_value != "-":
+                camera_model_values.append(str(tag_value))
+
+        camera_type = None
+        for _camera, _pattern in self.camera_patterns:
+            if any(_pattern.match(_model) for _model in camera_model_values):
+                camera_type = _camera
+        return camera_type
+
+
+def get_tag_plan():
+    """ Get the tag plan, it is compiled from the config the first time
+
+    Returns:
+        `TagPlan`: Tag plan object
+    """
+    global _TAG_PLAN
+
+    if _TAG_PLAN is None:
+        _TAG_PLAN = TagPlan(get_config().get("tags"))
+
+    return _TAG_PLAN
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# std imports
+import os
+import shutil
+
+
+class Thumbnail(object):
+    """ Combined thumbnail of a video, with its size and content hash so
+        the image does not have to be opened again to get them
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, width, height, content_hash, path=None, image=None,
+                 temporary=True):
+        """ Initialization function for the class
+
+        Args:
+            width (`int`): Width of the thumbnail
+            height (`int`): Height of the thumbnail
+            content_hash (`str`): Hash of the thumbnail content
+            path (`str`): Path of the thumbnail file, if it is written
+            image (`PIL.Image`): Thumbnail image, if it is in memory
+            temporary (`bool`): The folder of the thumbnail file is
+                                removed once the thumbnail is drawn
+        """
+        self.width = width
+        self.height = height
+        self.content_hash = content_hash
+        self.path = path
+        self.image = image
+        self.temporary = temporary
+
+    @property
+    def source(self):
+        """ Thumbnail file path or the image in memory
+
+        Returns:
+            `str` or `PIL.Image`: Thumbnail source
+        """
+        return self.path or self.image
+
+    def cleanup(self):
+        """ Remove the temporary folder of the thumbnail file, once it is
+            in the report
+        """
+        # Thumbnails exported in memory do not have any files, the journal
+        # ones are kept until the run is done
+        if not self.path or not self.temporary:
+            return
+        shutil.rmtree(os.path.dirname(self.path))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import time
+import threading
+import contextlib
+
+# Stages we trace, every span has one of these names
+VIDEO = "video"
+HASH = "hash"
+EXIFTOOL = "exiftool"
+FFMPEG = "ffmpeg"
+COMPOSITE = "composite"
+PDF = "pdf"
+# Prefix of all the metric names
+METRICS_PREFIX = "videobreakdown"
+
+# Every thread (and so every worker) collects its own spans
+_LOCAL = threading.local()
+
+
+@contextlib.contextmanager
+def collect_spans(enabled=True):
+    """ Collect the spans of the current thread, the collector that was
+        active before is restored at the end
+
+    Args:
+        enabled (`bool`): Collect the spans, nothing is collected if False
+
+    Yields:
+        `list`: Spans collected (None if not enabled)
+    """
+    if not enabled:
+        yield None
+        return
+    previous = getattr(_LOCAL, "spans", None)
+    previous_video = getattr(_LOCAL, "video", None)
+    _LOCAL.spans = spans = list()
+    _LOCAL.video = None
+    try:
+        yield spans
+    finally:
+        _LOCAL.spans = previous
+        _LOCAL.video = previous_video
+
+
+@contextlib.contextmanager
+def span(name, video=None, **args):
+    """ Trace the stage, the span is only recorded if the spans are being
+        collected (see collect_spans), otherwise it costs nothing
+
+    Args:
+        name (`str`): Stage name
+        video (`str`): Video path, by default the video of the enclosing
+                       span
+
+    Yields:
+        `dict`: Arguments of the span, values (bytes read, process times
+                etc) can be added to it
+    """
+    spans = getattr(_LOCAL, "spans", None)
+    if spans is None:
+        yield args
+        return
+    previous_video = _LOCAL.video
+    _LOCAL.video = video or previous_video
+    start = time.time()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield args
+    finally:
+        # CPU of the thread, the external tools have their own values
+        args["cpu"] = time.thread_time() - cpu_start
+        spans.append(dict(name=name, video=_LOCAL.video, start=start,
+                          duration=time.perf_counter() - wall_start,
+                          pid=os.getpid(), tid=threading.get_ident(),
+                          args=args))
+        _LOCAL.video = previous_video
+
+
+def add_process_times(span_args, results):
+    """ Add the wall and CPU times of the finished processes to the span
+
+    Args:
+        span_args (`dict`): Arguments of the span
+        results (`list`): ProcessResult of every process
+    """
+    span_args["processes"] = span_args.get("processes", 0) + len(results)
+    span_args["process_wall"] = span_args.get("process_wall", 0.0) + \
+        sum(_result.wall or 0.0 for _result in results)
+    span_args["process_cpu"] = span_args.get("process_cpu", 0.0) + \
+        sum(_result.cpu or 0.0 for _result in results)
+
+
+class TraceRecorder(object):
+    """ Records the spans of a run, the ones of this thread and the ones
+        that come back from the workers, and exports them as a Chrome
+        trace and as Prometheus metrics
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self):
+        """ Initialization function for the class
+        """
+        self.spans = list()
+        self._collector = None
+
+    def start(self):
+        """ Start collecting the spans of the current thread
+        """
+        self._collector = collect_spans()
+        self.spans = self._collector.__enter__()
+
+    def stop(self):
+        """ Stop collecting the spans of the current thread
+        """
+        if self._collector is not None:
+            self._collector.__exit__(None, None, None)
+            self._collector = None
+
+    def add_spans(self, spans):
+        """ Add the spans that were collected somewhere else
+
+        Args:
+            spans (`list`): Spans (see span)
+        """
+        self.spans.extend(spans or [])
+
+    def write_chrome_trace(self, output_path):
+        """ Write the spans as a Chrome trace (chrome://tracing, Perfetto)
+
+        Args:
+            output_path (`str`): JSON file path
+        """
+        events = list()
+        for _span in self.spans:
+            args = dict(_span["args"])
+            if _span["video"]:
+                args["video"] = _span["video"]
+            events.append(dict(name=_span["name"], cat=_span["name"], ph="X",
+                               ts=_span["start"] * 1000000,
+                               dur=_span["duration"] * 1000000,
+                               pid=_span["pid"], tid=_span["tid"],
+                               args=args))
+        with open(output_path, "w") as file_open:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms"),
+                      file_open)
+
+    def get_metrics(self):
+        """ Sum up the spans for every stage
+
+        Returns:
+            `dict`: Metric name: {labels tuple: value}
+        """
+        metrics = dict()
+
+        def _add(metric, labels, value, maximum=False):
+            values = metrics.setdefault(metric, dict())
+            if maximum:
+                values[labels] = max(values.get(labels, 0), value)
+            else:
+                values[labels] = values.get(labels, 0) + value
+
+        for _span in self.spans:
+            labels = (("stage", _span["name"]),)
+            args = _span["args"]
+            _add("stage_calls_total", labels, 1)
+            _add("stage_seconds_total", labels, _span["duration"])
+            _add("stage_max_seconds", labels, _span["duration"], True)
+            _add("stage_cpu_seconds_total", labels, args.get("cpu", 0))
+            if "bytes" in args:
+                _add("bytes_read_total", labels, args["bytes"])
+            if "processes" in args:
+                _add("subprocess_calls_total", labels, args["processes"])
+                _add("subprocess_seconds_total", labels,
+                     args["process_wall"])
+                _add("subprocess_cpu_seconds_total", labels,
+                     args["process_cpu"])
+            if "queue_wait" in args:
+                _add("queue_wait_seconds_total", (), args["queue_wait"])
+            if "status" in args:
+                _add("videos_total", (("status", args["status"]),), 1)
+        return metrics
+
+    def write_metrics(self, output_path):
+        """ Write the metrics in the Prometheus text format
+
+        Args:
+            output_path (`str`): Text file path
+        """
+        metric_types = dict(stage_max_seconds="gauge")
+        lines = list()
+        for metric, values in sorted(self.get_metrics().items()):
+            metric_name = "{0}_{1}".format(METRICS_PREFIX, metric)
+            lines.append("# TYPE {0} {1}".format(
+                metric_name, metric_types.get(metric, "counter")))
+            for labels, value in sorted(values.items()):
+                label_string = ",".join('{0}="{1}"'.format(*_label)
+                                        for _label in labels)
+                if label_string:
+                    label_string = "{" + label_string + "}"
+                lines.append("{0}{1} {2}".format(metric_name, label_string,
+                                                 value))
+        with open(output_path, "w") as file_open:
+            file_open.write("\n".join(lines) + "\n")
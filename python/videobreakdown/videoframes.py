@@ -1,16 +1,23 @@
 #!/usr/bin/env python
 # std imports
-from json import tool
 import os
 import re
 import time
+import io
+import shlex
 import tempfile
-from subprocess import Popen, PIPE
 import numpy as np
-from PIL import Image, ImageOps
+import xxhash
+from PIL import Image
 
 # internal
-from .base import get_config, EXPORT_FRAMES, FRAMES_SEL, OS
+from .base import (get_config, format_args, EXPORT_FRAMES, EXPORT_SEEK_FRAME,
+                   EXPORT_KEYFRAME,
+                   FFMPEG_ARGS, FRAMES_SEL, FILE_OUTPUT, PIPE_OUTPUT, OS)
+from .process import get_runner, DECODE
+from .tracing import span, add_process_times, FFMPEG, COMPOSITE
+from .sampling import get_sample_plan
+from .thumbnail import Thumbnail
 
 
 class VideoFrames(object):
@@ -20,7 +27,7 @@ class VideoFrames(object):
         object (_type_): _description_
     """
     def __init__(self, video_path, video_name, video_framecount,
-                 resolution, video_rotation):
+                 resolution, video_rotation, fps=None):
         """ Initialization function
 
         Args:
@@ -29,14 +36,19 @@ class VideoFrames(object):
             video_framecount (`int`): How many frames video has
             aspect (`str`): Aspect ratio of the video
             resolution (`str`): Resolution value of the video
+            video_rotation (`int`): Rotation value of the video
+            fps (`float`): Frame rate of the video, needed to seek to
+                           the frames
         """
         self.video_path = video_path
         self.name = video_name
         self.video_framecount = video_framecount
         self.resolution = resolution
         self.rotation = video_rotation
+        self.fps = self._get_fps(fps)
 
         self.config = get_config()
+        self.frames_config = self.config.get("frames", {})
         self.framecount = self.config.get("framecount")
         x_res, y_res = self.resolution.split("x")
         x_scale = int(float(x_res)* self.config.get("factor"))
@@ -53,13 +65,10 @@ class VideoFrames(object):
             RuntimeError: Export command failed
 
         Returns:
-            `str`: directory path of the thumbnails exported
+            `Thumbnail`: Combined thumbnail, a file or the image itself
+                         when the frames are exported in memory
         """
-        _frames = self._get_frames_to_export()
-
-        frames_list = [FRAMES_SEL.format(frame=_frame) for _frame in _frames]
-        # Create the frames selection string
-        frames_string = "+".join(frames_list)
+        _plan = self._get_sample_plan()
 
         # Get the ffmpeg command
         tool_cmd = self.config.get("tools").get("ffmpeg").get(OS)
@@ -68,6 +77,20 @@ class VideoFrames(object):
             raise RuntimeError("Invalid path for ffmpeg "
                                "command {0}".format(tool_cmd))
 
+        # Incase there is a rotation, we need to get the transpose value
+        # correct
+        if str(self.rotation) == "270":
+            transpose = "transpose=1,"
+        elif str(self.rotation) == "90":
+            transpose = "transpose=2,"
+        else:
+            transpose = ""
+
+        if self.frames_config.get("output", "files") == "memory":
+            return self._export_frames_memory(tool_cmd=tool_cmd,
+                                              plan=_plan,
+                                              transpose=transpose)
+
         # We will be changing the width to -1 to maintain the aspect ratio
         _, height = self.scale.split("x")
         updt_scale = "-1:{0}".format(height)
@@ -79,61 +102,284 @@ class VideoFrames(object):
         # highly unlikely it exists but
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
-        # output frames path
-        output_frames = os.path.join(output_dir,
-                                     "{name}.%04d.jpeg".format(name=self.name))
-        # Do hardware acceleration
-        _hrdwre_acc = self.config.get("hw_accel", "")
 
-        # Incase there is a rotation, we need to get the transpose value
-        # correct
-        if str(self.rotation) == "270":
-            transpose = "transpose=1,"
-        elif str(self.rotation) == "90":
-            transpose = "transpose=2,"
-        else:
-            transpose = ""
+        # Frame numbers start from 1 in the order of the video
+        def _output_frame(index):
+            return format_args(FILE_OUTPUT, path=os.path.join(
+                output_dir, "{name}.{index:04d}.jpeg".format(
+                    name=self.name, index=index + 1)))
 
-        # Build the export command
-        export_cmd = EXPORT_FRAMES.format(ffmpeg_cmd=tool_cmd,
-                                          input=self.video_path,
-                                          scale=updt_scale,
-                                          frameselect=frames_string,
-                                          output=output_frames,
-                                          hw_accel=_hrdwre_acc,
-                                          transpose=transpose)
-
-        # Execute the command
-        export_cmd_exec = Popen(export_cmd, stdout=PIPE,
-                                stderr=PIPE, shell=True)
-
-        _, std_err = export_cmd_exec.communicate()
-        if not str(std_err, encoding="utf-8") == "":
-            if not (re.search("hwaccel initialisation returned error"), std_err):
-                raise RuntimeError(std_err)
-            # We try without any hardware acceleration!
-            export_cmd = EXPORT_FRAMES.format(ffmpeg_cmd=tool_cmd,
-                                          input=self.video_path,
-                                          scale=updt_scale,
-                                          frameselect=frames_string,
-                                          output=output_frames,
-                                          hw_accel="",
-                                          transpose=transpose)
-            export_cmd_exec = Popen(export_cmd, stdout=PIPE,
-                                    std_err=PIPE, shell=True)
-            _, std_err = export_cmd_exec.communicate()
-            if not str(std_err, encoding="utf-8") == "":
-                raise RuntimeError(std_err)
+        if self._use_seek():
+            self._export_seek_frames(tool_cmd=tool_cmd,
+                                     timestamps=_plan.timestamps,
+                                     scale=updt_scale, transpose=transpose,
+                                     output=_output_frame)
+        else:
+            output_frames = format_args(FILE_OUTPUT, path=os.path.join(
+                output_dir, "{name}.%04d.jpeg".format(name=self.name)))
+            self._export_select_frames(tool_cmd=tool_cmd, frames=_plan.frames,
+                                       scale=updt_scale, transpose=transpose,
+                                       output=output_frames)
 
         # Combination image return
         output_image_comb = os.path.join(
             output_dir, "{name}.combine.jpeg".format(name=self.name))
 
-        self._combine_images(output=output_dir,
-                             output_name=output_image_comb)
+        return self._combine_images(output=output_dir,
+                                    output_name=output_image_comb)
+
+    def _export_frames_memory(self, tool_cmd, plan, transpose):
+        """ Export the frames as raw RGB on the ffmpeg stdout, straight
+            into the combined thumbnail array. No files are written.
+
+        Args:
+            tool_cmd (`str`): ffmpeg executable path
+            plan (`SamplePlan`): Positions of the frames to export
+            transpose (`str`): Transpose filter value for the rotation
+
+        Raises:
+            RuntimeError: No frames could be exported
+
+        Returns:
+            `Thumbnail`: Combined thumbnail in memory
+        """
+        # The raw frames need the exact size, so we can not let ffmpeg
+        # work out the width
+        width, height = self._get_thumbnail_size()
+        scale = "{0}:{1}".format(width, height)
+        # Every frame gets a slot in the combined thumbnail
+        sheet = np.zeros((height, width * len(plan), 3), dtype=np.uint8)
+        filled = [False] * len(plan)
+
+        if self._use_seek():
+            outputs = self._export_seek_frames(
+                tool_cmd=tool_cmd, timestamps=plan.timestamps, scale=scale,
+                transpose=transpose, output=lambda _index: PIPE_OUTPUT)
+        else:
+            outputs = [self._export_select_frames(
+                tool_cmd=tool_cmd, frames=plan.frames, scale=scale,
+                transpose=transpose, output=PIPE_OUTPUT)]
+
+        with span(COMPOSITE) as _span:
+            if self._use_seek():
+                for _index, _output in enumerate(outputs):
+                    filled[_index] = bool(self._read_frames(
+                        io.BytesIO(_output), sheet, width, _index, 1))
+            else:
+                count = self._read_frames(io.BytesIO(outputs[0]), sheet,
+                                          width, 0, len(plan))
+                filled = [_index < count for _index in range(len(plan))]
+            _span["bytes"] = sum(len(_output) for _output in outputs)
+
+            if not any(filled):
+                raise RuntimeError("No frames exported for {0}".format(
+                    self.video_path))
+            # Only happens if a position could not be decoded (end of file)
+            if not all(filled):
+                sheet = np.hstack([sheet[:, _index * width:
+                                         (_index + 1) * width]
+                                   for _index, _filled in enumerate(filled)
+                                   if _filled])
+            return Thumbnail(width=sheet.shape[1], height=sheet.shape[0],
+                             content_hash=xxhash.xxh64(sheet).hexdigest(),
+                             image=Image.fromarray(sheet))
+
+    def _read_frames(self, stream, sheet, width, slot, count):
+        """ Read the raw RGB frames from the stream into the slots of the
+            combined thumbnail
+
+        Args:
+            stream (`file`): ffmpeg stdout output
+            sheet (`numpy.ndarray`): Combined thumbnail array
+            width (`int`): Width of a single frame
+            slot (`int`): First slot to fill
+            count (`int`): Maximum number of frames to read
+
+        Returns:
+            `int`: Number of frames read
+        """
+        frame = np.empty((sheet.shape[0], width, 3), dtype=np.uint8)
+        frame_view = memoryview(frame).cast("B")
+        frames_read = 0
+        while frames_read < count:
+            read_size = 0
+            while read_size < frame.nbytes:
+                chunk_size = stream.readinto(frame_view[read_size:])
+                if not chunk_size:
+                    break
+                read_size += chunk_size
+            if read_size < frame.nbytes:
+                break
+            _start = (slot + frames_read) * width
+            # To manage the PDF oddity we are flipping the frames, it is
+            # done while copying them into the combined thumbnail
+            sheet[:, _start:_start + width] = frame[::-1]
+            frames_read += 1
+        return frames_read
+
+    def _get_thumbnail_size(self):
+        """ Get the size of a single thumbnail frame, after the rotation
+            is applied
+
+        Returns:
+            `int`, `int`: width and height of the thumbnail
+        """
+        x_res, y_res = [float(_res) for _res in self.resolution.split("x")]
+        if str(self.rotation) in ("90", "270"):
+            x_res, y_res = y_res, x_res
+        _, height = self.scale.split("x")
+        height = int(height)
+        width = max(int(round(height * x_res / y_res)), 1)
+        return width, height
+
+    def _use_seek(self):
+        """ Should we seek to the frames or go through the video
+
+        Returns:
+            `bool`: True if the seek extraction can be used
+        """
+        # Seeking needs the frame rate to get the timestamps, without it
+        # we have to go through the frames
+        extraction = self.frames_config.get("extraction", "select")
+        return extraction in ("seek", "keyframe") and bool(self.fps)
+
+    def _use_keyframes(self):
+        """ Should we export the keyframes nearest to the frames instead
+            of the exact frames (only with seeking)
+
+        Returns:
+            `bool`: True if the keyframe extraction is used
+        """
+        extraction = self.frames_config.get("extraction", "select")
+        return extraction == "keyframe" and self._use_seek()
+
+    def _export_select_frames(self, tool_cmd, frames, scale, transpose,
+                              output):
+        """ Export the frames with a single ffmpeg command that goes
+            through the video and selects the frame numbers
+
+        Args:
+            tool_cmd (`str`): ffmpeg executable path
+            frames (`list`): Frame numbers to export
+            scale (`str`): Scale filter value
+            transpose (`str`): Transpose filter value for the rotation
+            output (`list`): ffmpeg output arguments
+
+        Returns:
+            `bytes`: Standard output of ffmpeg
+        """
+        frames_list = [FRAMES_SEL.format(frame=_frame) for _frame in frames]
+        # Create the frames selection string
+        frames_string = "+".join(frames_list)
+
+        # Build the export command
+        def _build_command(hw_accel):
+            return [tool_cmd] + FFMPEG_ARGS + hw_accel + \
+                format_args(EXPORT_FRAMES, input=self.video_path,
+                            scale=scale, frameselect=frames_string,
+                            transpose=transpose) + output
+
+        return self._run_exports([_build_command])[0]
+
+    def _export_seek_frames(self, tool_cmd, timestamps, scale, transpose,
+                            output):
+        """ Export the frames by seeking to the timestamp of every frame
+            and decoding only that frame, the positions are exported
+            at the same time (within the decode limit). In the keyframe
+            mode the keyframe at or before the timestamp is exported, so
+            only intra frames are decoded
+
+        Args:
+            tool_cmd (`str`): ffmpeg executable path
+            timestamps (`list`): Timestamps of the frames to export
+            scale (`str`): Scale filter value
+            transpose (`str`): Transpose filter value for the rotation
+            output (`function`): Gives the ffmpeg output arguments for the
+                                 frame index
+
+        Returns:
+            `list`: Standard output of ffmpeg for every frame
+        """
+        export_args = EXPORT_SEEK_FRAME
+        if self._use_keyframes():
+            export_args = EXPORT_KEYFRAME
+
+        def _command_builder(index, seconds):
+            timestamp = "{0:.6f}".format(seconds)
+
+            def _build_command(hw_accel):
+                return [tool_cmd] + FFMPEG_ARGS + hw_accel + \
+                    format_args(export_args, input=self.video_path,
+                                timestamp=timestamp, scale=scale,
+                                transpose=transpose) + output(index)
+            return _build_command
 
-        # return the output directory path
-        return output_image_comb
+        return self._run_exports([_command_builder(index, seconds)
+                                  for index, seconds in enumerate(timestamps)])
+
+    def _run_exports(self, build_commands):
+        """ Run the ffmpeg export commands at the same time, if the
+            hardware acceleration fails to initialise we try again
+            without it
+
+        Args:
+            build_commands (`list`): Functions building the command for
+                                     the given hardware acceleration
+                                     arguments
+
+        Raises:
+            RuntimeError: Export command failed
+
+        Returns:
+            `list`: Standard output of every command
+        """
+        # Do hardware acceleration
+        _hrdwre_acc = shlex.split(self.config.get("hw_accel") or "")
+
+        runner = get_runner()
+        with span(FFMPEG) as _span:
+            # Execute the commands
+            results = runner.run_many([_build(_hrdwre_acc)
+                                       for _build in build_commands],
+                                      kind=DECODE)
+            add_process_times(_span, results)
+            retry = list()
+            for _index, _result in enumerate(results):
+                if not _result.stderr == "":
+                    if not _hrdwre_acc or \
+                        not re.search("hwaccel initialisation returned error",
+                                      _result.stderr):
+                        raise RuntimeError(_result.stderr)
+                    retry.append(_index)
+
+            # We try without any hardware acceleration!
+            retry_results = runner.run_many([build_commands[_index]([])
+                                             for _index in retry],
+                                            kind=DECODE)
+            add_process_times(_span, retry_results)
+            for _index, _result in zip(retry, retry_results):
+                if not _result.stderr == "":
+                    raise RuntimeError(_result.stderr)
+                results[_index] = _result
+
+        return [_result.stdout for _result in results]
+
+    def _get_fps(self, fps):
+        """ Get the frame rate value of the video
+
+        Args:
+            fps (`str`): Frame rate value from the video details
+
+        Returns:
+            `float`: Frame rate or None if it is not a valid value
+        """
+        try:
+            fps = float(fps)
+        except (TypeError, ValueError):
+            return None
+        if fps <= 0:
+            return None
+        return fps
 
     def _combine_images(self, output, output_name):
         """ Combine the images into a single thumbnail
@@ -141,33 +387,60 @@ class VideoFrames(object):
         Args:
             output (`str`): Thumbnail output directory
             output_name (`str`): Thumbnail output name
+
+        Returns:
+            `Thumbnail`: Combined thumbnail file
         """
-        thumbnail_dirs = os.listdir(output)
-        thumbnail_dirs = [os.path.join(output, thmb) for thmb in thumbnail_dirs]
-        images = [ Image.open(img) for img in thumbnail_dirs ]
-        min_shape = sorted([(np.sum(img.size), img.size) \
-            for img in images])[0][1]
-        _comb_img = list(np.asarray(img.resize(min_shape)) for img in images)
-        images_combination = np.hstack(_comb_img)
-
-        image_combine = Image.fromarray(images_combination)
-        # To manage the PDF oddity we are flipping the exported thumbnail
-        image_combine = ImageOps.flip(image_combine)
-        image_combine.save(output_name)
-
-    def _get_frames_to_export(self):
-        """ We will calculate the frames that needs to be exported
+        with span(COMPOSITE) as _span:
+            # Frame numbers are in the names, so the sorting keeps the
+            # video order
+            thumbnail_dirs = sorted(os.listdir(output))
+            thumbnail_dirs = [os.path.join(output, thmb) for thmb in thumbnail_dirs]
+            # Only the headers are read here, the pixels are decoded later
+            images = [ Image.open(img) for img in thumbnail_dirs ]
+            _span["bytes"] = sum(os.path.getsize(img)
+                                 for img in thumbnail_dirs)
+            min_shape = sorted([(np.sum(img.size), img.size) \
+                for img in images])[0][1]
+            width, height = min_shape
+
+            # All the frames are written straight into the combined image
+            images_combination = np.empty((height, width * len(images), 3),
+                                          dtype=np.uint8)
+            try:
+                for _index, _image in enumerate(images):
+                    # The jpeg is decoded at the nearest scale above the
+                    # size we need, so big frames are never decoded in full
+                    _image.draft("RGB", min_shape)
+                    img = _image
+                    if img.mode != "RGB":
+                        img = img.convert("RGB")
+                    if img.size != min_shape:
+                        img = img.resize(min_shape)
+                    # To manage the PDF oddity we are flipping the frames,
+                    # the flip is a view so it happens while copying
+                    images_combination[:, _index * width:(_index + 1) * width] = \
+                        np.asarray(img)[::-1]
+                    # The converted copies are in memory, the file is held
+                    # by the opened image
+                    _image.close()
+            finally:
+                for _image in images:
+                    _image.close()
+
+            image_combine = Image.fromarray(images_combination)
+            image_combine.save(output_name)
+            with open(output_name, "rb") as file_open:
+                content_hash = xxhash.xxh64(file_open.read()).hexdigest()
+            return Thumbnail(width=image_combine.width,
+                             height=image_combine.height,
+                             content_hash=content_hash, path=output_name)
+
+    def _get_sample_plan(self):
+        """ Plan the positions of the frames to export, with the sampling
+            strategy from the config
 
         Returns:
-            `list`: Frame list that needs to be exported
+            `SamplePlan`: Frame numbers and timestamps to export
         """
-        frames = []
-        if self.video_framecount < self.framecount:
-            return range(0, self.video_framecount+1)
-        frames_interval = int(self.video_framecount / (self.framecount - 1))
-        for count in range(0, self.video_framecount+1):
-            if int(count % frames_interval) == 0:
-                frames.append(count)
-        # Accounting for the floating point round off
-        frames[-1] = frames[-1]-1
-        return frames
+        return get_sample_plan(self.video_framecount, fps=self.fps)
@@ -1,16 +1,17 @@
 #!/usr/bin/env python
 # std imports
 import os
-import re
-from subprocess import Popen, PIPE, call
-from numpy import full
-import xxhash
-import tempfile
 import json
+import time
 from datetime import datetime
 
 # internal import
-from .base import get_config, GETTAGS_COMMAND, OS
+from .base import get_config, GETTAGS_ARGS, OS
+from .process import get_runner, METADATA
+from .exiftool import get_session
+from .hashengine import get_hash_engine
+from .tagplan import get_tag_plan, ROTATION_TAG
+from .tracing import span, add_process_times, EXIFTOOL, HASH
 
 class VideoInfo(object):
     """ Video Info class object
@@ -18,14 +19,23 @@ class VideoInfo(object):
     Args:
         object (_type_): _description_
     """
-    def __init__(self, video_path):
+    def __init__(self, video_path, exif_data=None, cache=None):
         """ Initialization function for the class
 
         Args:
             video_path (`str`): Video path value
+            exif_data (`dict`): exiftool tags of the video if they were
+                                already read (see prefetch_tags)
+            cache (`MetadataCache`): Cache to read and store the video
+                                     properties, None to disable it
         """
         self.video_path = video_path
-        self._hash_block = 65536
+        self.exif_data = exif_data
+        self.cache = cache
+        self._cache_key = None
+        self._cache_entry = None
+        self.hash_engine = get_hash_engine()
+        self.tag_plan = get_tag_plan()
         self.configs = get_config()
         self._videorotation = 0
 
@@ -82,6 +92,15 @@ class VideoInfo(object):
         """
         return self._process_video_props()
 
+    @property
+    def cached(self):
+        """ Are the video properties available in the cache
+
+        Returns:
+            `bool`: True if the properties can be read from the cache
+        """
+        return self._get_cache_entry() is not None
+
     @property
     def videorotation(self):
         """ Video rotation property
@@ -139,131 +158,206 @@ class VideoInfo(object):
 
         return total_frames
 
+    def _get_cache_entry(self):
+        """ Look up the video in the cache, the lookup is done only once
+
+        Returns:
+            `dict`: Cache entry or None if it is not cached
+        """
+        if self.cache is None:
+            return None
+        if self._cache_key is None:
+            self._cache_key = self.cache.key(self.video_path)
+            self._cache_entry = self.cache.get(self._cache_key)
+        return self._cache_entry
+
     def _process_video_props(self):
-        """ Process video properties
+        """ Process video properties, the cached properties are used if
+            the video has not changed since it was cached
+
+        Returns:
+            `dict`: Dictionary values including the properties of the video
+        """
+        cache_entry = self._get_cache_entry()
+        if cache_entry is not None:
+            self.videorotation = cache_entry.get("rotation")
+            return cache_entry.get("props")
+
+        property_data = self._read_video_props()
+        if self.cache is not None:
+            self.cache.set(self._cache_key,
+                           property_data.get(self.hash_engine.label),
+                           property_data, self.videorotation)
+        return property_data
+
+    def _read_video_props(self):
+        """ Read the video properties from the video file
 
         Raises:
-            RuntimeError: _description_
-            RuntimeError: _description_
+            RuntimeError: Invalid exiftool path
+            RuntimeError: exiftool failed to read the video
 
         Returns:
             `dict`: Dictionary values including the properties of the video
         """
         property_data = dict()
 
-        # We would also like to add xxhash-64 as one of the items in the
-        # dictionary
-        property_data["xxhash-64"] = self.hash
+        # We would also like to add the hash as one of the items in the
+        # dictionary, the key tells which hash mode produced it
+        property_data[self.hash_engine.label] = self.hash
 
         tools_config = self.configs.get("tools")
         tool_path = tools_config.get("exiftool").get(OS)
         if not tool_path or not os.path.exists(tool_path):
             raise RuntimeError("Invalid EXIFTOOL path {0}".format(tool_path))
 
-        full_tags_dict = self.configs.get("tags")
-        tags_dict = full_tags_dict.get("default")
-        calculated_dict = full_tags_dict.get("calculated")
-        misc_dict = full_tags_dict.get("misc")
-
-        # Get the camera type
-        camera_list = full_tags_dict.get("camera_model")
-
-        # color tags values
-        color_tags_dict = full_tags_dict.get("camera_specific")
-        color_tags = []
-        for _key, _value in color_tags_dict.items():
-            color_tags.append(_value)
-
-        _ext = self.fileext
-        # Let's add any specific tags as per the formats
-        if _ext.lower() in full_tags_dict.keys():
-            tags_dict.update(full_tags_dict.get(_ext.lower()))
-
-        tags_string = " -".join(tags_dict.keys())
-        tags_string = tags_string + " -" + " -".join(camera_list)
-        tags_string = tags_string + " -" + " -".join(color_tags)
-        tags_string = tags_string + " -" + " -".join(misc_dict.keys())
-
-        output_file = tempfile.NamedTemporaryFile(delete=False)
-        output_file.close()
-        command = GETTAGS_COMMAND.format(toolpath=tool_path,
-                                         tags=tags_string,
-                                         video=self.video_path,
-                                         output=output_file.name)
-
-        command_exec = Popen(command, shell=True, stderr=PIPE, stdout=PIPE)
+        tag_plan = self.tag_plan
+        tags_dict = tag_plan.get_tag_map(self.fileext)
 
-        _, std_err = command_exec.communicate()
-
-        if command_exec.returncode != 0:
-            raise RuntimeError(std_err)
-
-        with open(output_file.name, 'rb') as file_open:
-            temp_property_data = json.load(file_open)
-
-        # We have to remove the created temp file once we have read
-        # it and created the json dict
-        os.remove(output_file.name)
+        video_tags = self.exif_data
+        if video_tags is None:
+            video_tags = self._read_tags(tool_path, self._get_tag_args())
 
         # We look at the ways we can get the camera model makes from
         # the metadata tags for MAKE or MAJOR MANIFACTURER
-        camera_type = None
-        camera_model_values = []
-        for _tag in camera_list:
-            tag_value = temp_property_data[0].get(_tag)
-            if tag_value.get('val') != "-":
-                camera_model_values.append(tag_value.get('val'))
-
-        # Get the metadata tags for getting the color values
-        for _camera_name in color_tags_dict.keys():
-            for _model in camera_model_values:
-                if re.match(_camera_name, _model, re.I):
-                    camera_type = _camera_name
-                    break
-
-        # We are passing only one path per class object so yeah we don't
-        # have to check for any other indexes
-        for _key, _value in temp_property_data[0].items():
+        camera_type = tag_plan.get_camera_type(video_tags)
+
+        for _key, _value in video_tags.items():
             # We use the more readable keys and ignore not required
             # values (like sourcename)
-            if _key not in tags_dict.keys() \
-                and _key not in misc_dict.keys():
-                continue
-
-            if _key in misc_dict.keys():
-                if _key == "Rotation":
+            if _key in tag_plan.misc_tags:
+                if _key == ROTATION_TAG:
                     self.videorotation = _value.get('val')
-            else:
-                keyvalue = _value.get('val')
-                keyname = tags_dict.get(_key)
-                property_data[keyname] = keyvalue
+                continue
+            keyname = tags_dict.get(_key)
+            if keyname is not None:
+                property_data[keyname] = _value.get('val')
 
         # We need to get the calculated values
-        for key, values in calculated_dict.items():
+        for key, values in tag_plan.calculated:
             # NOTE: This will have to be updated to get the correct
             # logic for any new calculated value!
             if key == "Frames":
                 property_data[key] = self._get_frames(
                     *[property_data.get(_val) for _val in values])
 
-        colorspace_tag = color_tags_dict.get(camera_type)
-        colorspace_val = temp_property_data[0].get(colorspace_tag, " - ")
+        colorspace_tag = tag_plan.colorspace_tags.get(camera_type)
+        colorspace_val = video_tags.get(colorspace_tag, " - ")
         if colorspace_val != " - ":
             colorspace_val = colorspace_val.get('val')
         property_data["Colorspace"] = colorspace_val
 
         return property_data
 
+    def _get_tag_args(self):
+        """ Get the exiftool arguments of all the tags we need, the
+            extension specific tags are in them (see TagPlan)
+
+        Returns:
+            `tuple`: Tag arguments
+        """
+        return self.tag_plan.get_tag_args(self.fileext)
+
+    def _read_tags(self, tool_path, tag_args):
+        """ Read the tags of the video with exiftool, using the backend
+            set in the config
+
+        Args:
+            tool_path (`str`): exiftool executable path
+            tag_args (`tuple`): Tag arguments
+
+        Raises:
+            RuntimeError: exiftool failed to read the video
+
+        Returns:
+            `dict`: exiftool tags of the video
+        """
+        backend = self.configs.get("metadata", {}).get("backend", "command")
+        if backend == "session":
+            tags_data, std_err = _read_session_tags(
+                get_session(tool_path), [self.video_path], list(tag_args))
+            if self.video_path not in tags_data:
+                raise RuntimeError(std_err)
+            return tags_data[self.video_path]
+
+        command = [tool_path] + GETTAGS_ARGS + list(tag_args) + \
+                  [self.video_path]
+        with span(EXIFTOOL) as _span:
+            command_exec = get_runner().run(command, kind=METADATA)
+            add_process_times(_span, [command_exec])
+
+        if command_exec.returncode != 0:
+            raise RuntimeError(command_exec.stderr)
+
+        # The JSON comes straight from stdout, we are passing only one
+        # path per command so yeah we don't have to check for any other
+        # indexes
+        return json.loads(command_exec.stdout)[0]
+
     def _gen_hash(self):
         """ Get the hash value of the vidoe
 
         Returns:
             `str`: Generate the has of the video
         """
-        hasher = xxhash.xxh64()
-        with open(self.video_path, "rb") as file_open:
-            buffer = file_open.read(self._hash_block)
-            while len(buffer) > 0:
-                hasher.update(buffer)
-                buffer = file_open.read(self._hash_block)
-        return hasher.hexdigest()
+        with span(HASH) as _span:
+            hex_hash_digest = self.hash_engine.hash_file(self.video_path)
+            _span["bytes"] = self.hash_engine.bytes_read
+        return hex_hash_digest
+
+
+def _read_session_tags(session, video_paths, tag_args):
+    """ Read the tags of the videos with the exiftool session, the time
+        exiftool spent on it is traced
+
+    Args:
+        session (`ExifToolSession`): exiftool session
+        video_paths (`list`): Video paths
+        tag_args (`list`): Tag arguments
+
+    Returns:
+        `dict`, `str`: Tags of every video and the error output
+                       (see ExifToolSession.get_tags)
+    """
+    with span(EXIFTOOL, videos=len(video_paths)) as _span:
+        # The session is started by the first read
+        cpu_start = session.cpu_time or 0.0
+        wall_start = time.perf_counter()
+        tags_data, std_err = session.get_tags(video_paths, tag_args)
+        _span.update(processes=1,
+                     process_wall=time.perf_counter() - wall_start,
+                     process_cpu=(session.cpu_time or cpu_start) - cpu_start)
+    return tags_data, std_err
+
+
+def prefetch_tags(video_infos):
+    """ Read the exiftool tags for a batch of videos with a single
+        exiftool call, only used with the "session" metadata backend.
+        Videos that fail are left alone, they will report their own
+        error when the video properties are processed.
+
+    Args:
+        video_infos (`list`): VideoInfo objects
+    """
+    configs = get_config()
+    if configs.get("metadata", {}).get("backend", "command") != "session":
+        return
+    tool_path = configs.get("tools").get("exiftool").get(OS)
+
+    # Videos can have extension specific tags, so we group them by the
+    # tags we have to read
+    tag_groups = dict()
+    for _video_info in video_infos:
+        # No need to read the videos we already know about
+        if _video_info.cached:
+            continue
+        tag_groups.setdefault(_video_info._get_tag_args(),
+                              list()).append(_video_info)
+
+    session = get_session(tool_path)
+    for tag_args, _video_infos in tag_groups.items():
+        tags_data, _ = _read_session_tags(
+            session, [_video_info.video_path for _video_info in _video_infos],
+            list(tag_args))
+        for _video_info in _video_infos:
+            _video_info.exif_data = tags_data.get(_video_info.video_path)
@@ -0,0 +1,564 @@
+#!/usr/bin/env python
+# std imports
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from concurrent.futures import BrokenExecutor
+
+# internal
+from .report import create_report, get_report_path
+from .pipeline import create_executor, warm_up
+from .snapshot import ScanSnapshot
+from .discovery import scan_videos, walk_videos
+from .base import get_config, validate_input
+
+# How the folders are watched, "auto" uses inotify if it is there
+WATCH_MODES = ("auto", "inotify", "poll")
+# Seconds between the checks of the videos that are settling, this is
+# also how quickly the daemon stops
+CHECK_INTERVAL = 1.0
+
+# inotify event masks (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+    IN_DELETE
+# struct inotify_event, the name follows it
+INOTIFY_EVENT = struct.Struct("iIII")
+READ_SIZE = 65536
+
+
+def _load_libc():
+    """ Load the C library if it has inotify (linux only)
+
+    Returns:
+        `CDLL`: C library, None if inotify is not available
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+class InotifyWatcher(object):
+    """ Watch the folders with inotify, every sub folder has its own
+        watch and the new sub folders are watched as they are created
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, roots, libc):
+        """ Initialization function for the class
+
+        Args:
+            roots (`list`): Folders to watch
+            libc (`CDLL`): C library (see _load_libc)
+
+        Raises:
+            OSError: inotify could not be started
+        """
+        self.roots = roots
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            _errno = ctypes.get_errno()
+            raise OSError(_errno, os.strerror(_errno))
+        # Folder of every watch descriptor
+        self._watches = dict()
+        for root in roots:
+            self._add_tree(root)
+
+    def _add_watch(self, dir_path):
+        """ Watch the folder
+
+        Args:
+            dir_path (`str`): Folder path
+        """
+        watch = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path),
+                                             WATCH_MASK)
+        if watch < 0:
+            _errno = ctypes.get_errno()
+            if _errno == errno.ENOSPC:
+                print ("WARNING: Out of inotify watches, raise "
+                       "fs.inotify.max_user_watches or use the \"poll\" "
+                       "watch mode. {0} is not watched.".format(dir_path))
+            elif _errno != errno.ENOENT:
+                print ("WARNING: Can't watch {0} - {1}".format(
+                    dir_path, os.strerror(_errno)))
+            return
+        self._watches[watch] = dir_path
+
+    def _add_tree(self, root):
+        """ Watch the folder and all its sub folders (hidden ones are left
+            out, like in scan_videos)
+
+        Args:
+            root (`str`): Folder path
+
+        Returns:
+            `list`: Videos that are in the folders already, they could
+                    have landed before the watches were there
+        """
+        for dir_path, dir_names, _ in os.walk(root):
+            dir_names[:] = [_name for _name in dir_names
+                            if not _name.startswith(".")]
+            self._add_watch(dir_path)
+        return list(walk_videos(root))
+
+    def _read_events(self):
+        """ Read all the events that are waiting
+
+        Returns:
+            `bytes`: Raw inotify events
+        """
+        data = b""
+        while True:
+            try:
+                _data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                return data
+            if not _data:
+                return data
+            data += _data
+
+    def poll(self, timeout):
+        """ Wait for the changes in the folders
+
+        Args:
+            timeout (`float`): Seconds to wait for the changes
+
+        Returns:
+            `tuple`: Set of the videos that are new or written to and set
+                     of the videos that are removed
+        """
+        changed = set()
+        removed = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return changed, removed
+        data = self._read_events()
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, name_size = INOTIFY_EVENT.unpack_from(data,
+                                                                  offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_size].rstrip(b"\0")
+            offset += name_size
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & IN_IGNORED:
+                # The folder is gone, so is its watch
+                self._watches.pop(watch, None)
+                continue
+            dir_path = self._watches.get(watch)
+            if dir_path is None or not name or name.startswith(b"."):
+                continue
+            _path = os.path.join(dir_path, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self._add_tree(_path))
+                continue
+            if not validate_input(_path):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                removed.add(_path)
+                changed.discard(_path)
+            else:
+                changed.add(_path)
+                removed.discard(_path)
+        if overflow:
+            # Events are lost, every video is checked again
+            print ("WARNING: Too many changes at once, scanning the folders")
+            for root in self.roots:
+                changed.update(walk_videos(root))
+        return changed, removed
+
+    def close(self):
+        """ Stop watching the folders
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class PollingWatcher(object):
+    """ Watch the folders by scanning them every poll interval, for the
+        systems and file shares without inotify
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, roots, poll_interval=5):
+        """ Initialization function for the class
+
+        Args:
+            roots (`list`): Folders to watch
+            poll_interval (`float`): Seconds between the scans
+        """
+        self.roots = roots
+        self.poll_interval = poll_interval
+        self._state = self._scan()
+        self._next_scan = time.monotonic() + poll_interval
+
+    def _scan(self):
+        """ Size and modification time of all the videos in the folders
+
+        Returns:
+            `dict`: path: (size, mtime_ns)
+        """
+        state = dict()
+        for root in self.roots:
+            try:
+                for entry in scan_videos(root):
+                    try:
+                        stat_result = entry.stat()
+                    except OSError:
+                        continue
+                    state[entry.path] = (stat_result.st_size,
+                                         stat_result.st_mtime_ns)
+            except OSError as e:
+                print ("WARNING: Can't scan {0} - {1}".format(root, e))
+        return state
+
+    def poll(self, timeout):
+        """ Wait for the next scan and give back the changes
+
+        Args:
+            timeout (`float`): Seconds to wait for the changes
+
+        Returns:
+            `tuple`: Set of the videos that are new or modified and set of
+                     the videos that are removed
+        """
+        wait_time = self._next_scan - time.monotonic()
+        if wait_time > timeout:
+            time.sleep(timeout)
+            return set(), set()
+        time.sleep(max(wait_time, 0))
+        state = self._scan()
+        self._next_scan = time.monotonic() + self.poll_interval
+        changed = set(_path for _path, _key in state.items()
+                      if self._state.get(_path) != _key)
+        removed = set(self._state) - set(state)
+        self._state = state
+        return changed, removed
+
+    def close(self):
+        """ Stop watching the folders
+        """
+        self._state = dict()
+
+
+def get_watcher(roots, mode="auto", poll_interval=5):
+    """ Get the watcher of the folders
+
+    Args:
+        roots (`list`): Folders to watch
+        mode (`str`): "auto" uses inotify if it is there and polls
+                      otherwise, "inotify" or "poll"
+        poll_interval (`float`): Seconds between the scans when polling
+
+    Raises:
+        RuntimeError: Invalid mode or inotify is not available
+
+    Returns:
+        `object`: InotifyWatcher or PollingWatcher
+    """
+    if mode not in WATCH_MODES:
+        raise RuntimeError("Invalid watch mode {0}".format(mode))
+    if mode != "poll":
+        libc = _load_libc()
+        if libc is not None:
+            try:
+                return InotifyWatcher(roots, libc)
+            except OSError as e:
+                if mode == "inotify":
+                    raise RuntimeError("Can't start inotify - {0}".format(e))
+                print ("WARNING: Can't start inotify, polling the folders "
+                       "- {0}".format(e))
+        elif mode == "inotify":
+            raise RuntimeError("inotify is not available on this system")
+    return PollingWatcher(roots, poll_interval=poll_interval)
+
+
+class SettleTracker(object):
+    """ Videos that are landing in the folders, a video is ready once its
+        size and modification time stay the same for the settle time, so
+        the videos that are still being copied are not processed
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, settle_time):
+        """ Initialization function for the class
+
+        Args:
+            settle_time (`float`): Seconds a video has to stay the same
+        """
+        self.settle_time = settle_time
+        # path: [(size, mtime_ns), time of the last change]
+        self.pending = dict()
+
+    def __len__(self):
+        """ Number of videos that are settling
+
+        Returns:
+            `int`: Number of videos
+        """
+        return len(self.pending)
+
+    def add(self, video_path):
+        """ Start tracking the video (nothing changes if it is tracked)
+
+        Args:
+            video_path (`str`): Video path
+        """
+        if video_path not in self.pending:
+            self.pending[video_path] = [None, time.monotonic()]
+
+    def remove(self, video_path):
+        """ Stop tracking the video
+
+        Args:
+            video_path (`str`): Video path
+        """
+        self.pending.pop(video_path, None)
+
+    def get_ready(self):
+        """ Check the videos and give back the ones that are settled, they
+            are not tracked anymore
+
+        Returns:
+            `list`: Settled video paths, sorted
+        """
+        now = time.monotonic()
+        ready = list()
+        for _path, _state in list(self.pending.items()):
+            try:
+                stat_result = os.stat(_path)
+            except OSError:
+                # Gone, or moved away before it settled
+                del self.pending[_path]
+                continue
+            _key = (stat_result.st_size, stat_result.st_mtime_ns)
+            # Empty files are created before the copy starts writing
+            if _key != _state[0] or not stat_result.st_size:
+                _state[0] = _key
+                _state[1] = now
+                continue
+            if now - _state[1] >= self.settle_time:
+                ready.append(_path)
+                del self.pending[_path]
+        return sorted(ready)
+
+
+class WatchDaemon(object):
+    """ Long running daemon that watches the folders and writes a report
+        for the videos that land in them. The workers (and their exiftool
+        sessions) are started once and kept running between the reports.
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, roots, export_dir=None, jobs=1, threads=False,
+                 use_cache=True, trace=False, mode=None, settle_time=None,
+                 poll_interval=None):
+        """ Initialization function for the class, the values that are not
+            given come from the watch config
+
+        Args:
+            roots (`list`): Folders to watch
+            export_dir (`str`): Folder of the reports, by default every
+                                report goes into its watched folder
+            jobs (`int`): Number of videos to process at the same time
+            threads (`bool`): Use worker threads instead of processes
+            use_cache (`bool`): Use the metadata cache
+            trace (`bool`): Write the trace files of every report
+            mode (`str`): Watch mode (see get_watcher)
+            settle_time (`float`): Seconds a video has to stay the same
+                                   before it is processed
+            poll_interval (`float`): Seconds between the scans when polling
+        """
+        watch_config = get_config().get("watch") or {}
+        self.roots = [os.path.abspath(_root) for _root in roots]
+        self.export_dir = export_dir or watch_config.get("export_path") or None
+        self.jobs = jobs
+        self.threads = threads
+        self.use_cache = use_cache
+        self.trace = trace
+        self.mode = mode or watch_config.get("mode", "auto")
+        if settle_time is None:
+            settle_time = watch_config.get("settle_time", 10)
+        if poll_interval is None:
+            poll_interval = watch_config.get("poll_interval", 5)
+        self.poll_interval = float(poll_interval)
+        self.settle = SettleTracker(float(settle_time))
+        # The reported videos of every folder, shared with the
+        # --since-last runs
+        self.snapshots = dict((_root, ScanSnapshot(_root))
+                              for _root in self.roots)
+        self.reports = list()
+        self._executor = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        """ Stop the daemon once the report that is being written is done
+        """
+        self._stop.set()
+
+    def _get_root(self, video_path):
+        """ Watched folder of the video
+
+        Args:
+            video_path (`str`): Video path
+
+        Returns:
+            `str`: Folder path, the deepest one for nested folders. None if
+                   the video is not in any of them (moved out of the tree)
+        """
+        roots = [_root for _root in self.roots
+                 if video_path.startswith(os.path.join(_root, ""))]
+        return max(roots, key=len, default=None)
+
+    def _get_executor(self):
+        """ Get the pool of workers, it is started (and warmed up) once
+
+        Returns:
+            `Executor`: Pool of workers, None for a single job
+        """
+        if self.jobs <= 1:
+            return None
+        if self._executor is None:
+            self._executor = create_executor(self.jobs, threads=self.threads,
+                                             warm=True)
+            # Start the workers now rather than when the first video lands
+            for _future in [self._executor.submit(os.getpid)
+                            for _ in range(self.jobs)]:
+                _future.result()
+        return self._executor
+
+    def _shutdown_executor(self):
+        """ Stop the pool of workers
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _catch_up(self):
+        """ Track the videos that are new or modified since the last run,
+            on the first run the videos already in the folders are only
+            added to the snapshot
+        """
+        for root, snapshot in self.snapshots.items():
+            first_run = not os.path.exists(snapshot.snapshot_path)
+            changed = list(snapshot.update(scan_videos(root)))
+            if first_run:
+                snapshot.save()
+                print ("NOTE: First run on {0}, only the videos that land "
+                       "from now on are reported".format(root))
+                continue
+            for _path in changed:
+                # Added back to the snapshot once it is reported
+                snapshot.forget(_path)
+                self.settle.add(_path)
+            if changed:
+                print ("NOTE: {0} videos changed in {1} since the last "
+                       "run".format(len(changed), root))
+
+    def _report(self, video_paths):
+        """ Write the reports of the settled videos, one for every watched
+            folder
+
+        Args:
+            video_paths (`list`): Settled video paths
+        """
+        root_paths = dict()
+        for _path in video_paths:
+            root = self._get_root(_path)
+            if root is None:
+                continue
+            snapshot = self.snapshots[root]
+            # Touched or closed without any change since it was reported
+            if snapshot.is_current(_path):
+                continue
+            list(snapshot.update([_path]))
+            root_paths.setdefault(root, list()).append(_path)
+
+        for root, paths in root_paths.items():
+            snapshot = self.snapshots[root]
+            export_dir = self.export_dir or root
+            pdf_path = get_report_path(export_dir)
+            print ("NOTE: {0} videos landed in {1}".format(len(paths), root))
+            try:
+                report = create_report(paths, pdf_path, jobs=self.jobs,
+                                       use_cache=self.use_cache,
+                                       threads=self.threads, trace=self.trace,
+                                       executor=self._get_executor())
+            except Exception as e:
+                # The daemon keeps running, the videos are tried again
+                # once they change or the daemon is restarted
+                print ("ERROR: Report of {0} failed - {1}".format(root, e))
+                if isinstance(e, BrokenExecutor):
+                    self._shutdown_executor()
+                for _path in paths:
+                    snapshot.forget(_path)
+                snapshot.save()
+                continue
+            for _path in report.get("errors"):
+                snapshot.forget(_path)
+            snapshot.save()
+            if report.get("exported"):
+                print ("PDF Exported to {0}".format(pdf_path))
+                self.reports.append(pdf_path)
+
+    def run(self):
+        """ Watch the folders until the daemon is stopped
+        """
+        if self.export_dir and not os.path.exists(self.export_dir):
+            os.makedirs(self.export_dir)
+        # The watch starts before the catch up scan, so no video lands
+        # in between unseen
+        watcher = get_watcher(self.roots, mode=self.mode,
+                              poll_interval=self.poll_interval)
+        try:
+            self._catch_up()
+            if self._get_executor() is None:
+                warm_up()
+            print ("Watching {0} ({1})".format(", ".join(self.roots),
+                                               type(watcher).__name__))
+            while not self._stop.is_set():
+                changed, removed = watcher.poll(timeout=CHECK_INTERVAL)
+                for _path in removed:
+                    self.settle.remove(_path)
+                    root = self._get_root(_path)
+                    if root is not None:
+                        self.snapshots[root].forget(_path)
+                for _path in changed:
+                    # Events outside the watched folders are ignored
+                    if self._get_root(_path) is not None:
+                        self.settle.add(_path)
+                ready = self.settle.get_ready()
+                if ready:
+                    self._report(ready)
+        finally:
+            watcher.close()
+            self._shutdown_executor()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# std imports
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import collections
+
+# internal
+from .pipeline import process_videos
+from .journal import dump_info, load_info
+from .base import get_config
+
+# Queue folder format version
+QUEUE_VERSION = 1
+QUEUE_NAME = "queue.json"
+TODO_DIR = "todo"
+CLAIMED_DIR = "claimed"
+RESULTS_DIR = "results"
+THUMBNAILS_DIR = "thumbnails"
+
+# A claimed video, its item name (the input index) and the claim file
+Claim = collections.namedtuple("Claim", ["name", "path", "claim_path"])
+
+
+def _write_json(file_path, data):
+    """ Write the JSON file, other hosts only ever see the whole file
+
+    Args:
+        file_path (`str`): JSON file path
+        data (`dict`): File data
+    """
+    temp_path = "{0}.{1}.tmp".format(file_path, uuid.uuid4().hex)
+    with open(temp_path, "w") as file_open:
+        json.dump(data, file_open, default=str)
+        file_open.flush()
+        os.fsync(file_open.fileno())
+    os.replace(temp_path, file_path)
+
+
+def _read_json(file_path):
+    """ Read the JSON file
+
+    Args:
+        file_path (`str`): JSON file path
+
+    Returns:
+        `dict`: File data
+    """
+    with open(file_path, "r") as file_open:
+        return json.load(file_open)
+
+
+class WorkQueue(object):
+    """ Work queue of videos in a shared folder, so workers on different
+        hosts can process the videos of one report. Every video is a file
+        in "todo", a worker claims it by renaming it into "claimed" (only
+        one rename can win), and the result goes into "results".
+
+    Args:
+        object (_type_): _description_
+    """
+    def __init__(self, queue_dir):
+        """ Initialization function for the class
+
+        Args:
+            queue_dir (`str`): Queue folder
+
+        Raises:
+            RuntimeError: The folder is not a work queue
+        """
+        self.queue_dir = os.path.abspath(queue_dir)
+        queue_path = os.path.join(self.queue_dir, QUEUE_NAME)
+        if not os.path.exists(queue_path):
+            raise RuntimeError("{0} is not a work queue".format(queue_dir))
+        header = _read_json(queue_path)
+        if header.get("version") != QUEUE_VERSION:
+            raise RuntimeError("Work queue {0} is not supported".format(
+                queue_dir))
+        self.paths = header.get("paths")
+        self.total = header.get("total")
+        self.worker_id = "{0}-{1}".format(socket.gethostname(), os.getpid())
+        stale_time = (get_config().get("queue") or {}).get("stale_time",
+                                                           3600)
+        self.stale_time = float(stale_time)
+        # Todo items this worker has not tried yet
+        self._todo = None
+
+    @property
+    def todo_dir(self):
+        """ Folder of the videos that are waiting
+
+        Returns:
+            `str`: Folder path
+        """
+        return os.path.join(self.queue_dir, TODO_DIR)
+
+    @property
+    def claimed_dir(self):
+        """ Folder of the videos that are being processed
+
+        Returns:
+            `str`: Folder path
+        """
+        return os.path.join(self.queue_dir, CLAIMED_DIR)
+
+    @property
+    def results_dir(self):
+        """ Folder of the results of the videos
+
+        Returns:
+            `str`: Folder path
+        """
+        return os.path.join(self.queue_dir, RESULTS_DIR)
+
+    @property
+    def thumbnails_dir(self):
+        """ Folder of the thumbnails of the results
+
+        Returns:
+            `str`: Folder path
+        """
+        return os.path.join(self.results_dir, THUMBNAILS_DIR)
+
+    @classmethod
+    def create(cls, queue_dir, paths, video_paths):
+        """ Create the work queue, the queue folder only shows up once all
+            the videos are in it, so the workers can be started any time
+
+        Args:
+            queue_dir (`str`): Queue folder
+            paths (`list`): Paths the videos come from
+            video_paths (`iterable`): Video paths, in the PDF order
+
+        Raises:
+            RuntimeError: The queue folder exists already
+
+        Returns:
+            `WorkQueue`: Queue object
+        """
+        queue_dir = os.path.abspath(queue_dir)
+        if os.path.exists(queue_dir):
+            raise RuntimeError("Path {0} already exists.".format(queue_dir))
+        temp_dir = "{0}.{1}.tmp".format(queue_dir, uuid.uuid4().hex)
+        for _dir in (TODO_DIR, CLAIMED_DIR,
+                     os.path.join(RESULTS_DIR, THUMBNAILS_DIR)):
+            os.makedirs(os.path.join(temp_dir, _dir))
+        total = 0
+        for index, _path in enumerate(video_paths):
+            # The item names keep the input order for the merge
+            with open(os.path.join(temp_dir, TODO_DIR,
+                                   "{0:08d}.json".format(index)),
+                      "w") as file_open:
+                json.dump(dict(path=os.path.abspath(_path)), file_open)
+            total += 1
+        _write_json(os.path.join(temp_dir, QUEUE_NAME),
+                    dict(version=QUEUE_VERSION, created=time.time(),
+                         paths=[os.path.abspath(_path) for _path in paths],
+                         total=total))
+        os.rename(temp_dir, queue_dir)
+        return cls(queue_dir)
+
+    def _claim_path(self, name):
+        """ Claim file path of the item for this worker
+
+        Args:
+            name (`str`): Item name
+
+        Returns:
+            `str`: Claim file path
+        """
+        return os.path.join(self.claimed_dir,
+                            "{0}.{1}".format(name, self.worker_id))
+
+    def _has_result(self, name):
+        """ Is there a result for the item
+
+        Args:
+            name (`str`): Item name
+
+        Returns:
+            `bool`: True if the item is done
+        """
+        return os.path.exists(os.path.join(self.results_dir, name))
+
+    def _claim_stale(self):
+        """ Claim an item of a worker that stopped (its claim was not
+            touched for the stale time)
+
+        Returns:
+            `Claim`: Claimed item, None if there is no stale claim
+        """
+        now = time.time()
+        for _claim_name in sorted(os.listdir(self.claimed_dir)):
+            claim_path = os.path.join(self.claimed_dir, _claim_name)
+            try:
+                if now - os.stat(claim_path).st_mtime < self.stale_time:
+                    continue
+            except OSError:
+                continue
+            name = _claim_name.split(".json.")[0] + ".json"
+            if self._has_result(name):
+                # The worker stopped after it wrote the result
+                try:
+                    os.remove(claim_path)
+                except OSError:
+                    pass
+                continue
+            claim = self._take(claim_path, name)
+            if claim is not None:
+                print ("NOTE: Claimed {0} from a stopped worker".format(
+                    claim.path))
+                return claim
+        return None
+
+    def _take(self, item_path, name):
+        """ Rename the item into the claim of this worker
+
+        Args:
+            item_path (`str`): Todo item or stale claim path
+            name (`str`): Item name
+
+        Returns:
+            `Claim`: Claimed item, None if another worker was quicker
+        """
+        claim_path = self._claim_path(name)
+        try:
+            os.rename(item_path, claim_path)
+        except OSError:
+            return None
+        # The rename keeps the old time, the claim is fresh from now
+        os.utime(claim_path, None)
+        return Claim(name, _read_json(claim_path).get("path"), claim_path)
+
+    def claim(self):
+        """ Claim the next video, every worker goes through the items in
+            its own random order so they do not all race for the same one
+
+        Returns:
+            `Claim`: Claimed item, None once there is nothing left
+        """
+        # Nothing is added to todo once the queue is created, so one
+        # listing is enough
+        if self._todo is None:
+            self._todo = os.listdir(self.todo_dir)
+            random.shuffle(self._todo)
+        while self._todo:
+            name = self._todo.pop()
+            claim = self._take(os.path.join(self.todo_dir, name), name)
+            if claim is not None:
+                return claim
+        return self._claim_stale()
+
+    def touch(self, claims):
+        """ Keep the claims fresh, so they are not taken as stale
+
+        Args:
+            claims (`iterable`): Claims of this worker
+        """
+        for claim in claims:
+            try:
+                os.utime(claim.claim_path, None)
+            except OSError:
+                pass
+
+    def complete(self, claim, result):
+        """ Write the result of the claimed video and drop the claim
+
+        Args:
+            claim (`Claim`): Claimed item
+            result (`dict`): Result of the video (see process_video)
+        """
+        info = result.get("info")
+        if info:
+            info = dump_info(info, self.thumbnails_dir)
+        _write_json(os.path.join(self.results_dir, claim.name),
+                    dict(path=claim.path, info=info,
+                         error=result.get("error"), worker=self.worker_id))
+        try:
+            os.remove(claim.claim_path)
+        except OSError:
+            # Taken over as stale, the result is there anyway
+            pass
+
+    def get_status(self):
+        """ Number of the videos in every state
+
+        Returns:
+            `dict`: total, todo, claimed and done
+        """
+        done = len([_name for _name in os.listdir(self.results_dir)
+                    if _name.endswith(".json")])
+        return dict(total=self.total,
+                    todo=len(os.listdir(self.todo_dir)),
+                    claimed=len(os.listdir(self.claimed_dir)), done=done)
+
+    def iter_results(self):
+        """ Results of all the videos, in the input order
+
+        Raises:
+            RuntimeError: Videos are not done yet
+
+        Yields:
+            `dict`: Result of every video (see process_video)
+        """
+        status = self.get_status()
+        if status["done"] < self.total:
+            raise RuntimeError("{0} of {1} videos are not done yet ({2} "
+                               "waiting, {3} being processed)".format(
+                                   self.total - status["done"], self.total,
+                                   status["todo"], status["claimed"]))
+        for index in range(self.total):
+            data = _read_json(os.path.join(self.results_dir,
+                                           "{0:08d}.json".format(index)))
+            info = data.get("info")
+            if info:
+                info = load_info(info)
+                if info is None:
+                    data["error"] = "Thumbnail of the result is missing"
+            yield dict(path=data.get("path"), info=info,
+                       error=data.get("error"))
+
+
+def run_worker(queue, jobs=1, use_cache=True, threads=False):
+    """ Process the videos of the queue until there is nothing left
+
+    Args:
+        queue (`WorkQueue`): Work queue
+        jobs (`int`): Number of videos to process at the same time
+        use_cache (`bool`): Use the metadata cache (if enabled in config)
+        threads (`bool`): Use worker threads instead of processes
+
+    Returns:
+        `int`: Number of videos this worker processed
+    """
+    # Claims in the order they are handed to the workers, the results
+    # come back in the same order
+    claims = collections.deque()
+
+    def _claimed_paths():
+        while True:
+            claim = queue.claim()
+            if claim is None:
+                return
+            claims.append(claim)
+            yield claim.path
+
+    processed = 0
+    for result in process_videos(_claimed_paths(), jobs=jobs,
+                                 use_cache=use_cache, threads=threads):
+        queue.complete(claims.popleft(), result)
+        queue.touch(claims)
+        processed += 1
+    return processed